@@ -0,0 +1,247 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import Counter
+from concurrent.futures import as_completed
+from typing import Dict, List, Optional, Set
+
+from scripts.tracker import add_tracking_arguments, track_video_and_center_object, tracking_kwargs_from_args
+from scripts.worker_pool import load_worker_models, model_process_pool
+
+
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi', '.mkv', '.m4v')
+CHECKPOINT_FILENAME = 'batch_checkpoint.jsonl'
+
+
+def discover_videos(source: str, extensions=VIDEO_EXTENSIONS) -> List[str]:
+    """
+    Возвращает список видео для пакетной обработки.
+
+    Args:
+        source (str): Директория с видео (рекурсивно) или файл-манифест со списком путей (по одному на строку,
+                      строки с '#' игнорируются; относительные пути считаются от директории манифеста).
+        extensions (tuple): Расширения видеофайлов при поиске в директории.
+
+    Returns:
+        List[str]: Отсортированный список абсолютных путей к видео.
+    """
+    if os.path.isdir(source):
+        videos = []
+        for root, _, files in os.walk(source):
+            videos.extend(os.path.join(root, f) for f in files if f.lower().endswith(extensions))
+        return sorted(os.path.abspath(v) for v in videos)
+
+    manifest_dir = os.path.dirname(os.path.abspath(source))
+    videos = []
+    with open(source, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            videos.append(os.path.abspath(os.path.join(manifest_dir, line)))
+    return videos
+
+
+def load_checkpoint(checkpoint_path: str) -> Set[str]:
+    """
+    Читает файл контрольной точки и возвращает множество уже обработанных видео.
+    Поврежденные строки (например, недописанная последняя строка после сбоя) пропускаются.
+    """
+    done: Set[str] = set()
+    if not os.path.exists(checkpoint_path):
+        return done
+    with open(checkpoint_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get('status') == 'done' and os.path.exists(record.get('output', '')):
+                done.add(record['video'])
+    return done
+
+
+def _append_checkpoint(checkpoint_path: str, record: dict) -> None:
+    with open(checkpoint_path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def videos_root(source: str, videos: List[str]) -> str:
+    """Общая директория видео: сама директория source или ближайший общий предок видео из манифеста."""
+    if os.path.isdir(source):
+        return os.path.abspath(source)
+    try:
+        return os.path.commonpath([os.path.dirname(v) for v in videos]) if videos else os.path.dirname(os.path.abspath(source))
+    except ValueError:  # Видео на разных дисках (Windows)
+        return os.path.dirname(os.path.abspath(source))
+
+
+def output_path_for(video_path: str, output_dir: str, root: Optional[str] = None, keep_extension: bool = False) -> str:
+    """
+    Путь к выходному видео для исходного: <output_dir>/<путь относительно root без расширения>.mp4.
+
+    Поддиректории исходных видео повторяются в output_dir, поэтому a/run1.mp4 и b/run1.mp4 не перезаписывают
+    друг друга. Видео вне root (или при root=None) получают имя с коротким хэшем исходного пути.
+    При keep_extension=True исходное расширение остается в имени (run1_mov.mp4) — для run1.mp4 и run1.mov
+    в одной директории.
+    """
+    video_path = os.path.abspath(video_path)
+    relative = os.path.relpath(video_path, root) if root is not None else None
+    if relative is None or relative.startswith(os.pardir):
+        stem, ext = os.path.splitext(os.path.basename(video_path))
+        digest = hashlib.sha1(video_path.encode('utf-8')).hexdigest()[:8]
+        relative = f"{stem}_{digest}{ext}"
+    stem, ext = os.path.splitext(relative)
+    if keep_extension:
+        stem += '_' + ext.lstrip('.')
+    return os.path.join(output_dir, stem + '.mp4')
+
+
+def output_paths_for(videos: List[str], output_dir: str, root: Optional[str] = None) -> Dict[str, str]:
+    """Выходные пути для всех видео пакета (см. output_path_for) без совпадений между видео."""
+    outputs = {video: output_path_for(video, output_dir, root) for video in videos}
+    collisions = Counter(outputs.values())
+    for video, output in outputs.items():
+        if collisions[output] > 1:
+            outputs[video] = output_path_for(video, output_dir, root, keep_extension=True)
+    return outputs
+
+
+def _per_video_path(template: Optional[str], output_path: str, suffix: str) -> Optional[str]:
+    """Путь к отчету для конкретного видео: <выходное_видео><suffix><расширение шаблона> (None, если шаблон не задан)."""
+    if not template:
+        return None
+    return os.path.splitext(output_path)[0] + suffix + os.path.splitext(template)[1]
+
+
+def _process_video(model_path: str, video_path: str, output_path: str, tracking_kwargs: dict) -> dict:
+    """Обрабатывает одно видео в процессе-обработчике с уже загруженной моделью."""
+    start = time.perf_counter()
+    # Отчеты профилирования сохраняются отдельно для каждого видео рядом с выходным файлом
+    tracking_kwargs = dict(tracking_kwargs)
+    tracking_kwargs['profile_path'] = _per_video_path(tracking_kwargs.get('profile_path'), output_path, '_profile')
+    tracking_kwargs['profile_trace_path'] = _per_video_path(tracking_kwargs.get('profile_trace_path'), output_path, '_trace')
+    try:
+        ok = track_video_and_center_object(
+            model_path, video_path, output_path,
+            model_loader=load_worker_models, **tracking_kwargs
+        )
+        error = None if ok else "обработка завершилась с ошибкой (см. лог обработчика)"
+    except Exception as e:
+        ok, error = False, f"{type(e).__name__}: {e}"
+    return {
+        'video': video_path,
+        'output': output_path,
+        'status': 'done' if ok else 'failed',
+        'error': error,
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+
+
+def run_batch(
+    model_path: str,
+    source: str,
+    output_dir: str,
+    workers: Optional[int] = None,
+    threads_per_worker: Optional[int] = None,
+    checkpoint_path: Optional[str] = None,
+    **tracking_kwargs
+) -> Dict[str, int]:
+    """
+    Пакетно обрабатывает видео из директории или манифеста пулом процессов.
+
+    Каждый процесс загружает модель один раз (при первом видео, для которого нет детекций в кэше)
+    и переиспользует ее для всех своих видео.
+    Завершенные видео записываются в файл контрольной точки (JSON Lines), поэтому после сбоя
+    повторный запуск с теми же параметрами пропускает уже обработанные видео.
+
+    Args:
+        model_path (str): Путь к обученной модели YOLO.
+        source (str): Директория с видео или файл-манифест.
+        output_dir (str): Директория для выходных видео (поддиректории исходной директории повторяются, см. output_path_for).
+        workers (int, optional): Количество процессов (по умолчанию — число ядер).
+        threads_per_worker (int, optional): Ограничение потоков torch/OpenCV в каждом процессе,
+            чтобы процессы не конкурировали за ядра.
+        checkpoint_path (str, optional): Путь к файлу контрольной точки
+            (по умолчанию <output_dir>/batch_checkpoint.jsonl).
+        **tracking_kwargs: Параметры track_video_and_center_object. Если заданы profile_path/profile_trace_path,
+            используется только их расширение: отчеты сохраняются как <выходное_видео>_profile.<ext>
+            и <выходное_видео>_trace.<ext>.
+
+    Returns:
+        Dict[str, int]: Сводка {'total', 'skipped', 'done', 'failed'}.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    checkpoint_path = checkpoint_path or os.path.join(output_dir, CHECKPOINT_FILENAME)
+
+    videos = discover_videos(source)
+    outputs = output_paths_for(videos, output_dir, videos_root(source, videos))
+    done = load_checkpoint(checkpoint_path)
+    pending = [v for v in videos if v not in done]
+    summary = {'total': len(videos), 'skipped': len(videos) - len(pending), 'done': 0, 'failed': 0}
+
+    print(f"Найдено видео: {len(videos)}, уже обработано: {summary['skipped']}, к обработке: {len(pending)}")
+    if not pending:
+        return summary
+
+    workers = workers or os.cpu_count() or 1
+    workers = min(workers, len(pending))
+    with model_process_pool(workers, model_path, threads_per_worker) as executor:
+        for directory in {os.path.dirname(outputs[video]) for video in pending}:
+            os.makedirs(directory, exist_ok=True)
+        futures = {
+            executor.submit(_process_video, model_path, video, outputs[video], tracking_kwargs): video
+            for video in pending
+        }
+        for future in as_completed(futures):
+            video = futures[future]
+            try:
+                record = future.result()
+            except Exception as e:  # Например, аварийное завершение процесса-обработчика
+                record = {'video': video, 'output': outputs[video], 'status': 'failed',
+                          'error': f"{type(e).__name__}: {e}", 'seconds': None}
+
+            _append_checkpoint(checkpoint_path, record)
+            summary[record['status']] += 1
+            processed = summary['done'] + summary['failed']
+            status = 'готово' if record['status'] == 'done' else f"ошибка: {record['error']}"
+            print(f"[{processed}/{len(pending)}] {os.path.basename(video)} — {status}")
+
+    print(f"Пакетная обработка завершена: успешно {summary['done']}, с ошибкой {summary['failed']}, пропущено {summary['skipped']}.")
+    return summary
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Точка входа командной строки для пакетной обработки.
+
+    Пример (из корня проекта):
+        python -m scripts.batch_tracker --model best.pt --input videos/ --output-dir runs/track/batch --workers 4
+    """
+    parser = argparse.ArgumentParser(description="Пакетное отслеживание и центрирование сноубордиста в наборе видео.")
+    parser.add_argument('--input', required=True, help="Директория с видео или файл-манифест со списком путей")
+    parser.add_argument('--output-dir', required=True, help="Директория для выходных видео")
+    parser.add_argument('--workers', type=int, default=None, help="Количество процессов (по умолчанию — число ядер)")
+    parser.add_argument('--threads-per-worker', type=int, default=None, help="Потоков torch/OpenCV на процесс")
+    parser.add_argument('--checkpoint', default=None, help="Файл контрольной точки для возобновления")
+    add_tracking_arguments(parser)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), format='%(levelname)s %(name)s: %(message)s')
+
+    summary = run_batch(
+        args.model, args.input, args.output_dir,
+        workers=args.workers,
+        threads_per_worker=args.threads_per_worker,
+        checkpoint_path=args.checkpoint,
+        **tracking_kwargs_from_args(args)
+    )
+    return 0 if summary['failed'] == 0 else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
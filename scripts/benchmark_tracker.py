@@ -0,0 +1,373 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+
+# Цвета спрайтов (BGR): первый — «сноубордист», остальные — другие объекты на склоне
+SPRITE_COLORS = [(0, 0, 255), (255, 0, 0), (0, 200, 0), (0, 200, 255), (255, 0, 255), (255, 255, 0)]
+
+# Варианты трекера, которые сравнивает бенчмарк: имя -> параметры track_video_and_center_object
+BENCHMARK_CASES: Dict[str, dict] = {
+    'baseline': {},
+    'pipelined_b1': {'pipelined': True},
+    'pipelined_b8': {'pipelined': True, 'batch_size': 8},
+    'detect_interval_3': {'detect_interval': 3},
+    'roi': {'roi_inference': True},
+    'target_lock': {'target_selector': 'target_lock'},
+    'virtual_camera': {'virtual_camera': 'default'},
+    'writer_opencv_mp4v': {'writer_backend': 'opencv'},
+    'writer_ffmpeg_x264': {'writer_backend': 'ffmpeg', 'video_codec': 'libx264', 'video_preset': 'ultrafast'},
+    'writer_ffmpeg_x264_pipelined': {'writer_backend': 'ffmpeg', 'video_codec': 'libx264', 'pipelined': True},
+}
+
+DEFAULT_RESOLUTIONS = ((1280, 720), (1920, 1080))
+RESULT_COLUMNS = [
+    'timestamp', 'commit', 'case', 'width', 'height', 'frames', 'detector', 'fps', 'wall_s', 'peak_rss_mb', 'output_mb',
+    'decode_ms', 'inference_ms', 'selection_ms', 'crop_ms', 'encode_ms',
+    'decode_p95_ms', 'inference_p95_ms', 'selection_p95_ms', 'crop_p95_ms', 'encode_p95_ms',
+    'cpu_count', 'platform', 'opencv',
+]
+
+
+def generate_synthetic_video(
+    path: str,
+    width: int = 1280,
+    height: int = 720,
+    frames: int = 300,
+    fps: float = 30.0,
+    num_objects: int = 3,
+    seed: int = 0
+) -> str:
+    """
+    Создает синтетическое видео: цветные прямоугольники («спрайты») движутся по зашумленному серому фону
+    с отражением от краев кадра. Первый спрайт (красный) крупнее остальных и играет роль сноубордиста.
+
+    Args:
+        path (str): Путь к создаваемому видео (.mp4).
+        width (int): Ширина кадра.
+        height (int): Высота кадра.
+        frames (int): Количество кадров.
+        fps (float): Частота кадров.
+        num_objects (int): Количество спрайтов (не больше len(SPRITE_COLORS)).
+        seed (int): Зерно генератора случайных чисел (видео воспроизводимо).
+
+    Returns:
+        str: Путь к созданному видео.
+    """
+    rng = np.random.default_rng(seed)
+    num_objects = max(1, min(num_objects, len(SPRITE_COLORS)))
+    scale = min(width, height) / 720
+
+    sizes = np.array([(120, 180)] + [(70, 100)] * (num_objects - 1), dtype=np.float64) * scale
+    positions = rng.uniform((0, 0), (width - sizes[:, 0].max(), height - sizes[:, 1].max()), size=(num_objects, 2))
+    velocities = rng.uniform(-12, 12, size=(num_objects, 2)) * scale
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    if not writer.isOpened():
+        raise RuntimeError(f"Не удалось создать синтетическое видео {path}")
+
+    # Фон генерируется один раз; к нему добавляется легкий сдвиг, чтобы кадры не были идентичны
+    background = rng.integers(90, 140, size=(height, width, 3), dtype=np.uint8)
+    try:
+        for i in range(frames):
+            frame = np.roll(background, i % 7, axis=1)
+            for k in range(num_objects):
+                positions[k] += velocities[k]
+                for axis, limit in ((0, width), (1, height)):
+                    if positions[k, axis] < 0 or positions[k, axis] + sizes[k, axis] > limit:
+                        velocities[k, axis] *= -1
+                        positions[k, axis] = np.clip(positions[k, axis], 0, limit - sizes[k, axis])
+                x1, y1 = positions[k].astype(int)
+                x2, y2 = (positions[k] + sizes[k]).astype(int)
+                cv2.rectangle(frame, (x1, y1), (x2, y2), SPRITE_COLORS[k], -1)
+            writer.write(frame)
+    finally:
+        writer.release()
+    return path
+
+
+class _StubArray:
+    """Минимальная обертка над np.ndarray с интерфейсом тензора (.cpu().numpy())."""
+
+    def __init__(self, array: np.ndarray):
+        self._array = array
+
+    def cpu(self) -> "_StubArray":
+        return self
+
+    def numpy(self) -> np.ndarray:
+        return self._array
+
+
+class _StubBoxes:
+    def __init__(self, data: np.ndarray):
+        self.data = _StubArray(data)
+
+    def __len__(self) -> int:
+        return len(self.data.numpy())
+
+
+class _StubResult:
+    def __init__(self, data: np.ndarray):
+        self.boxes = _StubBoxes(data)
+
+
+class SyntheticDetector:
+    """
+    Заглушка модели YOLO для бенчмарка без обученных весов: находит цветные спрайты синтетического видео
+    порогом по насыщенности и связными компонентами. ID трека определяется цветом спрайта.
+
+    Реализует только те методы YOLO, которые использует трекер (track и predict), и возвращает
+    результаты с тем же форматом boxes.data, что и Ultralytics.
+    """
+
+    def __init__(self, min_area: int = 200):
+        self.min_area = min_area
+        self._hues = np.array([cv2.cvtColor(np.uint8([[c]]), cv2.COLOR_BGR2HSV)[0, 0, 0] for c in SPRITE_COLORS], dtype=np.int32)
+
+    def _detect(self, frame: np.ndarray, with_ids: bool) -> _StubResult:
+        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+        mask = cv2.inRange(hsv, (0, 150, 100), (180, 255, 255))
+        count, _, stats, centroids = cv2.connectedComponentsWithStats(mask, connectivity=4)
+
+        rows = []
+        for k in range(1, count):
+            x, y, w, h, area = stats[k]
+            if area < self.min_area:
+                continue
+            cx, cy = centroids[k].astype(int)
+            hue_difference = np.abs(self._hues - int(hsv[cy, cx, 0]))
+            track_id = int(np.argmin(np.minimum(hue_difference, 180 - hue_difference))) + 1
+            box = [x, y, x + w, y + h] + ([track_id] if with_ids else []) + [0.9, 0]
+            rows.append(box)
+        columns = 7 if with_ids else 6
+        return _StubResult(np.array(rows, dtype=np.float32).reshape(-1, columns))
+
+    def track(self, source, **kwargs) -> List[_StubResult]:
+        frames = source if isinstance(source, list) else [source]
+        return [self._detect(frame, with_ids=True) for frame in frames]
+
+    def predict(self, source, **kwargs) -> List[_StubResult]:
+        frames = source if isinstance(source, list) else [source]
+        return [self._detect(frame, with_ids=False) for frame in frames]
+
+
+def _git_commit() -> str:
+    try:
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=root, stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def _skip_reason(tracking_kwargs: dict) -> Optional[str]:
+    """Причина пропуска варианта, который нельзя выполнить на этой машине (None, если вариант выполним)."""
+    if tracking_kwargs.get('writer_backend') == 'ffmpeg' and shutil.which('ffmpeg') is None:
+        return "ffmpeg не найден в PATH"
+    return None
+
+
+def _run_case(case: str, tracking_kwargs: dict, video_path: str, model_path: Optional[str], work_dir: str) -> dict:
+    """Выполняет один вариант трекера в отдельном процессе и возвращает сводку профилирования."""
+    from scripts.tracker import track_video_and_center_object
+    from scripts.virtual_camera import VirtualCamera
+
+    kwargs = dict(tracking_kwargs)
+    if kwargs.get('virtual_camera') == 'default':
+        kwargs['virtual_camera'] = VirtualCamera(output_size=kwargs.get('target_imgsz', 640))
+
+    if model_path:
+        model = roi_model = None  # Реальная модель загружается трекером из model_path
+    else:
+        model, roi_model = SyntheticDetector(), SyntheticDetector()
+        model_path = 'synthetic'
+
+    profile_path = os.path.join(work_dir, f'{case}_profile.json')
+    output_path = os.path.join(work_dir, f'{case}.mp4')
+    ok = track_video_and_center_object(model_path, video_path, output_path, model=model, roi_model=roi_model,
+                                       profile_path=profile_path, **kwargs)
+    if not ok:
+        raise RuntimeError(f"Вариант '{case}' завершился с ошибкой")
+    with open(profile_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def run_benchmark(
+    cases: Optional[Sequence[str]] = None,
+    resolutions: Sequence[Tuple[int, int]] = DEFAULT_RESOLUTIONS,
+    frames: int = 300,
+    model_path: Optional[str] = None,
+    results_path: str = os.path.join('runs', 'benchmark', 'results.csv'),
+    videos_dir: str = os.path.join('runs', 'benchmark', 'videos')
+) -> Tuple[List[dict], List[str]]:
+    """
+    Прогоняет варианты трекера на синтетических видео и дописывает результаты в CSV.
+
+    Каждый вариант выполняется в отдельном процессе, чтобы пиковая память и прогрев не влияли
+    на соседние замеры. Синтетические видео кэшируются в videos_dir и переиспользуются между запусками.
+    Варианты, которые нельзя выполнить на этой машине (например, запись через ffmpeg без ffmpeg), пропускаются;
+    остальные ошибки вариантов возвращаются как сбои.
+
+    Args:
+        cases (Sequence[str], optional): Имена вариантов из BENCHMARK_CASES (по умолчанию все).
+        resolutions (Sequence[Tuple[int, int]]): Разрешения синтетических видео (ширина, высота).
+        frames (int): Длина синтетических видео в кадрах.
+        model_path (str, optional): Путь к модели YOLO (например, маленькой экспортированной);
+            если не задан, используется SyntheticDetector и бенчмарк работает без весов.
+        results_path (str): CSV с результатами; новые строки дописываются для сравнения между запусками.
+        videos_dir (str): Директория для кэша синтетических видео.
+
+    Returns:
+        Tuple[List[dict], List[str]]: Строки результатов текущего запуска и описания сбоев вариантов.
+    """
+    cases = list(cases) if cases else list(BENCHMARK_CASES)
+    unknown = [c for c in cases if c not in BENCHMARK_CASES]
+    if unknown:
+        raise ValueError(f"Неизвестные варианты бенчмарка: {', '.join(unknown)}. Доступны: {', '.join(BENCHMARK_CASES)}")
+
+    commit = _git_commit()
+    context = multiprocessing.get_context('spawn')
+    rows = []
+    failures = []
+
+    for width, height in resolutions:
+        video_path = os.path.join(videos_dir, f'synthetic_{width}x{height}_{frames}.mp4')
+        if not os.path.exists(video_path):
+            print(f"Создание синтетического видео {video_path}...")
+            generate_synthetic_video(video_path, width, height, frames)
+
+        with tempfile.TemporaryDirectory() as work_dir:
+            for case in cases:
+                skip_reason = _skip_reason(BENCHMARK_CASES[case])
+                if skip_reason:
+                    print(f"{case:<20} {width}x{height}: пропущен ({skip_reason})")
+                    continue
+                try:
+                    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                        summary = executor.submit(_run_case, case, BENCHMARK_CASES[case], video_path, model_path, work_dir).result()
+                except Exception as e:
+                    failures.append(f"{case} {width}x{height}: {type(e).__name__}: {e}")
+                    print(f"{case:<20} {width}x{height}: ОШИБКА ({type(e).__name__}: {e})")
+                    continue
+
+                stages = summary['stages']
+                row = {
+                    'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                    'commit': commit,
+                    'case': case,
+                    'width': width,
+                    'height': height,
+                    'frames': summary['frames'],
+                    'detector': os.path.basename(model_path) if model_path else 'synthetic',
+                    'fps': summary['fps'],
+                    'wall_s': summary['wall_s'],
+                    'peak_rss_mb': summary['peak_rss_mb'],
+                    'output_mb': round(os.path.getsize(os.path.join(work_dir, f'{case}.mp4')) / (1024 * 1024), 2),
+                    'cpu_count': os.cpu_count(),
+                    'platform': platform.platform(),
+                    'opencv': cv2.__version__,
+                }
+                for stage, stats in stages.items():
+                    row[f'{stage}_ms'] = stats['mean_ms']
+                    row[f'{stage}_p95_ms'] = stats['p95_ms']
+                rows.append(row)
+                print(f"{case:<20} {width}x{height}: {row['fps']:8.1f} FPS, пиковая память {row['peak_rss_mb']:.0f} МБ")
+
+    if rows:
+        _append_results(results_path, rows)
+        print(f"Результаты бенчмарка дописаны в: {results_path} ({len(rows)} строк)")
+    if failures:
+        print(f"Сбоев вариантов: {len(failures)}")
+    return rows, failures
+
+
+def _append_results(results_path: str, rows: List[dict]) -> None:
+    directory = os.path.dirname(results_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    write_header = not os.path.exists(results_path)
+    columns = RESULT_COLUMNS
+    if not write_header:
+        # Дописываем в столбцы существующего файла (он мог быть создан версией с другим набором столбцов)
+        with open(results_path, 'r', newline='', encoding='utf-8') as f:
+            columns = next(csv.reader(f), RESULT_COLUMNS)
+    with open(results_path, 'a', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
+        if write_header:
+            writer.writeheader()
+        writer.writerows(rows)
+
+
+def compare_with_baseline(rows: List[dict], baseline_path: str, max_fps_drop: float = 0.1) -> List[str]:
+    """
+    Сравнивает FPS текущего запуска с последними результатами тех же вариантов в baseline_path.
+
+    Args:
+        rows (List[dict]): Результаты текущего запуска (из run_benchmark).
+        baseline_path (str): CSV с эталонными результатами.
+        max_fps_drop (float): Допустимое относительное падение FPS (0.1 = 10%).
+
+    Returns:
+        List[str]: Описания регрессий (пустой список, если регрессий нет).
+    """
+    baseline = {}
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            # Более поздние строки перекрывают ранние: эталоном служит последний замер варианта
+            baseline[(row['case'], row['width'], row['height'], row['detector'])] = float(row['fps'])
+
+    regressions = []
+    for row in rows:
+        key = (row['case'], str(row['width']), str(row['height']), row['detector'])
+        if key in baseline and row['fps'] < baseline[key] * (1 - max_fps_drop):
+            regressions.append(f"{row['case']} {row['width']}x{row['height']}: {row['fps']:.1f} FPS против {baseline[key]:.1f} FPS в эталоне")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Точка входа командной строки.
+
+    Пример (из корня проекта):
+        python -m scripts.benchmark_tracker --cases baseline pipelined_b8 roi --frames 300 --baseline runs/benchmark/baseline.csv
+    """
+    parser = argparse.ArgumentParser(description="Бенчмарк трекера на синтетических видео.")
+    parser.add_argument('--cases', nargs='*', default=None, help=f"Варианты трекера: {', '.join(BENCHMARK_CASES)}")
+    parser.add_argument('--resolutions', nargs='*', default=[f'{w}x{h}' for w, h in DEFAULT_RESOLUTIONS], help="Разрешения видео, например 1280x720 3840x2160")
+    parser.add_argument('--frames', type=int, default=300, help="Длина синтетических видео в кадрах")
+    parser.add_argument('--model', default=None, help="Модель YOLO вместо синтетического детектора")
+    parser.add_argument('--results', default=os.path.join('runs', 'benchmark', 'results.csv'), help="CSV для результатов")
+    parser.add_argument('--baseline', default=None, help="CSV с эталонными результатами для проверки регрессий")
+    parser.add_argument('--max-fps-drop', type=float, default=0.1, help="Допустимое падение FPS относительно эталона")
+    args = parser.parse_args(argv)
+
+    resolutions = [tuple(int(v) for v in r.lower().split('x')) for r in args.resolutions]
+    rows, failures = run_benchmark(args.cases, resolutions, args.frames, args.model, args.results)
+    for message in failures:
+        print(f"СБОЙ: {message}")
+
+    regressions = []
+    if args.baseline:
+        regressions = compare_with_baseline(rows, args.baseline, args.max_fps_drop)
+        for message in regressions:
+            print(f"РЕГРЕССИЯ: {message}")
+    return 1 if failures or regressions else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,108 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List, Optional, Sequence
+
+# Модули, которые должны импортироваться быстро: CLI-утилиты датасета и модули, которые загружают
+# рабочие процессы пакетной обработки до того, как им понадобится модель
+LIGHT_MODULES = (
+    'scripts.tracker',
+    'scripts.batch_tracker',
+    'scripts.chunked_tracker',
+    'scripts.offline_render',
+    'scripts.detection_cache',
+    'scripts.create_all_frames',
+    'scripts.dataset_builder',
+    'scripts.dataset_index',
+    'scripts.label_store',
+    'scripts.label_validation',
+    'scripts.split_train_val',
+    'scripts.copy_test_data',
+    'scripts.select_test_frames',
+    'scripts.utils',
+    'scripts.visualization_utils',
+)
+# Тяжелые зависимости, которые должны загружаться только при первом использовании
+HEAVY_MODULES = ('ultralytics', 'torch', 'IPython', 'wandb')
+DEFAULT_BUDGET_SECONDS = 1.0
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_MEASURE_CODE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds': elapsed, 'heavy': sorted(m for m in {heavy!r} if m in sys.modules)}}))
+"""
+
+
+def measure_import(module: str, repeat: int = 3) -> Dict:
+    """
+    Время импорта модуля в новом интерпретаторе (холодный старт процесса; лучшее из repeat запусков,
+    чтобы не учитывать первое чтение файлов с диска) и загруженные при этом тяжелые зависимости.
+
+    Raises:
+        RuntimeError: Если модуль не импортируется.
+    """
+    best = None
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, '-c', _MEASURE_CODE.format(module=module, heavy=HEAVY_MODULES)],
+            cwd=PROJECT_ROOT, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"Не удалось импортировать {module}: {result.stderr.strip().splitlines()[-1:]}")
+        measurement = json.loads(result.stdout.strip().splitlines()[-1])
+        if best is None or measurement['seconds'] < best['seconds']:
+            best = measurement
+    return best
+
+
+def check_import_time(modules: Sequence[str] = LIGHT_MODULES, budget: float = DEFAULT_BUDGET_SECONDS, repeat: int = 3) -> bool:
+    """
+    Проверяет, что каждый модуль импортируется в новом процессе не дольше budget секунд
+    и не загружает тяжелые зависимости (HEAVY_MODULES). Выводит таблицу результатов.
+
+    Returns:
+        bool: True, если все модули уложились в бюджет.
+    """
+    ok = True
+    print(f"{'Модуль':<32} {'Импорт, с':>10}  Тяжелые зависимости")
+    for module in modules:
+        try:
+            measurement = measure_import(module, repeat)
+        except RuntimeError as e:
+            print(e)
+            ok = False
+            continue
+        over_budget = measurement['seconds'] > budget
+        status = "  ПРЕВЫШЕН БЮДЖЕТ" if over_budget else ""
+        print(f"{module:<32} {measurement['seconds']:>10.3f}  {', '.join(measurement['heavy']) or '-'}{status}")
+        if over_budget or measurement['heavy']:
+            ok = False
+    print(f"\nБюджет: {budget:.2f} с. " + ("Все модули уложились." if ok else "Есть нарушения."))
+    return ok
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Точка входа командной строки. Код возврата 1, если хотя бы один модуль превысил бюджет
+    или загрузил тяжелую зависимость при импорте. Автоматически тот же замер выполняет
+    tests/test_import_time.py.
+
+    Пример (из корня проекта):
+        python -m scripts.check_import_time --budget 1.0
+    """
+    parser = argparse.ArgumentParser(description="Проверка времени импорта легких модулей проекта.")
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET_SECONDS, help="Максимальное время импорта модуля, с")
+    parser.add_argument('--modules', nargs='+', default=list(LIGHT_MODULES), help="Проверяемые модули")
+    parser.add_argument('--repeat', type=int, default=3, help="Запусков на модуль (берется лучший)")
+    args = parser.parse_args(argv)
+    return 0 if check_import_time(args.modules, args.budget, args.repeat) else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,409 @@
+import argparse
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from scripts.offline_render import Trajectory, plan_camera_path, render_camera_path
+from scripts.tracker import TrackedFrames, add_tracking_arguments, tracking_kwargs_from_args
+from scripts.worker_pool import load_worker_models, model_process_pool
+
+
+CAMERA_MODES = ('online', 'smooth')
+# Минимальный IoU bbox цели в перекрытии, при котором ID соседних частей считаются одним треком
+ID_MATCH_IOU = 0.5
+
+
+class ChunkTrack:
+    """
+    Результат отслеживания одной части видео.
+
+    Attributes:
+        first_frame (int): Первый обработанный кадр (с 0), включая кадры разогрева в перекрытии с предыдущей частью.
+        start_frame (int): Первый кадр, который принадлежит этой части в итоговом видео.
+        bboxes (np.ndarray): bbox цели формы (N, 4); NaN — цель не обнаружена.
+        track_ids (np.ndarray): Локальные ID трека цели формы (N,); -1 — нет цели.
+        conf (np.ndarray): Уверенность детекции цели формы (N,).
+        transforms (np.ndarray): Преобразование кадра в выходной (scale, offset_x, offset_y) формы (N, 3); NaN — центр неизвестен.
+        fps (float): Частота кадров видео.
+        frame_size (Tuple[int, int]): Ширина и высота кадров видео.
+    """
+
+    def __init__(self, first_frame: int, start_frame: int, bboxes: np.ndarray, track_ids: np.ndarray, conf: np.ndarray,
+                 transforms: np.ndarray, fps: float, frame_size: Tuple[int, int]):
+        self.first_frame = first_frame
+        self.start_frame = start_frame
+        self.bboxes = bboxes
+        self.track_ids = track_ids
+        self.conf = conf
+        self.transforms = transforms
+        self.fps = fps
+        self.frame_size = frame_size
+
+    def __len__(self) -> int:
+        return len(self.bboxes)
+
+    @property
+    def end_frame(self) -> int:
+        return self.first_frame + len(self)
+
+
+def split_into_chunks(total_frames: int, chunks: int, overlap_frames: int) -> List[Tuple[int, int, Optional[int]]]:
+    """
+    Делит видео на части равной длины.
+
+    Returns:
+        List[Tuple[int, int, Optional[int]]]: Для каждой части (первый кадр с разогревом, первый собственный кадр,
+            кадр окончания не включительно). Кадры разогрева — последние overlap_frames кадров предыдущей части:
+            на них трекер и камера входят в установившееся состояние. У последней части конец None (до конца видео),
+            поскольку CAP_PROP_FRAME_COUNT бывает неточным.
+    """
+    chunks = max(1, min(chunks, total_frames))
+    bounds = [round(total_frames * k / chunks) for k in range(chunks + 1)]
+    result = []
+    for k in range(chunks):
+        start = bounds[k]
+        end = bounds[k + 1] if k < chunks - 1 else None
+        result.append((max(0, start - overlap_frames), start, end))
+    return result
+
+
+def _track_chunk(model_path: str, video_input_path: str, first_frame: int, start_frame: int, end_frame: Optional[int],
+                 tracking_kwargs: dict) -> ChunkTrack:
+    """Отслеживает цель на части видео в процессе-обработчике (без обрезки кадров)."""
+    tracked = TrackedFrames(model_path, video_input_path, start_frame=first_frame, end_frame=end_frame,
+                            model_loader=load_worker_models, render_crops=False, **tracking_kwargs)
+    bboxes, track_ids, conf, transforms = [], [], [], []
+    for result in tracked:
+        if result.found:
+            bboxes.append(result.bbox)
+            track_ids.append(result.track_id)
+            conf.append(result.confidence)
+        else:
+            bboxes.append((np.nan,) * 4)
+            track_ids.append(-1.0)
+            conf.append(0.0)
+        transforms.append(result.transform if result.transform is not None else (np.nan,) * 3)
+
+    return ChunkTrack(
+        first_frame, start_frame,
+        np.asarray(bboxes, dtype=np.float64).reshape(-1, 4),
+        np.asarray(track_ids, dtype=np.float64),
+        np.asarray(conf, dtype=np.float64),
+        np.asarray(transforms, dtype=np.float64).reshape(-1, 3),
+        tracked.fps,
+        (tracked.frame_width, tracked.frame_height),
+    )
+
+
+def _rowwise_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """IoU соответствующих строк двух массивов bbox формы (N, 4); для NaN — 0."""
+    x1 = np.maximum(a[:, 0], b[:, 0])
+    y1 = np.maximum(a[:, 1], b[:, 1])
+    x2 = np.minimum(a[:, 2], b[:, 2])
+    y2 = np.minimum(a[:, 3], b[:, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    union = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1]) + (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1]) - intersection
+    with np.errstate(divide='ignore', invalid='ignore'):
+        iou = intersection / union
+    return np.nan_to_num(iou, nan=0.0)
+
+
+def _camera_from_transforms(transforms: np.ndarray, output_size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Центр и масштаб камеры из преобразований кадра: центр выходного кадра — это scale * center + offset."""
+    scale = transforms[:, 0]
+    half = output_size / 2
+    centers = np.column_stack(((half - transforms[:, 1]) / scale, (half - transforms[:, 2]) / scale))
+    zooms = np.where(np.isnan(scale), 1.0, scale)
+    return centers, zooms
+
+
+def stitch_chunks(chunks: List[ChunkTrack], output_size: int = 640) -> Tuple[Trajectory, np.ndarray, np.ndarray, Dict[str, int]]:
+    """
+    Сшивает результаты частей в единые траекторию цели и путь камеры.
+
+    Кадры перекрытия берутся из предыдущей части (у нее трекер уже в установившемся состоянии).
+    Локальные ID трека следующей части сопоставляются с глобальными голосованием по кадрам перекрытия,
+    где bbox цели обеих частей совпадают (IoU >= ID_MATCH_IOU); остальные ID сдвигаются за наибольший
+    уже выданный глобальный ID. Путь камеры в перекрытии плавно переходит от предыдущей части к следующей.
+
+    Args:
+        chunks (List[ChunkTrack]): Результаты частей в порядке следования.
+        output_size (int): Сторона выходного кадра.
+
+    Returns:
+        Tuple: Траектория цели, центры камеры (T, 2), масштаб камеры (T,) и статистика сшивки
+            {'matched_ids', 'new_ids', 'disagreements'} (disagreements — кадры перекрытия, где части выбрали разные цели).
+    """
+    total = chunks[-1].end_frame
+    bboxes = np.full((total, 4), np.nan)
+    track_ids = np.full(total, -1.0)
+    conf = np.zeros(total)
+    centers = np.full((total, 2), np.nan)
+    zooms = np.ones(total)
+    stats = {'matched_ids': 0, 'new_ids': 0, 'disagreements': 0}
+    max_id = 0.0
+
+    for chunk in chunks:
+        warmup = chunk.start_frame - chunk.first_frame  # Число кадров разогрева в начале части
+        overlap = slice(chunk.first_frame, chunk.start_frame)
+        chunk_centers, chunk_zooms = _camera_from_transforms(chunk.transforms, output_size)
+
+        # Сопоставление ID по кадрам перекрытия
+        mapping: Dict[float, float] = {}
+        if warmup:
+            local_boxes = chunk.bboxes[:warmup]
+            both = ~np.isnan(bboxes[overlap, 0]) & ~np.isnan(local_boxes[:, 0])
+            matched = both & (_rowwise_iou(bboxes[overlap], local_boxes) >= ID_MATCH_IOU)
+            stats['disagreements'] += int((both & ~matched).sum())
+            votes = Counter(zip(chunk.track_ids[:warmup][matched].tolist(), track_ids[overlap][matched].tolist()))
+            for (local_id, global_id), _ in votes.most_common():
+                mapping.setdefault(local_id, global_id)
+
+            # Плавный переход камеры: вес следующей части растет от 0 к 1 на протяжении перекрытия
+            weight = (np.arange(1, warmup + 1) / (warmup + 1))[:, None]
+            previous = centers[overlap]
+            blended = (1 - weight) * previous + weight * chunk_centers[:warmup]
+            blended = np.where(np.isnan(previous), chunk_centers[:warmup], np.where(np.isnan(chunk_centers[:warmup]), previous, blended))
+            centers[overlap] = blended
+            zooms[overlap] = (1 - weight[:, 0]) * zooms[overlap] + weight[:, 0] * chunk_zooms[:warmup]
+
+        local_ids = chunk.track_ids[warmup:]
+        for local_id in np.unique(local_ids[local_ids >= 0]).tolist():
+            if local_id in mapping:
+                stats['matched_ids'] += 1
+            else:
+                mapping[local_id] = local_id + max_id
+                stats['new_ids'] += 1
+
+        part = slice(chunk.start_frame, chunk.end_frame)
+        bboxes[part] = chunk.bboxes[warmup:]
+        track_ids[part] = [mapping.get(i, -1.0) for i in local_ids.tolist()]
+        conf[part] = chunk.conf[warmup:]
+        centers[part] = chunk_centers[warmup:]
+        zooms[part] = chunk_zooms[warmup:]
+        max_id = max(max_id, float(track_ids[:chunk.end_frame].max(initial=0.0)))
+
+    trajectory = Trajectory(bboxes, track_ids, conf, chunks[0].fps, chunks[0].frame_size)
+    return trajectory, centers, zooms, stats
+
+
+def concat_segments(segment_paths: List[str], video_output_path: str) -> bool:
+    """
+    Склеивает видеосегменты с одинаковыми параметрами кодирования в один файл без перекодирования
+    (ffmpeg concat demuxer, -c copy). Если ffmpeg недоступен или склейка не удалась, сегменты
+    перекодируются через OpenCV.
+
+    Returns:
+        bool: True, если выходное видео записано.
+    """
+    ffmpeg_path = shutil.which('ffmpeg')
+    if ffmpeg_path is not None:
+        list_path = os.path.join(os.path.dirname(segment_paths[0]), 'segments.txt')
+        with open(list_path, 'w', encoding='utf-8') as f:
+            for path in segment_paths:
+                escaped = os.path.abspath(path).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+        completed = subprocess.run(
+            [ffmpeg_path, '-hide_banner', '-loglevel', 'error', '-y', '-f', 'concat', '-safe', '0',
+             '-i', list_path, '-c', 'copy', video_output_path],
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        )
+        if completed.returncode == 0:
+            return True
+        print(f"Предупреждение: ffmpeg не смог склеить сегменты без перекодирования: {completed.stderr.decode(errors='replace').strip()}")
+    print("Предупреждение: сегменты будут перекодированы через OpenCV.")
+
+    out = None
+    try:
+        for path in segment_paths:
+            cap = cv2.VideoCapture(path)
+            try:
+                while True:
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    if out is None:
+                        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+                        out = cv2.VideoWriter(video_output_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (frame.shape[1], frame.shape[0]))
+                    out.write(frame)
+            finally:
+                cap.release()
+    finally:
+        if out is not None:
+            out.release()
+    return out is not None
+
+
+def track_video_in_chunks(
+    model_path: str,
+    video_input_path: str,
+    video_output_path: str,
+    chunks: Optional[int] = None,
+    workers: Optional[int] = None,
+    overlap_seconds: float = 2.0,
+    camera: str = 'online',
+    smoothing_seconds: float = 1.0,
+    draw_boxes: bool = True,
+    threads_per_worker: Optional[int] = None,
+    target_imgsz: int = 640,
+    queue_size: int = 32,
+    writer_backend: str = 'auto',
+    video_codec: Optional[str] = None,
+    video_preset: Optional[str] = 'ultrafast',
+    video_crf: Optional[int] = 23,
+    **tracking_kwargs
+) -> bool:
+    """
+    Обрабатывает одно длинное видео параллельно: делит его на части по времени, отслеживает цель в каждой
+    части отдельным процессом, сшивает ID трека и путь камеры и склеивает закодированные сегменты.
+
+    Каждая часть начинается на overlap_seconds раньше своей первой собственной секунды: на кадрах
+    перекрытия трекер, фильтр Калмана и виртуальная камера входят в установившееся состояние, а сами кадры
+    используются для сопоставления ID и плавного перехода камеры (см. stitch_chunks). Затем сегменты
+    рендерятся тем же пулом процессов (см. render_camera_path) и склеиваются без перекодирования
+    (см. concat_segments). Время обработки масштабируется с числом ядер, а не с длиной видео.
+
+    Args:
+        model_path (str): Путь к обученной модели YOLO.
+        video_input_path (str): Путь к видеофайлу (нужен переход по кадрам, потоки не поддерживаются).
+        video_output_path (str): Путь к выходному видео.
+        chunks (int, optional): Количество частей (по умолчанию — число процессов).
+        workers (int, optional): Количество процессов (по умолчанию — min(chunks, число ядер)).
+        overlap_seconds (float): Длина перекрытия соседних частей в секундах.
+        camera (str): 'online' — путь камеры трекера (как при последовательной обработке) с плавными стыками;
+            'smooth' — гладкий путь по всей сшитой траектории (см. plan_camera_path).
+        smoothing_seconds (float): Окно сглаживания камеры для camera='smooth'.
+        draw_boxes (bool): Рисовать bbox и глобальный ID цели на выходных кадрах.
+        threads_per_worker (int, optional): Ограничение потоков torch/OpenCV в каждом процессе.
+        target_imgsz (int): Сторона квадратного выходного кадра.
+        queue_size (int): Размер очередей чтения и записи (конвейерный режим трекера и рендер сегментов).
+        writer_backend, video_codec, video_preset, video_crf: Параметры записи сегментов (см. create_video_writer).
+        **tracking_kwargs: Параметры TrackedFrames (пороги, стратегия выбора цели, detect_interval, ROI,
+            virtual_camera, detection_cache и т.д.).
+
+    Returns:
+        bool: True, если видео успешно обработано.
+    """
+    if camera not in CAMERA_MODES:
+        raise ValueError(f"Неизвестный режим камеры: {camera}. Доступны: {', '.join(CAMERA_MODES)}")
+
+    cap = cv2.VideoCapture(video_input_path)
+    if not cap.isOpened():
+        print(f"Ошибка: Не удалось открыть видеофайл {video_input_path}")
+        return False
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    if total_frames <= 0:
+        print(f"Ошибка: Не удалось определить число кадров в {video_input_path}, параллельная обработка невозможна")
+        return False
+
+    workers = workers or min(chunks or os.cpu_count() or 1, os.cpu_count() or 1)
+    chunk_bounds = split_into_chunks(total_frames, chunks or workers, int(round(overlap_seconds * fps)))
+    workers = min(workers, len(chunk_bounds))
+    print(f"Параллельная обработка: {len(chunk_bounds)} частей, {workers} процессов, перекрытие {overlap_seconds} с")
+
+    output_dir = os.path.dirname(video_output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    # Сегменты пишутся рядом с выходным файлом, чтобы склейка не копировала данные между дисками
+    segment_dir = tempfile.mkdtemp(prefix='.segments_', dir=output_dir or '.')
+    segment_ext = os.path.splitext(video_output_path)[1] or '.mp4'
+
+    try:
+        with model_process_pool(workers, model_path, threads_per_worker) as executor:
+            tracking_kwargs = dict(tracking_kwargs, target_imgsz=target_imgsz, queue_size=queue_size)
+            futures = [executor.submit(_track_chunk, model_path, video_input_path, first, start, end, tracking_kwargs)
+                       for first, start, end in chunk_bounds]
+            chunk_tracks, failed = [], 0
+            for (first, start, end), future in zip(chunk_bounds, futures):
+                try:
+                    chunk_tracks.append(future.result())
+                except Exception as e:  # В том числе аварийное завершение процесса-обработчика
+                    failed += 1
+                    print(f"Ошибка в части с кадра {start} по {end if end is not None else 'конец'}: {type(e).__name__}: {e}")
+            if failed:
+                print(f"Ошибка: не удалось обработать частей: {failed} из {len(futures)}")
+                return False
+
+            trajectory, centers, zooms, stats = stitch_chunks(chunk_tracks, target_imgsz)
+            print(f"Сшивка частей: ID сопоставлено {stats['matched_ids']}, новых {stats['new_ids']}, "
+                  f"кадров перекрытия с разными целями {stats['disagreements']}.")
+            if camera == 'smooth':
+                centers, zooms = plan_camera_path(trajectory, target_imgsz, smoothing_seconds=smoothing_seconds)
+
+            segment_paths = [os.path.join(segment_dir, f'{k:04d}{segment_ext}') for k in range(len(chunk_tracks))]
+            futures = [
+                executor.submit(render_camera_path, video_input_path, path, centers, zooms, target_imgsz,
+                                trajectory=trajectory if draw_boxes else None, queue_size=queue_size,
+                                writer_backend=writer_backend, video_codec=video_codec, video_preset=video_preset,
+                                video_crf=video_crf, start_frame=chunk.start_frame, end_frame=chunk.end_frame)
+                for chunk, path in zip(chunk_tracks, segment_paths)
+            ]
+            rendered = []
+            for chunk, future in zip(chunk_tracks, futures):
+                try:
+                    rendered.append(future.result())
+                except Exception as e:
+                    print(f"Ошибка записи сегмента с кадра {chunk.start_frame}: {type(e).__name__}: {e}")
+                    rendered.append(False)
+            if not all(rendered):
+                print("Ошибка: не удалось записать один или несколько сегментов")
+                return False
+
+        if not concat_segments(segment_paths, video_output_path):
+            print(f"Ошибка: не удалось склеить сегменты в {video_output_path}")
+            return False
+    finally:
+        shutil.rmtree(segment_dir, ignore_errors=True)
+
+    print(f"Параллельная обработка завершена: {len(trajectory)} кадров. Результат сохранен в {video_output_path}")
+    return True
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Точка входа командной строки для параллельной обработки одного длинного видео.
+
+    Пример (из корня проекта):
+        python -m scripts.chunked_tracker --model best.pt --input long_run.mp4 --output runs/track/long_run.mp4 --workers 8
+    """
+    parser = argparse.ArgumentParser(description="Параллельное отслеживание и центрирование сноубордиста в длинном видео.")
+    parser.add_argument('--input', required=True, help="Исходное видео")
+    parser.add_argument('--output', required=True, help="Выходное видео")
+    parser.add_argument('--workers', type=int, default=None, help="Количество процессов (по умолчанию — число ядер)")
+    parser.add_argument('--chunks', type=int, default=None, help="Количество частей (по умолчанию — число процессов)")
+    parser.add_argument('--overlap', type=float, default=2.0, help="Перекрытие соседних частей в секундах")
+    parser.add_argument('--camera', default='online', choices=CAMERA_MODES, help="Путь камеры: трекера со сшитыми стыками или сглаженный по всему видео")
+    parser.add_argument('--smoothing', type=float, default=1.0, help="Окно сглаживания камеры в секундах (--camera smooth)")
+    parser.add_argument('--threads-per-worker', type=int, default=None, help="Потоков torch/OpenCV на процесс")
+    add_tracking_arguments(parser)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), format='%(levelname)s %(name)s: %(message)s')
+
+    tracking_kwargs = tracking_kwargs_from_args(args)
+    # Профилирование относится к одному процессу и в параллельном режиме не выполняется
+    tracking_kwargs.pop('profile_path')
+    tracking_kwargs.pop('profile_trace_path')
+    ok = track_video_in_chunks(
+        args.model, args.input, args.output,
+        chunks=args.chunks,
+        workers=args.workers,
+        overlap_seconds=args.overlap,
+        camera=args.camera,
+        smoothing_seconds=args.smoothing,
+        threads_per_worker=args.threads_per_worker,
+        **tracking_kwargs
+    )
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
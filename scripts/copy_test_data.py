@@ -1,7 +1,11 @@
-import os
-import shutil
+import argparse
+from typing import List, Optional
 
-# --- Настройка путей (относительно папки scripts) ---
+from scripts.label_store import LabelStore
+from scripts.label_validation import validate_annotations
+from scripts.dataset_builder import LINK_MODES, build_split, list_images
+
+# --- Настройка путей (относительно корня проекта) ---
 # Папка с сырыми изображениями тестового набора
 SOURCE_TEST_IMAGES_DIR = 'resources/test_raw'
 # Папка со всеми аннотациями
@@ -9,41 +13,67 @@ ALL_ANNOTATIONS_DIR = 'resources/annotations'
 
 # Целевые папки в вашей структуре dataset
 DEST_DATASET_BASE_DIR = 'resources/dataset'
-DEST_TEST_IMAGES_DIR = os.path.join(DEST_DATASET_BASE_DIR, 'images', 'test')
-DEST_TEST_LABELS_DIR = os.path.join(DEST_DATASET_BASE_DIR, 'labels', 'test')
 
-# --- Убедимся, что целевые папки существуют ---
-os.makedirs(DEST_TEST_IMAGES_DIR, exist_ok=True)
-os.makedirs(DEST_TEST_LABELS_DIR, exist_ok=True)
 
-print(f"Копирование тестовых данных из {SOURCE_TEST_IMAGES_DIR} и {ALL_ANNOTATIONS_DIR} в {DEST_DATASET_BASE_DIR}...")
+def copy_test_data(
+    source_images_dir: str = SOURCE_TEST_IMAGES_DIR,
+    annotations_dir: str = ALL_ANNOTATIONS_DIR,
+    dataset_dir: str = DEST_DATASET_BASE_DIR,
+    mode: str = 'auto',
+    workers: Optional[int] = None,
+    label_store: Optional[str] = None,
+    validate: bool = True
+) -> bool:
+    """
+    Раскладывает тестовые изображения и их аннотации в тестовую выборку датасета
+    (см. dataset_builder.build_split).
+
+    Если задан label_store (путь к хранилищу аннотаций, см. scripts.label_store), аннотации
+    выгружаются из него, а не из annotations_dir. При validate=True аннотации изображений выборки
+    сначала проверяются (см. scripts.label_validation), и при ошибках датасет не собирается.
+
+    Returns:
+        bool: True, если у всех изображений нашлись корректные аннотации.
+    """
+    print(f"Копирование тестовых данных из {source_images_dir} и {annotations_dir} в {dataset_dir}...")
+    test_image_names = list_images(source_images_dir)
+    store = LabelStore.open(label_store) if label_store else None
+    if validate:
+        validation = validate_annotations(annotations_dir, store, names=test_image_names, workers=workers)
+        if not validation.ok:
+            validation.print_report()
+            print("Ошибка: аннотации не прошли проверку, тестовая выборка не собрана.")
+            return False
+    counts = build_split({'test': test_image_names}, source_images_dir, annotations_dir, dataset_dir,
+                         mode=mode, workers=workers, label_store=store)['test']
 
-# Получаем список имен файлов изображений из сырой тестовой папки
-test_image_names = [f for f in os.listdir(SOURCE_TEST_IMAGES_DIR) if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
+    print(f"\nЗавершено копирование тестовых данных.")
+    print(f"Изображений в тестовой выборке: {len(test_image_names)}")
+    print(f"Файлов аннотаций: {len(test_image_names) - counts['missing_labels']}")
+    return counts['missing_labels'] == 0
 
-copied_images_count = 0
-copied_labels_count = 0
 
-for img_name in test_image_names:
-    base_name = os.path.splitext(img_name)[0] # Имя файла без расширения
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Точка входа командной строки.
 
-    # Копируем изображение
-    src_image_path = os.path.join(SOURCE_TEST_IMAGES_DIR, img_name)
-    dest_image_path = os.path.join(DEST_TEST_IMAGES_DIR, img_name)
-    shutil.copy(src_image_path, dest_image_path)
-    copied_images_count += 1
+    Пример (из корня проекта):
+        python -m scripts.copy_test_data --mode hardlink
+    """
+    parser = argparse.ArgumentParser(description="Копирование тестовых изображений и аннотаций в датасет.")
+    parser.add_argument('--images', default=SOURCE_TEST_IMAGES_DIR, help="Директория тестовых кадров")
+    parser.add_argument('--annotations', default=ALL_ANNOTATIONS_DIR, help="Директория всех аннотаций")
+    parser.add_argument('--dataset', default=DEST_DATASET_BASE_DIR, help="Корневая директория датасета")
+    parser.add_argument('--mode', default='auto', choices=LINK_MODES, help="Ссылки или копирование изображений (аннотации всегда копируются)")
+    parser.add_argument('--workers', type=int, default=None, help="Потоков копирования")
+    parser.add_argument('--label-store', default=None, help="Хранилище аннотаций (вместо --annotations)")
+    parser.add_argument('--no-validate', action='store_true', help="Не проверять аннотации перед сборкой")
+    args = parser.parse_args(argv)
 
-    # Копируем соответствующую аннотацию
-    label_name = base_name + '.txt'
-    src_label_path = os.path.join(ALL_ANNOTATIONS_DIR, label_name)
-    dest_label_path = os.path.join(DEST_TEST_LABELS_DIR, label_name)
+    ok = copy_test_data(args.images, args.annotations, args.dataset, args.mode, args.workers, args.label_store,
+                        validate=not args.no_validate)
+    return 0 if ok else 1
 
-    if os.path.exists(src_label_path):
-        shutil.copy(src_label_path, dest_label_path)
-        copied_labels_count += 1
-    else:
-        print(f"Warning: Annotation file {label_name} not found for image {img_name} in {ALL_ANNOTATIONS_DIR}. Skipping label copy for this image.")
 
-print(f"\nЗавершено копирование тестовых данных.")
-print(f"Скопировано изображений: {copied_images_count}")
-print(f"Скопировано файлов аннотаций: {copied_labels_count}")
\ No newline at end of file
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,64 +1,270 @@
-import cv2
+import argparse
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import cv2
+import numpy as np
+
+from scripts.frame_sampling import ContentSampler, FrameHashIndex, dhash
+
+
+DEFAULT_VIDEO_PATH = 'resources/snowboard_day.mp4'
+DEFAULT_OUTPUT_FOLDER = 'resources/all_frames'
+SAMPLING_MODES = ('interval', 'content')
+# Суффикс недописанного кадра: не расширение изображения, поэтому такие файлы не считаются кадрами датасета
+PARTIAL_SUFFIX = '.part'
+
+
+def frame_filename(output_folder: str, saved_index: int) -> str:
+    """Путь к сохраненному кадру с порядковым номером saved_index (frame_0000.jpg, frame_0001.jpg, ...)."""
+    return os.path.join(output_folder, f'frame_{saved_index:04d}.jpg')
+
+
+def content_frame_filename(output_folder: str, video_path: str, frame_index: int) -> str:
+    """
+    Путь к кадру, отобранному по содержимому: <имя видео>_<номер кадра видео>.jpg.
+    Номера сохраненных кадров идут с пропусками, поэтому в имени — номер кадра в видео,
+    а имя видео позволяет складывать кадры нескольких видео в одну директорию.
+    """
+    stem = os.path.splitext(os.path.basename(video_path))[0]
+    return os.path.join(output_folder, f'{stem}_{frame_index:06d}.jpg')
+
+
+def _write_frame(path: str, frame: np.ndarray, params: List[int]) -> bool:
+    """Кодирует и записывает кадр атомарно: при прерывании не остается недописанных файлов, которые resume принял бы за готовые."""
+    ok, encoded = cv2.imencode(os.path.splitext(path)[1], frame, params)
+    if not ok:
+        return False
+    tmp_path = path + PARTIAL_SUFFIX
+    with open(tmp_path, 'wb') as f:
+        f.write(encoded.tobytes())
+    os.replace(tmp_path, path)
+    return True
+
+
+def remove_partial_frames(output_folder: str) -> int:
+    """Удаляет недописанные кадры (*.part), оставшиеся от прерванного извлечения. Возвращает их количество."""
+    removed = 0
+    with os.scandir(output_folder) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.endswith(PARTIAL_SUFFIX):
+                os.remove(entry.path)
+                removed += 1
+    return removed
+
+
+def extract_frames(
+    video_path: str,
+    output_folder: str,
+    interval_seconds: float = 1.0,
+    frame_interval: Optional[int] = None,
+    workers: Optional[int] = None,
+    resume: bool = True,
+    seek: bool = False,
+    jpeg_quality: Optional[int] = None,
+    max_pending: int = 64,
+    sampling: str = 'interval',
+    hash_threshold: int = 10,
+    hash_index: Optional[FrameHashIndex] = None
+) -> int:
+    """
+    Извлекает из видео каждый frame_interval-й кадр в JPEG (frame_0000.jpg, frame_0001.jpg, ...).
+
+    При sampling='content' кадры сетки frame_interval только кандидаты: кадр сохраняется, если его
+    перцептивный хэш (dHash) отличается от последнего сохраненного кадра больше чем на hash_threshold бит,
+    а при заданном hash_index — и от всех кадров датасета (см. ContentSampler). Так длинные участки почти
+    одинаковых кадров дают один кадр, а динамичные — несколько. Файлы в этом режиме называются
+    <имя видео>_<номер кадра>.jpg.
+
+    Ненужные кадры пропускаются через cap.grab() без преобразования в BGR, а при seek=True — переходом
+    к нужному кадру (для редкой выборки из длинного видео это быстрее, чем разбирать все кадры подряд).
+    Кодирование JPEG и запись на диск выполняются пулом потоков, декодирование при этом не ждет диска.
+    Номер файла однозначно соответствует кадру видео, поэтому при resume=True уже сохраненные кадры
+    не декодируются и не перезаписываются, и прерванное извлечение можно продолжить.
 
-video_path = 'resources/snowboard_day.mp4'
-output_folder = 'resources/all_frames'
-
-# Убедимся, что папка существует
-os.makedirs(output_folder, exist_ok=True)
-print(f"Папка для сохранения кадров: {os.path.abspath(output_folder)}")
-
-cap = cv2.VideoCapture(video_path)
-
-# Проверка, открылось ли видео
-if not cap.isOpened():
-    print(f"Ошибка: Не удалось открыть видеофайл по пути: {video_path}")
-    exit() # Выходим, если видео не открылось
-
-frame_rate = cap.get(cv2.CAP_PROP_FPS)
-# Проверка, что frame_rate валиден
-if frame_rate == 0:
-    print("Ошибка: Частота кадров видео равна 0. Возможно, видеофайл поврежден или не поддерживается.")
-    exit()
-
-frame_interval = int(frame_rate * 1)
-print(f"Частота кадров видео: {frame_rate} FPS")
-print(f"Сохраняем каждый {frame_interval}-й кадр (примерно 1 кадр в секунду)")
-
-count = 0
-saved_frame_count = 0
-
-while True:
-    ret, frame = cap.read()
-
-    if not ret:
-        print("Конец видеопотока или ошибка при чтении кадра.")
-        break
-
-    if count % frame_interval == 0:
-        if frame is None:
-            print(f"Предупреждение: Кадр {count} пуст (None), пропускаем сохранение.")
-            count += 1 # Важно увеличить счетчик, чтобы не застрять
-            continue
-
-        # Добавим проверку размера кадра, чтобы убедиться, что он не пуст
-        if frame.size == 0:
-            print(f"Предупреждение: Кадр {count} имеет нулевой размер, пропускаем сохранение.")
-            count += 1
-            continue
-        
-        frame_filename = os.path.join(output_folder, f'frame_{saved_frame_count:04d}.jpg')
-        
-        # Попытка сохранения и проверка результата cv2.imwrite
-        success = cv2.imwrite(frame_filename, frame)
-        
-        if success:
+    Args:
+        video_path (str): Путь к видеофайлу.
+        output_folder (str): Директория для кадров.
+        interval_seconds (float): Интервал между сохраняемыми кадрами в секундах видео.
+        frame_interval (int, optional): Интервал в кадрах (имеет приоритет над interval_seconds).
+        workers (int, optional): Количество потоков записи (по умолчанию — число ядер).
+        resume (bool): Не сохранять кадры, файлы которых уже существуют.
+        seek (bool): Переходить к нужным кадрам через CAP_PROP_POS_FRAMES вместо grab().
+        jpeg_quality (int, optional): Качество JPEG (0-100); по умолчанию — значение OpenCV.
+        max_pending (int): Максимум кадров в очереди записи (ограничивает память).
+        sampling (str): 'interval' — каждый frame_interval-й кадр; 'content' — отбор по содержимому.
+        hash_threshold (int): Расстояние Хэмминга dHash (из 64 бит), до которого кадры считаются почти одинаковыми.
+        hash_index (FrameHashIndex, optional): Индекс хэшей датасета для устранения дубликатов между видео
+            и запусками; сохраненные кадры добавляются в него (сохранять индекс на диск — задача вызывающего кода).
+
+    Returns:
+        int: Количество сохраненных кадров (включая уже существовавшие при resume=True).
+
+    Raises:
+        RuntimeError: Если видео не открывается или его частота кадров неизвестна.
+    """
+    if sampling not in SAMPLING_MODES:
+        raise ValueError(f"Неизвестный режим отбора кадров: {sampling}. Доступны: {', '.join(SAMPLING_MODES)}")
+    sampler = ContentSampler(hash_threshold, hash_index) if sampling == 'content' else None
+
+    os.makedirs(output_folder, exist_ok=True)
+    print(f"Папка для сохранения кадров: {os.path.abspath(output_folder)}")
+    removed_partial = remove_partial_frames(output_folder)
+    if removed_partial:
+        print(f"Удалено недописанных кадров прерванного запуска: {removed_partial}.")
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Ошибка: Не удалось открыть видеофайл по пути: {video_path}")
+
+    frame_rate = cap.get(cv2.CAP_PROP_FPS)
+    if frame_interval is None:
+        if frame_rate == 0:
+            cap.release()
+            raise RuntimeError("Ошибка: Частота кадров видео равна 0. Возможно, видеофайл поврежден или не поддерживается.")
+        frame_interval = max(1, int(frame_rate * interval_seconds))
+    print(f"Частота кадров видео: {frame_rate} FPS")
+    if sampler is None:
+        print(f"Сохраняем каждый {frame_interval}-й кадр")
+    else:
+        print(f"Проверяем каждый {frame_interval}-й кадр, сохраняем отличающиеся больше чем на {hash_threshold} бит dHash")
+
+    params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality] if jpeg_quality is not None else []
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    pending = threading.BoundedSemaphore(max_pending)
+    failed: List[str] = []
+    saved_frame_count = 0
+    skipped_existing = 0
+
+    def on_written(future, path: str) -> None:
+        pending.release()
+        try:
+            ok = future.result()
+        except (OSError, cv2.error):
+            ok = False
+        if not ok:
+            failed.append(path)
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        saved_index = 0
+        position = 0  # Номер следующего кадра, который вернет cap
+        while True:
+            target = saved_index * frame_interval
+            if sampler is None:
+                path = frame_filename(output_folder, saved_index)
+            else:
+                path = content_frame_filename(output_folder, video_path, target)
+            # В режиме content решение о сохранении зависит от предыдущих кадров, поэтому кадр декодируется всегда
+            if sampler is None and resume and os.path.exists(path):
+                saved_index += 1
+                skipped_existing += 1
+                # Без номера кадра в видео конец можно определить только чтением
+                if total_frames <= 0 or target + frame_interval < total_frames:
+                    continue
+                break
+
+            if seek and target != position:
+                if not cap.set(cv2.CAP_PROP_POS_FRAMES, target):
+                    print(f"Ошибка: Не удалось перейти к кадру {target}.")
+                    break
+                position = target
+            ok = True
+            while ok and position < target:
+                ok = cap.grab()
+                position += 1
+            if not ok or not cap.grab():
+                print("Конец видеопотока или ошибка при чтении кадра.")
+                break
+            position += 1
+            ret, frame = cap.retrieve()
+            if not ret or frame is None or frame.size == 0:
+                print(f"Предупреждение: Кадр {target} пуст, пропускаем сохранение.")
+                saved_index += 1
+                continue
+
+            if sampler is not None:
+                frame_hash = dhash(frame)
+                if not sampler.accept(frame_hash, path):
+                    saved_index += 1
+                    continue
+                sampler.keep(frame_hash, path)
+                if resume and os.path.exists(path):
+                    saved_index += 1
+                    skipped_existing += 1
+                    continue
+
+            pending.acquire()
+            future = executor.submit(_write_frame, path, frame, params)
+            future.add_done_callback(lambda f, p=path: on_written(f, p))
+            saved_index += 1
             saved_frame_count += 1
-            print(f"Сохранен кадр: {frame_filename}")
-        else:
-            print(f"Ошибка: Не удалось сохранить кадр {frame_filename}. Проверьте путь и права доступа.")
 
-    count += 1
+    cap.release()
+    for path in failed:
+        print(f"Ошибка: Не удалось сохранить кадр {path}. Проверьте путь и права доступа.")
+    saved_frame_count -= len(failed)
+    if skipped_existing:
+        print(f"Пропущено уже сохраненных кадров: {skipped_existing}.")
+    if sampler is not None:
+        print(f"Отброшено похожих на предыдущий кадр: {sampler.rejected_similar}, дубликатов кадров датасета: {sampler.rejected_duplicates}.")
+    print(f"Извлечено {saved_frame_count} кадров.")
+    return saved_frame_count + skipped_existing
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Точка входа командной строки.
+
+    Пример (из корня проекта):
+        python -m scripts.create_all_frames --video resources/snowboard_day.mp4 --output resources/all_frames --interval 1
+        # Отбор по содержимому с устранением дубликатов по всему датасету
+        python -m scripts.create_all_frames --video new_run.mp4 --output resources/all_frames --interval 0.2 --sampling content \
+            --hash-index resources/frame_hashes.json --dedupe-against resources/all_frames
+    """
+    parser = argparse.ArgumentParser(description="Извлечение кадров из видео с заданным интервалом.")
+    parser.add_argument('--video', default=DEFAULT_VIDEO_PATH, help="Исходное видео")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT_FOLDER, help="Директория для кадров")
+    parser.add_argument('--interval', type=float, default=1.0, help="Интервал между кадрами в секундах")
+    parser.add_argument('--frame-interval', type=int, default=None, help="Интервал между кадрами в кадрах (вместо --interval)")
+    parser.add_argument('--workers', type=int, default=None, help="Потоков кодирования и записи JPEG")
+    parser.add_argument('--no-resume', action='store_true', help="Перезаписывать уже сохраненные кадры")
+    parser.add_argument('--seek', action='store_true', help="Переходить к нужным кадрам вместо последовательного чтения (редкая выборка)")
+    parser.add_argument('--quality', type=int, default=None, help="Качество JPEG (0-100)")
+    parser.add_argument('--sampling', default='interval', choices=SAMPLING_MODES, help="Отбор кадров: по интервалу или по содержимому")
+    parser.add_argument('--hash-threshold', type=int, default=10, help="Порог различия dHash в битах для режима content")
+    parser.add_argument('--hash-index', default=None, help="Файл индекса хэшей датасета (.json) для устранения дубликатов")
+    parser.add_argument('--dedupe-against', nargs='*', default=[], help="Директории датасета, кадры которых добавляются в индекс хэшей")
+    args = parser.parse_args(argv)
+
+    hash_index = None
+    if args.hash_index or args.dedupe_against:
+        hash_index = FrameHashIndex(args.hash_index)
+        added = hash_index.update_from_folders(args.dedupe_against, workers=args.workers)
+        print(f"Индекс хэшей: {len(hash_index)} изображений (добавлено {added}).")
+
+    try:
+        extract_frames(
+            args.video, args.output,
+            interval_seconds=args.interval,
+            frame_interval=args.frame_interval,
+            workers=args.workers,
+            resume=not args.no_resume,
+            seek=args.seek,
+            jpeg_quality=args.quality,
+            sampling=args.sampling,
+            hash_threshold=args.hash_threshold,
+            hash_index=hash_index,
+        )
+    except RuntimeError as e:
+        print(e)
+        return 1
+    finally:
+        if hash_index is not None and args.hash_index:
+            hash_index.save()
+    return 0
+
 
-cap.release()
-print(f"Извлечено {saved_frame_count} кадров.")
\ No newline at end of file
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,234 @@
+import errno
+import os
+import random
+import shutil
+import sys
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from scripts.label_store import LabelStore
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+LABEL_EXTENSION = '.txt'
+LINK_MODES = ('auto', 'reflink', 'hardlink', 'copy')
+DEFAULT_SEED = 42
+
+# ioctl FICLONE (Linux): копия файла, разделяющая блоки с исходным до первой записи (Btrfs, XFS и др.)
+_FICLONE = 0x40049409
+# Ошибки, означающие, что способ связывания не поддерживается для этой пары файловых систем
+_UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.EPERM, errno.EMLINK}
+
+
+def list_images(directory: str, extensions=IMAGE_EXTENSIONS) -> List[str]:
+    """Отсортированный список имен изображений директории (пустой, если директории нет)."""
+    if not os.path.isdir(directory):
+        return []
+    with os.scandir(directory) as entries:
+        return sorted(entry.name for entry in entries if entry.is_file() and entry.name.lower().endswith(extensions))
+
+
+def split_items(items: Iterable[str], val_ratio: float = 0.2, seed: int = DEFAULT_SEED) -> Tuple[List[str], List[str]]:
+    """
+    Воспроизводимо делит элементы на train и val.
+
+    Элементы сортируются перед перемешиванием генератором с заданным seed, поэтому результат
+    не зависит от порядка os.listdir и одинаков на разных машинах.
+
+    Returns:
+        Tuple[List[str], List[str]]: Списки train и val.
+    """
+    shuffled = sorted(items)
+    random.Random(seed).shuffle(shuffled)
+    num_val = int(len(shuffled) * val_ratio)
+    return shuffled[num_val:], shuffled[:num_val]
+
+
+def _is_unchanged(src_stat: os.stat_result, dst_path: str, allow_link: bool = True) -> bool:
+    try:
+        dst_stat = os.stat(dst_path)
+    except FileNotFoundError:
+        return False
+    if (dst_stat.st_dev, dst_stat.st_ino) == (src_stat.st_dev, src_stat.st_ino):
+        return allow_link  # Жесткая ссылка на тот же файл (в режиме копирования ее нужно заменить копией)
+    return dst_stat.st_size == src_stat.st_size and dst_stat.st_mtime_ns == src_stat.st_mtime_ns
+
+
+def _reflink(src: str, dst: str) -> None:
+    if not sys.platform.startswith('linux'):
+        raise OSError(errno.EOPNOTSUPP, "reflink поддерживается только в Linux")
+    import fcntl
+
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+    shutil.copystat(src, dst)
+
+
+class DatasetMaterializer:
+    """
+    Раскладывает файлы датасета по директориям выборок: жесткими ссылками или reflink-копиями,
+    если источник и назначение на одной файловой системе, иначе копированием пулом потоков.
+
+    Файлы назначения с тем же размером и временем изменения, что у источника, пропускаются,
+    поэтому повторная сборка датасета затрагивает только изменившиеся файлы. Копии сохраняют
+    время изменения источника (shutil.copy2).
+
+    Режимы (mode):
+        'auto' — reflink, при отсутствии поддержки жесткая ссылка, затем копирование;
+        'reflink', 'hardlink' — указанный способ с откатом на копирование;
+        'copy' — всегда полное копирование.
+    Жесткая ссылка — это тот же файл: правка в датасете изменит и исходный файл, поэтому
+    build_split применяет режим только к изображениям, а аннотации всегда копирует.
+    """
+
+    def __init__(self, mode: str = 'auto', workers: Optional[int] = None):
+        if mode not in LINK_MODES:
+            raise ValueError(f"Неизвестный режим: {mode}. Доступны: {', '.join(LINK_MODES)}")
+        self.mode = mode
+        self.workers = workers or min(32, (os.cpu_count() or 1) * 4)  # Копирование ограничено диском, а не CPU
+        # Способы, оказавшиеся неподдерживаемыми для пары устройств (источник, назначение)
+        self._unsupported: Dict[Tuple[int, int, str], bool] = {}
+        self._lock = threading.Lock()
+
+    def _methods(self) -> Sequence[str]:
+        if self.mode == 'auto':
+            return ('reflink', 'hardlink')
+        if self.mode == 'copy':
+            return ()
+        return (self.mode,)
+
+    def materialize_file(self, src: str, dst: str) -> str:
+        """
+        Создает dst из src.
+
+        Returns:
+            str: Выполненное действие: 'skipped', 'reflink', 'hardlink' или 'copy'.
+        """
+        src_stat = os.stat(src)
+        if _is_unchanged(src_stat, dst, allow_link=self.mode != 'copy'):
+            return 'skipped'
+        if os.path.lexists(dst):
+            os.remove(dst)  # Жесткую ссылку нельзя создать поверх файла, а копия не должна писать в чужой inode
+
+        dst_dev = os.stat(os.path.dirname(os.path.abspath(dst))).st_dev
+        for method in self._methods():
+            key = (src_stat.st_dev, dst_dev, method)
+            if self._unsupported.get(key):
+                continue
+            try:
+                if method == 'reflink':
+                    _reflink(src, dst)
+                else:
+                    os.link(src, dst)
+                return method
+            except OSError as e:
+                if os.path.lexists(dst):
+                    os.remove(dst)
+                if e.errno not in _UNSUPPORTED_ERRNOS:
+                    raise
+                with self._lock:
+                    self._unsupported[key] = True
+
+        tmp_path = dst + '.tmp'
+        shutil.copy2(src, tmp_path)
+        os.replace(tmp_path, dst)
+        return 'copy'
+
+    def materialize(self, pairs: Sequence[Tuple[str, str]]) -> Counter:
+        """
+        Создает файлы назначения для пар (источник, назначение) пулом потоков.
+
+        Returns:
+            Counter: Число файлов по действиям ('skipped', 'reflink', 'hardlink', 'copy').
+        """
+        for directory in {os.path.dirname(dst) for _, dst in pairs}:
+            os.makedirs(directory, exist_ok=True)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return Counter(executor.map(lambda pair: self.materialize_file(*pair), pairs))
+
+
+def prune_directory(directory: str, keep: Iterable[str]) -> int:
+    """Удаляет из директории файлы, не входящие в keep (например, оставшиеся от разбиения с другим seed)."""
+    if not os.path.isdir(directory):
+        return 0
+    keep = set(keep)
+    removed = 0
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name not in keep:
+                os.remove(entry.path)
+                removed += 1
+    return removed
+
+
+def build_split(
+    splits: Dict[str, Sequence[str]],
+    images_dir: str,
+    annotations_dir: str,
+    dataset_dir: str = 'resources/dataset',
+    mode: str = 'auto',
+    workers: Optional[int] = None,
+    prune: bool = True,
+    label_store: Optional[LabelStore] = None
+) -> Dict[str, Counter]:
+    """
+    Раскладывает изображения и их аннотации по выборкам датасета в формате YOLO:
+    <dataset_dir>/images/<выборка>/<изображение> и <dataset_dir>/labels/<выборка>/<имя>.txt.
+
+    Args:
+        splits (Dict[str, Sequence[str]]): Имена изображений по выборкам, например {'train': [...], 'val': [...]}.
+        images_dir (str): Директория исходных изображений.
+        annotations_dir (str): Директория всех аннотаций (<имя изображения без расширения>.txt).
+        dataset_dir (str): Корневая директория датасета.
+        mode (str): Способ создания файлов изображений (см. DatasetMaterializer). Аннотации всегда
+            копируются: правка аннотации в датасете не должна менять исходную разметку.
+        workers (int, optional): Количество потоков.
+        prune (bool): Удалять из директорий выборок файлы, не входящие в выборку.
+        label_store (LabelStore, optional): Хранилище аннотаций; если задано, аннотации выгружаются из него
+            (см. LabelStore.export_yolo), а annotations_dir не используется.
+
+    Returns:
+        Dict[str, Counter]: Для каждой выборки — число файлов по действиям и 'missing_labels'.
+    """
+    materializer = DatasetMaterializer(mode, workers)
+    labels_materializer = DatasetMaterializer('copy', workers)
+    report: Dict[str, Counter] = {}
+    for split, image_names in splits.items():
+        images_dest = os.path.join(dataset_dir, 'images', split)
+        labels_dest = os.path.join(dataset_dir, 'labels', split)
+        os.makedirs(images_dest, exist_ok=True)
+        os.makedirs(labels_dest, exist_ok=True)
+
+        pairs = [(os.path.join(images_dir, name), os.path.join(images_dest, name)) for name in image_names]
+        label_pairs = []
+        label_names = []
+        missing = 0
+        for name in image_names:
+            label_name = os.path.splitext(name)[0] + LABEL_EXTENSION
+            src_label_path = os.path.join(annotations_dir, label_name)
+            if label_store is not None:
+                exists = name in label_store
+            else:
+                exists = os.path.exists(src_label_path)
+                if exists:
+                    label_pairs.append((src_label_path, os.path.join(labels_dest, label_name)))
+            if exists:
+                label_names.append(label_name)
+            else:
+                missing += 1
+                print(f"Warning: Annotation file {label_name} not found for image {name} in {label_store.path if label_store is not None else annotations_dir}. Skipping.")
+
+        counts = materializer.materialize(pairs)
+        if label_pairs:
+            counts += labels_materializer.materialize(label_pairs)
+        if label_store is not None:
+            counts['exported'] = label_store.export_yolo(labels_dest, label_names, write_classes=False)
+        counts['missing_labels'] = missing
+        if prune:
+            counts['pruned'] = prune_directory(images_dest, image_names) + prune_directory(labels_dest, label_names)
+        report[split] = counts
+        print(f"{split}: изображений {len(image_names)}, аннотаций {len(label_names)} — "
+              + ", ".join(f"{action} {counts[action]}" for action in ('skipped', 'reflink', 'hardlink', 'copy', 'exported', 'pruned') if counts[action]))
+    return report
@@ -0,0 +1,254 @@
+import json
+import os
+import tempfile
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+LABEL_EXTENSION = '.txt'
+DEFAULT_ROOTS = ('resources/dataset', 'resources/annotations')
+INDEX_FORMAT_VERSION = 1
+
+
+class _DirectoryEntry:
+    """Содержимое одной директории индекса: файлы {имя: (размер, mtime_ns)} и производные множества."""
+
+    def __init__(self, mtime_ns: int, files: Dict[str, Tuple[int, int]], subdirs: List[str]):
+        self.mtime_ns = mtime_ns
+        self.files = files
+        self.subdirs = subdirs
+        self.images: Dict[str, str] = {}  # Основа имени -> имя файла изображения
+        self.label_stems: Set[str] = set()
+        for name in files:
+            stem, ext = os.path.splitext(name)
+            if ext.lower() in IMAGE_EXTENSIONS:
+                self.images[stem] = name
+            elif ext.lower() == LABEL_EXTENSION:
+                self.label_stems.add(stem)
+
+
+def _scan_directory(path: str) -> _DirectoryEntry:
+    files, subdirs = {}, []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                subdirs.append(entry.name)
+            elif entry.is_file():
+                stat = entry.stat()
+                files[entry.name] = (stat.st_size, stat.st_mtime_ns)
+    return _DirectoryEntry(os.stat(path).st_mtime_ns, files, sorted(subdirs))
+
+
+class DatasetIndex:
+    """
+    Индекс файлов датасета: изображения, аннотации, их размеры и основы имен по директориям.
+
+    Строится одним обходом os.scandir корневых директорий (по умолчанию resources/dataset
+    и resources/annotations) и отвечает на вопросы о количестве файлов, сиротах (изображение
+    без аннотации и наоборот) и принадлежности кадра выборке без повторных os.listdir и os.path.exists.
+    Индекс можно сохранить на диск (load_or_build): при следующем запуске повторно читаются только
+    директории, время изменения которых изменилось (добавление, удаление или переименование файлов).
+    Изменение содержимого файла без изменения директории индекс не отслеживает.
+
+    Пути директорий принимаются в любом виде (относительные или абсолютные).
+    """
+
+    def __init__(self, roots: Iterable[str] = DEFAULT_ROOTS):
+        self.roots = [os.path.abspath(root) for root in roots]
+        self._dirs: Dict[str, _DirectoryEntry] = {}
+        self._splits: Dict[str, Set[str]] = {}
+
+    @classmethod
+    def build(cls, roots: Iterable[str] = DEFAULT_ROOTS) -> "DatasetIndex":
+        """Строит индекс обходом корневых директорий (отсутствующие корни пропускаются)."""
+        index = cls(roots)
+        for root in index.roots:
+            if os.path.isdir(root):
+                index._scan_tree(root)
+        index._update_splits()
+        return index
+
+    def _scan_tree(self, path: str) -> None:
+        pending = [path]
+        while pending:
+            directory = pending.pop()
+            entry = _scan_directory(directory)
+            self._dirs[directory] = entry
+            pending.extend(os.path.join(directory, name) for name in entry.subdirs)
+
+    def _remove_tree(self, path: str) -> None:
+        prefix = path + os.sep
+        for directory in [d for d in self._dirs if d == path or d.startswith(prefix)]:
+            del self._dirs[directory]
+
+    def refresh(self) -> int:
+        """
+        Перечитывает директории, изменившиеся с момента построения индекса.
+
+        Returns:
+            int: Количество перечитанных директорий.
+        """
+        changed = 0
+        for directory in sorted(self._dirs):
+            if directory not in self._dirs:
+                continue  # Удалена вместе с родительской
+            entry = self._dirs[directory]
+            try:
+                mtime_ns = os.stat(directory).st_mtime_ns
+            except FileNotFoundError:
+                self._remove_tree(directory)
+                changed += 1
+                continue
+            if mtime_ns == entry.mtime_ns:
+                continue
+            new_entry = _scan_directory(directory)
+            self._dirs[directory] = new_entry
+            changed += 1
+            for name in set(entry.subdirs) - set(new_entry.subdirs):
+                self._remove_tree(os.path.join(directory, name))
+            for name in set(new_entry.subdirs) - set(entry.subdirs):
+                self._scan_tree(os.path.join(directory, name))
+        for root in self.roots:
+            if root not in self._dirs and os.path.isdir(root):
+                self._scan_tree(root)
+                changed += 1
+        if changed:
+            self._update_splits()
+        return changed
+
+    def _update_splits(self) -> None:
+        """Принадлежность выборкам: основы имен изображений в <корень>/images/<выборка>."""
+        self._splits = {}
+        for root in self.roots:
+            images_root = self._dirs.get(os.path.join(root, 'images'))
+            if images_root is None:
+                continue
+            for split in images_root.subdirs:
+                entry = self._dirs.get(os.path.join(root, 'images', split))
+                if entry is not None:
+                    for stem in entry.images:
+                        self._splits.setdefault(stem, set()).add(split)
+
+    def _entry(self, directory: str) -> Optional[_DirectoryEntry]:
+        return self._dirs.get(os.path.abspath(directory))
+
+    def exists(self, path: str) -> bool:
+        """Есть ли в индексе директория или файл path."""
+        path = os.path.abspath(path)
+        if path in self._dirs:
+            return True
+        entry = self._dirs.get(os.path.dirname(path))
+        return entry is not None and os.path.basename(path) in entry.files
+
+    def files(self, directory: str, extensions: Optional[Sequence[str]] = None) -> List[str]:
+        """Отсортированные имена файлов директории (с фильтром по расширениям, без учета регистра)."""
+        entry = self._entry(directory)
+        if entry is None:
+            return []
+        if extensions is None:
+            return sorted(entry.files)
+        extensions = tuple(ext.lower() for ext in extensions)
+        return sorted(name for name in entry.files if name.lower().endswith(extensions))
+
+    def images(self, directory: str) -> List[str]:
+        """Отсортированные имена изображений директории."""
+        entry = self._entry(directory)
+        return sorted(entry.images.values()) if entry is not None else []
+
+    def labels(self, directory: str) -> List[str]:
+        """Отсортированные имена файлов аннотаций директории."""
+        entry = self._entry(directory)
+        return sorted(stem + LABEL_EXTENSION for stem in entry.label_stems) if entry is not None else []
+
+    def count_images(self, directory: str) -> int:
+        entry = self._entry(directory)
+        return len(entry.images) if entry is not None else 0
+
+    def count_labels(self, directory: str) -> int:
+        entry = self._entry(directory)
+        return len(entry.label_stems) if entry is not None else 0
+
+    def has_label(self, labels_dir: str, image_name: str) -> bool:
+        """Есть ли в labels_dir аннотация для изображения image_name."""
+        entry = self._entry(labels_dir)
+        return entry is not None and os.path.splitext(image_name)[0] in entry.label_stems
+
+    def file_size(self, path: str) -> Optional[int]:
+        """Размер файла в байтах по данным индекса (None, если файла нет в индексе)."""
+        entry = self._entry(os.path.dirname(os.path.abspath(path)))
+        if entry is None or os.path.basename(path) not in entry.files:
+            return None
+        return entry.files[os.path.basename(path)][0]
+
+    def orphans(self, images_dir: str, labels_dir: str) -> Tuple[List[str], List[str]]:
+        """
+        Несоответствия изображений и аннотаций.
+
+        Returns:
+            Tuple[List[str], List[str]]: Изображения без аннотаций и аннотации без изображений (имена файлов).
+        """
+        images = self._entry(images_dir)
+        labels = self._entry(labels_dir)
+        image_stems = set(images.images) if images is not None else set()
+        label_stems = labels.label_stems if labels is not None else set()
+        # classes.txt в директории аннотаций — список классов, а не аннотация кадра
+        label_stems = label_stems - {'classes'}
+        return (sorted(images.images[stem] for stem in image_stems - label_stems),
+                sorted(stem + LABEL_EXTENSION for stem in label_stems - image_stems))
+
+    def splits_of(self, image_name: str) -> Set[str]:
+        """Выборки датасета (train, val, test, ...), в которые входит кадр (по имени файла или основе имени)."""
+        return set(self._splits.get(os.path.splitext(image_name)[0], ()))
+
+    def save(self, path: str) -> None:
+        """Атомарно сохраняет индекс в JSON."""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        data = {
+            'version': INDEX_FORMAT_VERSION,
+            'roots': self.roots,
+            'dirs': {d: {'mtime_ns': e.mtime_ns, 'files': e.files, 'subdirs': e.subdirs} for d, e in self._dirs.items()},
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.json.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> Optional["DatasetIndex"]:
+        """Загружает индекс из JSON; None, если файла нет, он поврежден или другой версии."""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('version') != INDEX_FORMAT_VERSION:
+            return None
+        index = cls(data['roots'])
+        for directory, entry in data['dirs'].items():
+            files = {name: tuple(value) for name, value in entry['files'].items()}
+            index._dirs[directory] = _DirectoryEntry(entry['mtime_ns'], files, entry['subdirs'])
+        index._update_splits()
+        return index
+
+    @classmethod
+    def load_or_build(cls, roots: Iterable[str] = DEFAULT_ROOTS, cache_path: Optional[str] = None) -> "DatasetIndex":
+        """
+        Индекс из файла кэша с перечитыванием изменившихся директорий или, если кэша нет
+        (или он построен для других корней), новый индекс. Обновленный индекс сохраняется в cache_path.
+        """
+        roots = [os.path.abspath(root) for root in roots]
+        index = cls.load(cache_path) if cache_path else None
+        if index is not None and index.roots == roots:
+            changed = index.refresh()
+        else:
+            index = cls.build(roots)
+            changed = 1
+        if cache_path and changed:
+            index.save(cache_path)
+        return index
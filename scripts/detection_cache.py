@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import tempfile
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from scripts.target_selection import Detections
+
+
+# Версия формата файлов кэша; при несовместимых изменениях старые записи просто не находятся
+CACHE_FORMAT_VERSION = 1
+
+
+def file_hash(path: str, chunk_size: int = 8 * 1024 * 1024) -> str:
+    """Хэш содержимого файла (BLAKE2b, 128 бит) в шестнадцатеричном виде."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class CachedDetections:
+    """
+    Детекции трекера по кадрам видео в столбцовом виде: все bbox видео лежат в общих массивах,
+    а offsets[i]:offsets[i + 1] — строки кадра с индексом i (нумерация с 0).
+
+    Attributes:
+        offsets (np.ndarray): Границы строк кадров формы (frames + 1,).
+        detected (np.ndarray): Запускался ли детектор на кадре, форма (frames,).
+        xyxy, conf, cls, ids (np.ndarray): Данные детекций (как в Detections).
+    """
+
+    def __init__(self, offsets: np.ndarray, detected: np.ndarray, xyxy: np.ndarray, conf: np.ndarray, cls: np.ndarray, ids: np.ndarray):
+        self.offsets = offsets
+        self.detected = detected
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+        self.ids = ids
+
+    def __len__(self) -> int:
+        return len(self.detected)
+
+    def frame(self, index: int) -> Detections:
+        """Детекции кадра index (с 0); для кадров за пределами кэша — пустые."""
+        if index >= len(self):
+            return Detections.empty()
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return Detections(self.xyxy[start:end], self.conf[start:end], self.cls[start:end], self.ids[start:end])
+
+
+class DetectionRecorder:
+    """Накапливает детекции по кадрам во время прохода трекера для последующего сохранения в кэш."""
+
+    def __init__(self):
+        self._counts: List[int] = []
+        self._detected: List[bool] = []
+        self._chunks: List[Detections] = []
+
+    def add(self, detections: Optional[Detections]) -> None:
+        """Добавляет следующий по порядку кадр (None — детектор на кадре не запускался)."""
+        self._detected.append(detections is not None)
+        self._counts.append(len(detections) if detections is not None else 0)
+        if detections is not None and len(detections):
+            self._chunks.append(detections)
+
+    def to_cached(self) -> CachedDetections:
+        offsets = np.zeros(len(self._counts) + 1, dtype=np.int64)
+        np.cumsum(self._counts, out=offsets[1:])
+
+        def column(name: str, shape_tail: tuple) -> np.ndarray:
+            if not self._chunks:
+                return np.zeros((0,) + shape_tail, dtype=np.float32)
+            return np.concatenate([getattr(d, name) for d in self._chunks]).astype(np.float32, copy=False)
+
+        return CachedDetections(offsets, np.asarray(self._detected, dtype=bool),
+                                column('xyxy', (4,)), column('conf', ()), column('cls', ()), column('ids', ()))
+
+
+class DetectionCache:
+    """
+    Дисковый кэш детекций трекера в формате .npz.
+
+    Ключ — хэш содержимого видео, хэш весов модели и параметры, влияющие на результат model.track
+    (пороги, класс, интервал детекции, конфигурация трекера). Параметры выбора цели, обрезки,
+    сглаживания и визуализации в ключ не входят: при их изменении детекции берутся из кэша,
+    и YOLO не запускается.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        # Хэши файлов в пределах процесса: (путь, размер, mtime) -> хэш (например, одни веса для многих видео)
+        self._hashes: Dict[tuple, str] = {}
+
+    def _hash_of(self, path: str) -> str:
+        stat = os.stat(path)
+        signature = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        if signature not in self._hashes:
+            self._hashes[signature] = file_hash(path)
+        return self._hashes[signature]
+
+    def key(self, video_path: str, model_path: str, **params) -> str:
+        """
+        Ключ записи кэша.
+
+        Args:
+            video_path (str): Путь к видеофайлу.
+            model_path (str): Путь к весам модели (если это не файл, в ключ входит сама строка).
+            **params: Параметры инференса (conf, iou, class_id, detect_interval, tracker и т.п.).
+        """
+        fields = {
+            'version': CACHE_FORMAT_VERSION,
+            'video': self._hash_of(video_path),
+            'model': self._hash_of(model_path) if os.path.isfile(model_path) else str(model_path),
+            'params': params,
+        }
+        payload = json.dumps(fields, sort_keys=True, default=str).encode('utf-8')
+        return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f'{key}.npz')
+
+    def load(self, key: str) -> Optional[CachedDetections]:
+        """Загружает запись кэша или возвращает None, если ее нет или файл поврежден."""
+        path = self.path_for(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                return CachedDetections(data['offsets'], data['detected'], data['xyxy'], data['conf'], data['cls'], data['ids'])
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def save(self, key: str, detections: CachedDetections) -> str:
+        """Атомарно сохраняет запись кэша (через временный файл) и возвращает путь к ней."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.path_for(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.npz.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, offsets=detections.offsets, detected=detections.detected, xyxy=detections.xyxy,
+                         conf=detections.conf, cls=detections.cls, ids=detections.ids)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return path
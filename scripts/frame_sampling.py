@@ -0,0 +1,189 @@
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+import cv2
+import numpy as np
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+# Размер dHash по стороне: хэш состоит из HASH_SIZE * HASH_SIZE бит (64 бита при 8)
+HASH_SIZE = 8
+
+# Число единичных бит для каждого 16-битного значения (подсчет расстояния Хэмминга по четвертям хэша)
+_POPCOUNT_16 = np.array([bin(i).count('1') for i in range(1 << 16)], dtype=np.uint8)
+
+
+def dhash(image: np.ndarray) -> int:
+    """
+    Разностный перцептивный хэш (dHash) кадра: знаки разностей соседних пикселей
+    в уменьшенном до (HASH_SIZE + 1) x HASH_SIZE полутоновом изображении.
+
+    Хэш устойчив к сжатию, масштабу и небольшим изменениям яркости, а похожие кадры
+    дают хэши с малым расстоянием Хэмминга.
+
+    Args:
+        image (np.ndarray): Кадр BGR или полутоновое изображение.
+
+    Returns:
+        int: 64-битный хэш.
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (HASH_SIZE + 1, HASH_SIZE), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def hamming_distances(hashes: np.ndarray, value: int) -> np.ndarray:
+    """Расстояния Хэмминга от value до каждого хэша массива uint64 (векторно)."""
+    xor = np.bitwise_xor(hashes, np.uint64(value))
+    return _POPCOUNT_16[xor.view(np.uint16)].reshape(-1, 4).sum(axis=1, dtype=np.int64)
+
+
+def image_hash(path: str) -> Optional[int]:
+    """dHash файла изображения (декодируется сразу в уменьшенном полутоновом виде); None, если файл не читается."""
+    image = cv2.imread(path, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    return dhash(image) if image is not None else None
+
+
+class FrameHashIndex:
+    """
+    Индекс перцептивных хэшей кадров датасета для поиска почти одинаковых кадров.
+
+    Хэши хранятся в массиве uint64, поэтому проверка нового кадра против всего датасета — одна
+    векторная операция. Индекс сохраняется в JSON ({относительный путь: хэш в hex}) рядом с датасетом;
+    пути считаются относительно директории файла индекса.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._names: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._hashes = np.zeros(1024, dtype=np.uint64)
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for name, value in json.load(f).items():
+                    self._add(name, int(value, 16))
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __contains__(self, image_path: str) -> bool:
+        return self._key(image_path) in self._positions
+
+    def _key(self, image_path: str) -> str:
+        base = os.path.dirname(os.path.abspath(self.path)) if self.path else os.getcwd()
+        return os.path.relpath(os.path.abspath(image_path), base).replace(os.sep, '/')
+
+    def _add(self, key: str, value: int) -> None:
+        if key in self._positions:
+            self._hashes[self._positions[key]] = value
+            return
+        if len(self._names) == len(self._hashes):
+            self._hashes = np.concatenate([self._hashes, np.zeros_like(self._hashes)])
+        self._positions[key] = len(self._names)
+        self._hashes[len(self._names)] = value
+        self._names.append(key)
+
+    def add(self, image_path: str, value: int) -> None:
+        """Добавляет (или обновляет) хэш изображения."""
+        self._add(self._key(image_path), value)
+
+    def find_near(self, value: int, max_distance: int, exclude: Optional[str] = None) -> Optional[str]:
+        """
+        Ищет в индексе изображение с хэшем на расстоянии Хэмминга не больше max_distance.
+
+        Args:
+            value (int): Хэш кадра.
+            max_distance (int): Максимальное расстояние Хэмминга для почти одинаковых кадров.
+            exclude (str, optional): Путь изображения, которое не учитывается (сам кадр при повторном запуске).
+
+        Returns:
+            Optional[str]: Ключ найденного изображения или None.
+        """
+        if not self._names:
+            return None
+        distances = hamming_distances(self._hashes[:len(self._names)], value)
+        if exclude is not None and exclude in self:
+            distances[self._positions[self._key(exclude)]] = max_distance + 1
+        nearest = int(np.argmin(distances))
+        return self._names[nearest] if distances[nearest] <= max_distance else None
+
+    def update_from_folders(self, folders: Iterable[str], workers: Optional[int] = None, extensions=IMAGE_EXTENSIONS) -> int:
+        """
+        Добавляет в индекс изображения директорий, которых в нем еще нет (хэши считаются пулом потоков).
+
+        Returns:
+            int: Количество добавленных изображений.
+        """
+        paths = []
+        for folder in folders:
+            if not os.path.isdir(folder):
+                continue
+            with os.scandir(folder) as entries:
+                paths.extend(entry.path for entry in entries
+                             if entry.is_file() and entry.name.lower().endswith(extensions) and entry.path not in self)
+        paths.sort()
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+            hashes = list(executor.map(image_hash, paths))
+        added = 0
+        for image_path, value in zip(paths, hashes):
+            if value is not None:
+                self.add(image_path, value)
+                added += 1
+        return added
+
+    def save(self, path: Optional[str] = None) -> None:
+        """Атомарно сохраняет индекс в JSON (по умолчанию — в файл, из которого он загружен)."""
+        path = path or self.path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        data = {name: f'{int(value):016x}' for name, value in zip(self._names, self._hashes[:len(self._names)])}
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.json.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=0, sort_keys=True)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+class ContentSampler:
+    """
+    Отбор кадров по содержимому: кадр сохраняется, только если его dHash отличается от хэша последнего
+    сохраненного кадра больше чем на threshold бит, а при заданном index — и от всех кадров датасета.
+    """
+
+    def __init__(self, threshold: int = 10, index: Optional[FrameHashIndex] = None):
+        self.threshold = threshold
+        self.index = index
+        self.last_hash: Optional[int] = None
+        self.rejected_similar = 0  # Похожи на предыдущий сохраненный кадр
+        self.rejected_duplicates = 0  # Почти совпадают с кадром, уже имеющимся в датасете
+
+    def accept(self, value: int, image_path: Optional[str] = None) -> bool:
+        """
+        Решает, сохранять ли кадр с хэшем value.
+
+        Args:
+            value (int): dHash кадра.
+            image_path (str, optional): Путь, по которому кадр будет сохранен (этот же файл в индексе
+                не считается дубликатом, что позволяет повторно запускать извлечение).
+        """
+        if self.last_hash is not None and bin(self.last_hash ^ value).count('1') <= self.threshold:
+            self.rejected_similar += 1
+            return False
+        if self.index is not None and self.index.find_near(value, self.threshold, exclude=image_path) is not None:
+            self.rejected_duplicates += 1
+            return False
+        return True
+
+    def keep(self, value: int, image_path: Optional[str] = None) -> None:
+        """Отмечает кадр как сохраненный."""
+        self.last_hash = value
+        if self.index is not None and image_path is not None:
+            self.index.add(image_path, value)
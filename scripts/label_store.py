@@ -0,0 +1,217 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+
+LABEL_EXTENSION = '.txt'
+CLASSES_FILENAME = 'classes.txt'
+STORE_FORMAT_VERSION = 1
+# Строка аннотации YOLO: класс и нормированные x_center, y_center, width, height
+LABEL_DTYPE = np.dtype([('cls', '<i4'), ('x', '<f4'), ('y', '<f4'), ('w', '<f4'), ('h', '<f4')])
+
+
+def parse_yolo_label_file(path: str) -> np.ndarray:
+    """Читает файл аннотаций YOLO одним разбором и возвращает массив (N, 5) float32."""
+    with open(path, 'r') as f:
+        values = np.array(f.read().split(), dtype=np.float32)
+    return values.reshape(-1, 5)
+
+
+def format_yolo_labels(labels: np.ndarray) -> str:
+    """Текст файла аннотаций YOLO для массива (N, 5) в формате исходной разметки (6 знаков после запятой)."""
+    return ''.join(f"{int(row[0])} {row[1]:.6f} {row[2]:.6f} {row[3]:.6f} {row[4]:.6f}\n" for row in labels.tolist())
+
+
+class LabelStore:
+    """
+    Все аннотации YOLO датасета в одном бинарном хранилище вместо тысяч крошечных .txt.
+
+    Хранилище — директория с тремя файлами:
+        labels.npy  — структурированный массив LABEL_DTYPE всех рамок подряд (отображается в память);
+        offsets.npy — границы строк кадров: рамки кадра i — labels[offsets[i]:offsets[i + 1]];
+        meta.json   — имена кадров (без расширения) в порядке offsets, имена классов и версия формата.
+    Открытие хранилища читает только meta.json и offsets; доступ к рамкам кадра — срез памяти
+    без открытия и разбора файлов.
+    """
+
+    def __init__(self, path: str, stems: List[str], offsets: np.ndarray, labels: np.ndarray, class_names: Optional[List[str]] = None):
+        self.path = path
+        self.stems = stems
+        self.offsets = offsets
+        self.labels = labels
+        self.class_names = class_names or []
+        self._positions: Dict[str, int] = {stem: i for i, stem in enumerate(stems)}
+
+    def __len__(self) -> int:
+        return len(self.stems)
+
+    def __contains__(self, name: str) -> bool:
+        return os.path.splitext(name)[0] in self._positions
+
+    def positions(self, names: Iterable[str]) -> np.ndarray:
+        """Отсортированные позиции (в stems) кадров names, имеющихся в хранилище."""
+        return np.array(sorted({self._positions[os.path.splitext(n)[0]] for n in names if n in self}), dtype=np.int64)
+
+    def frame_labels(self, name: str) -> np.ndarray:
+        """
+        Рамки кадра (по имени изображения, файла аннотации или основе имени) как массив (N, 5) float32
+        со столбцами class_id, x_center, y_center, width, height; KeyError, если кадра нет в хранилище.
+        """
+        i = self._positions[os.path.splitext(name)[0]]
+        rows = self.labels[self.offsets[i]:self.offsets[i + 1]]
+        return np.column_stack([rows[field].astype(np.float32) for field in LABEL_DTYPE.names]).reshape(-1, 5)
+
+    def counts(self) -> np.ndarray:
+        """Количество рамок по кадрам формы (len(self),)."""
+        return np.diff(self.offsets)
+
+    def frame_indices(self) -> np.ndarray:
+        """Номер кадра (позиция в stems) для каждой рамки хранилища — для векторных проверок по всему датасету."""
+        return np.repeat(np.arange(len(self.stems)), self.counts())
+
+    @classmethod
+    def build(cls, annotations_dir: str, store_path: str, workers: Optional[int] = None) -> "LabelStore":
+        """
+        Собирает хранилище из директории аннотаций YOLO (.txt; classes.txt — список имен классов).
+        Файлы читаются пулом потоков, хранилище записывается атомарно (через временную директорию).
+
+        Raises:
+            ValueError: Если файл аннотаций не в формате YOLO (число значений не кратно 5).
+        """
+        with os.scandir(annotations_dir) as entries:
+            names = sorted(entry.name for entry in entries
+                           if entry.is_file() and entry.name.endswith(LABEL_EXTENSION) and entry.name != CLASSES_FILENAME)
+
+        def parse(name: str) -> np.ndarray:
+            try:
+                return parse_yolo_label_file(os.path.join(annotations_dir, name))
+            except ValueError as e:
+                raise ValueError(f"Некорректный файл аннотаций {name}: {e}") from e
+
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+            parsed = list(executor.map(parse, names))
+
+        class_names = None
+        classes_path = os.path.join(annotations_dir, CLASSES_FILENAME)
+        if os.path.exists(classes_path):
+            with open(classes_path, 'r', encoding='utf-8') as f:
+                class_names = [line.strip() for line in f if line.strip()]
+
+        rows = np.concatenate(parsed) if parsed else np.zeros((0, 5), dtype=np.float32)
+        labels = np.empty(len(rows), dtype=LABEL_DTYPE)
+        labels['cls'] = rows[:, 0].astype(np.int32)
+        for column, field in enumerate(LABEL_DTYPE.names[1:], start=1):
+            labels[field] = rows[:, column]
+        offsets = np.zeros(len(parsed) + 1, dtype=np.int64)
+        np.cumsum([len(p) for p in parsed], out=offsets[1:])
+        stems = [os.path.splitext(name)[0] for name in names]
+
+        cls.write(store_path, stems, offsets, labels, class_names)
+        return cls.open(store_path)
+
+    @staticmethod
+    def write(store_path: str, stems: List[str], offsets: np.ndarray, labels: np.ndarray, class_names: Optional[List[str]] = None) -> None:
+        """Атомарно записывает хранилище (временная директория переименовывается в store_path)."""
+        parent = os.path.dirname(os.path.abspath(store_path))
+        os.makedirs(parent, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=parent, prefix='.label_store_')
+        try:
+            np.save(os.path.join(tmp_dir, 'labels.npy'), labels)
+            np.save(os.path.join(tmp_dir, 'offsets.npy'), offsets)
+            with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+                json.dump({'version': STORE_FORMAT_VERSION, 'stems': stems, 'class_names': class_names}, f, ensure_ascii=False)
+            if os.path.isdir(store_path):
+                shutil.rmtree(store_path)
+            os.replace(tmp_dir, store_path)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+    @classmethod
+    def open(cls, store_path: str) -> "LabelStore":
+        """Открывает хранилище; массив рамок отображается в память (mmap), а не читается целиком."""
+        with open(os.path.join(store_path, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != STORE_FORMAT_VERSION:
+            raise ValueError(f"Неподдерживаемая версия хранилища аннотаций {store_path}: {meta.get('version')}")
+        offsets = np.load(os.path.join(store_path, 'offsets.npy'))
+        # Пустой массив нельзя отобразить в память
+        labels = np.load(os.path.join(store_path, 'labels.npy'), mmap_mode='r' if offsets[-1] else None)
+        return cls(store_path, meta['stems'], offsets, labels, meta.get('class_names'))
+
+    def export_yolo(self, output_dir: str, names: Optional[Iterable[str]] = None, write_classes: bool = True) -> int:
+        """
+        Выгружает аннотации обратно в файлы YOLO (.txt) для обучения.
+        Файлы с тем же содержимым не перезаписываются (время изменения сохраняется для инкрементальной сборки).
+
+        Args:
+            output_dir (str): Директория для .txt.
+            names (Iterable[str], optional): Кадры для выгрузки (имена изображений или основы); по умолчанию — все.
+                Кадры, которых нет в хранилище, пропускаются.
+            write_classes (bool): Записать classes.txt, если имена классов известны.
+
+        Returns:
+            int: Количество записанных (новых или измененных) файлов.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        stems = self.stems if names is None else [os.path.splitext(n)[0] for n in names if n in self]
+        files = {stem + LABEL_EXTENSION: format_yolo_labels(self.frame_labels(stem)) for stem in stems}
+        if write_classes and self.class_names and names is None:
+            files[CLASSES_FILENAME] = ''.join(name + '\n' for name in self.class_names)
+
+        written = 0
+        for name, text in files.items():
+            path = os.path.join(output_dir, name)
+            try:
+                with open(path, 'r') as f:
+                    if f.read() == text:
+                        continue
+            except FileNotFoundError:
+                pass
+            with open(path, 'w') as f:
+                f.write(text)
+            written += 1
+        return written
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Точка входа командной строки.
+
+    Примеры (из корня проекта):
+        python -m scripts.label_store build --annotations resources/annotations --store resources/label_store
+        python -m scripts.label_store export --store resources/label_store --output resources/annotations_export
+    """
+    parser = argparse.ArgumentParser(description="Бинарное хранилище аннотаций YOLO: сборка и выгрузка в .txt.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help="Собрать хранилище из директории .txt")
+    build_parser.add_argument('--annotations', default='resources/annotations', help="Директория аннотаций YOLO")
+    build_parser.add_argument('--store', required=True, help="Директория хранилища")
+    build_parser.add_argument('--workers', type=int, default=None, help="Потоков чтения")
+    export_parser = subparsers.add_parser('export', help="Выгрузить хранилище в файлы YOLO .txt")
+    export_parser.add_argument('--store', required=True, help="Директория хранилища")
+    export_parser.add_argument('--output', required=True, help="Директория для .txt")
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        try:
+            store = LabelStore.build(args.annotations, args.store, workers=args.workers)
+        except ValueError as e:
+            print(e)
+            return 1
+        print(f"Хранилище аннотаций: {len(store)} кадров, {len(store.labels)} рамок. Сохранено в {args.store}")
+    else:
+        store = LabelStore.open(args.store)
+        written = store.export_yolo(args.output)
+        print(f"Выгружено файлов аннотаций: {written} (всего кадров {len(store)}) в {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,272 @@
+import argparse
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import yaml
+
+from scripts.label_store import CLASSES_FILENAME, LABEL_DTYPE, LABEL_EXTENSION, LabelStore, parse_yolo_label_file
+
+
+# Проверки в порядке вывода отчета
+CHECKS = ('malformed', 'class_id', 'out_of_range', 'zero_area', 'duplicate')
+CHECK_DESCRIPTIONS = {
+    'malformed': "файл не в формате YOLO (число значений не кратно 5 или не числа)",
+    'class_id': "неизвестный или нецелый ID класса",
+    'out_of_range': "координаты вне [0, 1] (или рамка выходит за границы кадра)",
+    'zero_area': "рамка нулевой площади",
+    'duplicate': "дубликат рамки того же класса в кадре",
+}
+# Допуск на округление координат при проверке границ (аннотации хранятся с 6 знаками после запятой)
+COORD_TOLERANCE = 1e-6
+DEFAULT_DUPLICATE_IOU = 0.9
+
+
+class LabelValidationReport:
+    """
+    Результат проверки аннотаций: для каждой проверки — файлы и номера строк (с 1) с ошибками.
+    """
+
+    def __init__(self, num_files: int, num_boxes: int):
+        self.num_files = num_files
+        self.num_boxes = num_boxes
+        self.issues: Dict[str, Dict[str, List[int]]] = {check: {} for check in CHECKS}
+        self.messages: Dict[str, str] = {}  # Текст ошибки разбора для некорректных файлов
+
+    @property
+    def ok(self) -> bool:
+        return not any(self.issues.values())
+
+    def bad_files(self) -> List[str]:
+        """Отсортированные имена файлов хотя бы с одной ошибкой."""
+        return sorted({name for files in self.issues.values() for name in files})
+
+    def print_report(self, max_files: int = 10) -> None:
+        """Выводит сводку проверки и до max_files файлов с ошибками для каждой проверки."""
+        print(f"Проверено файлов аннотаций: {self.num_files}, рамок: {self.num_boxes}")
+        if self.ok:
+            print("Ошибок в аннотациях не найдено.")
+            return
+        for check in CHECKS:
+            files = self.issues[check]
+            if not files:
+                continue
+            rows = f", {sum(map(len, files.values()))} строк" if check != 'malformed' else ""
+            print(f"\n{check} — {CHECK_DESCRIPTIONS[check]}: {len(files)} файлов{rows}")
+            for name in sorted(files)[:max_files]:
+                detail = self.messages.get(name) if check == 'malformed' else "строки " + ", ".join(map(str, files[name]))
+                print(f"  {name}: {detail}")
+            if len(files) > max_files:
+                print(f"  ... и еще {len(files) - max_files}")
+        print(f"\nВсего файлов с ошибками: {len(self.bad_files())}")
+
+
+def load_label_files(annotations_dir: str, names: Optional[Iterable[str]] = None, workers: Optional[int] = None
+                     ) -> Tuple[List[str], np.ndarray, np.ndarray, Dict[str, str]]:
+    """
+    Читает файлы аннотаций YOLO пулом потоков.
+
+    Args:
+        annotations_dir (str): Директория аннотаций (.txt; classes.txt пропускается).
+        names (Iterable[str], optional): Кадры для чтения (имена изображений или файлов аннотаций);
+            по умолчанию — все файлы директории. Отсутствующие файлы пропускаются.
+        workers (int, optional): Количество потоков.
+
+    Returns:
+        Tuple: Имена прочитанных файлов, все рамки (M, 5) float32, границы строк файлов (len(names) + 1,)
+               и ошибки разбора {имя файла: текст} для некорректных файлов (их рамки не входят в массив).
+    """
+    if names is None:
+        with os.scandir(annotations_dir) as entries:
+            files = sorted(entry.name for entry in entries
+                           if entry.is_file() and entry.name.endswith(LABEL_EXTENSION) and entry.name != CLASSES_FILENAME)
+    else:
+        files = sorted({os.path.splitext(name)[0] + LABEL_EXTENSION for name in names})
+        files = [name for name in files if os.path.exists(os.path.join(annotations_dir, name))]
+
+    def parse(name: str):
+        try:
+            return parse_yolo_label_file(os.path.join(annotations_dir, name))
+        except ValueError as e:
+            return str(e)
+
+    with ThreadPoolExecutor(max_workers=workers or min(32, (os.cpu_count() or 1) * 4)) as executor:
+        parsed = list(executor.map(parse, files))
+
+    errors = {name: result for name, result in zip(files, parsed) if isinstance(result, str)}
+    arrays = [result if not isinstance(result, str) else np.zeros((0, 5), dtype=np.float32) for result in parsed]
+    offsets = np.zeros(len(files) + 1, dtype=np.int64)
+    np.cumsum([len(a) for a in arrays], out=offsets[1:])
+    labels = np.concatenate(arrays) if arrays else np.zeros((0, 5), dtype=np.float32)
+    return files, labels, offsets, errors
+
+
+def _store_arrays(store: LabelStore, names: Optional[Iterable[str]] = None) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """Рамки хранилища (всего или выбранных кадров) в виде (имена файлов, рамки (M, 5), границы строк)."""
+    positions = np.arange(len(store)) if names is None else store.positions(names)
+    counts = store.counts()[positions]
+    offsets = np.zeros(len(positions) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    # Номера строк выбранных кадров в хранилище одним массивом (без цикла по кадрам)
+    rows = np.arange(offsets[-1]) + np.repeat(store.offsets[positions] - offsets[:-1], counts)
+    selected = store.labels[rows]
+    labels = np.column_stack([selected[field].astype(np.float32) for field in LABEL_DTYPE.names]).reshape(-1, 5)
+    return [store.stems[i] + LABEL_EXTENSION for i in positions.tolist()], labels, offsets
+
+
+def _duplicate_mask(labels: np.ndarray, offsets: np.ndarray, iou_threshold: float) -> np.ndarray:
+    """
+    Рамки, совпадающие (IoU >= iou_threshold) с более ранней рамкой того же класса в том же кадре.
+
+    Кадры группируются по числу рамок k, и для каждой группы IoU всех пар считается одной операцией
+    над массивом (кадры, k, k), без цикла по кадрам.
+    """
+    duplicates = np.zeros(len(labels), dtype=bool)
+    counts = np.diff(offsets)
+    centers, sizes = labels[:, 1:3], labels[:, 3:5]
+    boxes = np.hstack((centers - sizes / 2, centers + sizes / 2))
+    for k in np.unique(counts[counts > 1]):
+        rows = offsets[:-1][counts == k][:, None] + np.arange(k)  # (F, k)
+        b, cls = boxes[rows], labels[rows, 0]
+        inter_w = np.clip(np.minimum(b[:, :, None, 2], b[:, None, :, 2]) - np.maximum(b[:, :, None, 0], b[:, None, :, 0]), 0, None)
+        inter_h = np.clip(np.minimum(b[:, :, None, 3], b[:, None, :, 3]) - np.maximum(b[:, :, None, 1], b[:, None, :, 1]), 0, None)
+        inter = inter_w * inter_h
+        area = (b[:, :, 2] - b[:, :, 0]) * (b[:, :, 3] - b[:, :, 1])
+        union = area[:, :, None] + area[:, None, :] - inter
+        iou = np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+        same = (cls[:, :, None] == cls[:, None, :]) & np.triu(np.ones((k, k), dtype=bool), 1)
+        duplicates[rows[((iou >= iou_threshold) & same).any(axis=1)]] = True
+    return duplicates
+
+
+def validate_labels(
+    labels: np.ndarray,
+    offsets: np.ndarray,
+    files: Sequence[str],
+    num_classes: Optional[int] = None,
+    iou_threshold: float = DEFAULT_DUPLICATE_IOU
+) -> LabelValidationReport:
+    """
+    Проверяет все рамки датасета векторными операциями NumPy.
+
+    Args:
+        labels (np.ndarray): Рамки (M, 5): class_id, x_center, y_center, width, height.
+        offsets (np.ndarray): Границы строк файлов: рамки files[i] — labels[offsets[i]:offsets[i + 1]].
+        files (Sequence[str]): Имена файлов аннотаций.
+        num_classes (int, optional): Число классов; если не задано, проверяется только целость и неотрицательность ID.
+        iou_threshold (float): IoU, начиная с которого рамки одного класса в кадре считаются дубликатами.
+
+    Returns:
+        LabelValidationReport: Отчет с файлами и строками, не прошедшими проверки.
+    """
+    report = LabelValidationReport(len(files), len(labels))
+    cls, coords = labels[:, 0], labels[:, 1:5]
+    x, y, w, h = coords.T
+    tol = COORD_TOLERANCE
+
+    class_bad = ~np.isfinite(cls) | (cls != np.round(cls)) | (cls < 0)
+    if num_classes is not None:
+        class_bad |= cls >= num_classes
+    with np.errstate(invalid='ignore'):
+        out_of_range = (~np.isfinite(coords).all(axis=1)
+                        | ((coords < -tol) | (coords > 1 + tol)).any(axis=1)
+                        | (x - w / 2 < -tol) | (x + w / 2 > 1 + tol)
+                        | (y - h / 2 < -tol) | (y + h / 2 > 1 + tol))
+        zero_area = (w <= 0) | (h <= 0)
+    duplicate = _duplicate_mask(labels, offsets, iou_threshold) & ~zero_area
+
+    frame = np.repeat(np.arange(len(files)), np.diff(offsets))
+    line = np.arange(len(labels)) - offsets[frame] + 1
+    for check, mask in (('class_id', class_bad), ('out_of_range', out_of_range), ('zero_area', zero_area), ('duplicate', duplicate)):
+        for row in np.flatnonzero(mask).tolist():
+            report.issues[check].setdefault(files[frame[row]], []).append(int(line[row]))
+    return report
+
+
+def read_class_names(annotations_dir: Optional[str] = None, dataset_yaml: Optional[str] = None) -> Optional[List[str]]:
+    """Имена классов из dataset.yaml (поле names) или из classes.txt директории аннотаций."""
+    if dataset_yaml:
+        with open(dataset_yaml, 'r', encoding='utf-8') as f:
+            names = yaml.safe_load(f).get('names')
+        if isinstance(names, dict):
+            return [names[i] for i in sorted(names)]
+        return list(names) if names else None
+    if annotations_dir:
+        classes_path = os.path.join(annotations_dir, CLASSES_FILENAME)
+        if os.path.exists(classes_path):
+            with open(classes_path, 'r', encoding='utf-8') as f:
+                return [line.strip() for line in f if line.strip()]
+    return None
+
+
+def validate_annotations(
+    annotations_dir: Optional[str] = None,
+    label_store: Optional[LabelStore] = None,
+    names: Optional[Iterable[str]] = None,
+    class_names: Optional[Sequence[str]] = None,
+    iou_threshold: float = DEFAULT_DUPLICATE_IOU,
+    workers: Optional[int] = None
+) -> LabelValidationReport:
+    """
+    Загружает аннотации (файлы пулом потоков или хранилище без разбора текста) и проверяет их.
+
+    Проверки: файл в формате YOLO, ID класса известен, координаты и края рамки в [0, 1],
+    ненулевая площадь, нет дубликатов рамок одного класса в кадре.
+
+    Args:
+        annotations_dir (str, optional): Директория аннотаций YOLO (.txt).
+        label_store (LabelStore, optional): Хранилище аннотаций (вместо annotations_dir).
+        names (Iterable[str], optional): Проверять только эти кадры (например, изображения собираемой выборки).
+        class_names (Sequence[str], optional): Имена классов; по умолчанию — из хранилища или classes.txt.
+        iou_threshold (float): Порог IoU дубликатов.
+        workers (int, optional): Количество потоков чтения файлов.
+
+    Returns:
+        LabelValidationReport: Отчет проверки.
+    """
+    if label_store is not None:
+        files, labels, offsets = _store_arrays(label_store, names)
+        errors = {}
+        class_names = class_names or label_store.class_names
+    elif annotations_dir is not None:
+        files, labels, offsets, errors = load_label_files(annotations_dir, names, workers)
+        class_names = class_names or read_class_names(annotations_dir)
+    else:
+        raise ValueError("Нужно задать annotations_dir или label_store")
+
+    report = validate_labels(labels, offsets, files, len(class_names) if class_names else None, iou_threshold)
+    for name, message in errors.items():
+        report.issues['malformed'][name] = []
+        report.messages[name] = message
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Точка входа командной строки. Код возврата 1, если найдены ошибки (для проверки перед сборкой датасета).
+
+    Примеры (из корня проекта):
+        python -m scripts.label_validation --annotations resources/annotations --dataset-yaml resources/dataset.yaml
+        python -m scripts.label_validation --store resources/label_store
+    """
+    parser = argparse.ArgumentParser(description="Проверка корректности аннотаций YOLO.")
+    parser.add_argument('--annotations', default='resources/annotations', help="Директория аннотаций YOLO")
+    parser.add_argument('--store', default=None, help="Хранилище аннотаций (вместо --annotations)")
+    parser.add_argument('--dataset-yaml', default=None, help="dataset.yaml с именами классов (по умолчанию classes.txt)")
+    parser.add_argument('--iou', type=float, default=DEFAULT_DUPLICATE_IOU, help="Порог IoU дубликатов рамок")
+    parser.add_argument('--workers', type=int, default=None, help="Потоков чтения файлов")
+    parser.add_argument('--max-files', type=int, default=10, help="Сколько файлов выводить для каждой проверки")
+    args = parser.parse_args(argv)
+
+    class_names = read_class_names(dataset_yaml=args.dataset_yaml) if args.dataset_yaml else None
+    if args.store:
+        report = validate_annotations(label_store=LabelStore.open(args.store), class_names=class_names, iou_threshold=args.iou)
+    else:
+        report = validate_annotations(args.annotations, class_names=class_names, iou_threshold=args.iou, workers=args.workers)
+    report.print_report(args.max_files)
+    return 0 if report.ok else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
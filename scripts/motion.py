@@ -0,0 +1,183 @@
+import numpy as np
+from typing import Dict, Optional, Tuple
+
+
+class ConstantVelocityKalman:
+    """
+    Фильтр Калмана с моделью постоянной скорости для центра цели.
+
+    Состояние: [cx, cy, vx, vy], шаг по времени — один кадр. Используется трекером,
+    чтобы переносить центр обрезки между кадрами, на которых YOLO не запускается.
+    """
+
+    def __init__(self, process_noise: float = 1.0, measurement_noise: float = 4.0):
+        """
+        Args:
+            process_noise (float): Интенсивность шума ускорения (пикс/кадр^2); больше — быстрее реакция на маневры.
+            measurement_noise (float): Дисперсия шума измерения центра bbox (пикс^2).
+        """
+        self.F = np.array([[1, 0, 1, 0],
+                           [0, 1, 0, 1],
+                           [0, 0, 1, 0],
+                           [0, 0, 0, 1]], dtype=np.float64)
+        self.H = np.array([[1, 0, 0, 0],
+                           [0, 1, 0, 0]], dtype=np.float64)
+        # Дискретный белый шум ускорения для dt = 1
+        self.Q = process_noise * np.array([[0.25, 0, 0.5, 0],
+                                           [0, 0.25, 0, 0.5],
+                                           [0.5, 0, 1.0, 0],
+                                           [0, 0.5, 0, 1.0]], dtype=np.float64)
+        self.R = measurement_noise * np.eye(2)
+        self.x: Optional[np.ndarray] = None
+        self.P: Optional[np.ndarray] = None
+
+    @property
+    def initialized(self) -> bool:
+        return self.x is not None
+
+    def reset(self) -> None:
+        self.x = None
+        self.P = None
+
+    def predict(self) -> Optional[Tuple[float, float]]:
+        """Продвигает состояние на один кадр вперед и возвращает предсказанный центр (или None до первого измерения)."""
+        if self.x is None:
+            return None
+        self.x = self.F @ self.x
+        self.P = self.F @ self.P @ self.F.T + self.Q
+        return float(self.x[0]), float(self.x[1])
+
+    def update(self, center: Tuple[float, float]) -> Tuple[float, float]:
+        """Корректирует состояние по измеренному центру и возвращает отфильтрованный центр."""
+        z = np.asarray(center, dtype=np.float64)
+        if self.x is None:
+            self.x = np.array([z[0], z[1], 0.0, 0.0])
+            self.P = np.diag([self.R[0, 0], self.R[1, 1], 100.0, 100.0])
+            return float(z[0]), float(z[1])
+
+        y = z - self.H @ self.x
+        S = self.H @ self.P @ self.H.T + self.R
+        K = self.P @ self.H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ y
+        self.P = (np.eye(4) - K @ self.H) @ self.P
+        return float(self.x[0]), float(self.x[1])
+
+
+def simulate_detect_interval_centers(centers: np.ndarray, detect_interval: int) -> np.ndarray:
+    """
+    Воспроизводит работу трекера с detect_interval по центрам цели, полученным при детекции каждого кадра.
+
+    На кадрах с детекцией (каждый detect_interval-й) берется измеренный центр, между ними центр
+    переносится фильтром ConstantVelocityKalman — так же, как в track_video_and_center_object.
+
+    Args:
+        centers (np.ndarray): Центры цели формы (T, 2) при полной частоте детекции; NaN — цель не найдена.
+        detect_interval (int): Интервал запуска детектора в кадрах.
+
+    Returns:
+        np.ndarray: Центры обрезки формы (T, 2); NaN, пока цель не была найдена ни разу.
+    """
+    detect_interval = max(1, detect_interval)
+    kalman = ConstantVelocityKalman()
+    output = np.full_like(centers, np.nan, dtype=np.float64)
+    last_center: Optional[Tuple[float, float]] = None
+    frames_since_measurement = 0
+
+    for i, center in enumerate(centers):
+        predicted = kalman.predict()
+        frames_since_measurement += 1
+        if i % detect_interval == 0:
+            if not np.isnan(center[0]):
+                kalman.update(center)
+                last_center = (float(center[0]), float(center[1]))
+                frames_since_measurement = 0
+        elif predicted is not None and frames_since_measurement < detect_interval:
+            last_center = predicted
+        if last_center is not None:
+            output[i] = last_center
+    return output
+
+
+def center_error_stats(reference: np.ndarray, estimate: np.ndarray) -> Dict[str, float]:
+    """
+    Считает статистику ошибки центра (в пикселях) между эталонной и оценочной траекториями.
+    Учитываются только кадры, где обе траектории определены.
+    """
+    valid = ~(np.isnan(reference).any(axis=1) | np.isnan(estimate).any(axis=1))
+    if not np.any(valid):
+        return {"frames": 0, "mean_px": 0.0, "median_px": 0.0, "p95_px": 0.0, "max_px": 0.0}
+    errors = np.linalg.norm(reference[valid] - estimate[valid], axis=1)
+    return {
+        "frames": int(valid.sum()),
+        "mean_px": float(errors.mean()),
+        "median_px": float(np.median(errors)),
+        "p95_px": float(np.percentile(errors, 95)),
+        "max_px": float(errors.max()),
+    }
+
+
+def interpolate_gaps(values: np.ndarray) -> np.ndarray:
+    """
+    Заполняет пропуски (NaN) в траектории линейной интерполяцией по соседним известным точкам.
+
+    Пропуски в начале и в конце заполняются ближайшим известным значением.
+    Если известных точек нет, траектория возвращается без изменений.
+
+    Args:
+        values (np.ndarray): Траектория формы (T,) или (T, D); NaN в строке — значение неизвестно.
+
+    Returns:
+        np.ndarray: Траектория той же формы без пропусков.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    flat = values.reshape(len(values), -1)
+    known = ~np.isnan(flat).any(axis=1)
+    if not np.any(known):
+        return values.copy()
+    frames = np.arange(len(flat))
+    filled = np.column_stack([np.interp(frames, frames[known], flat[known, d]) for d in range(flat.shape[1])])
+    return filled.reshape(values.shape)
+
+
+def savgol_coefficients(window: int, polyorder: int) -> np.ndarray:
+    """
+    Коэффициенты сглаживающего фильтра Савицкого — Голея: значение в центре окна
+    по методу наименьших квадратов для полинома степени polyorder.
+    """
+    half = window // 2
+    offsets = np.arange(-half, half + 1, dtype=np.float64)
+    vandermonde = offsets[:, None] ** np.arange(polyorder + 1)[None, :]
+    # Первая строка псевдообратной матрицы дает свободный член полинома, т.е. значение в центре окна
+    return np.linalg.pinv(vandermonde)[0]
+
+
+def savgol_smooth(values: np.ndarray, window: int, polyorder: int = 2) -> np.ndarray:
+    """
+    Сглаживает траекторию фильтром Савицкого — Голея (векторно, без SciPy).
+
+    По краям траектория дополняется крайними значениями, поэтому камера плавно
+    выходит из начального положения и останавливается в конечном.
+
+    Args:
+        values (np.ndarray): Траектория без пропусков формы (T,) или (T, D).
+        window (int): Длина окна в кадрах (приводится к нечетной и не больше длины траектории).
+        polyorder (int): Степень полинома (меньше окна).
+
+    Returns:
+        np.ndarray: Сглаженная траектория той же формы.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    length = len(values)
+    window = min(int(window), length if length % 2 == 1 else length - 1)
+    if window % 2 == 0:
+        window -= 1
+    if window <= polyorder or window < 3:
+        return values.copy()
+
+    half = window // 2
+    flat = values.reshape(length, -1)
+    padded = np.pad(flat, ((half, half), (0, 0)), mode='edge')
+    # Окна формы (T, D, window) — свертка всех измерений одним матричным умножением
+    windows = np.lib.stride_tricks.sliding_window_view(padded, window, axis=0)
+    smoothed = windows @ savgol_coefficients(window, polyorder)
+    return smoothed.reshape(values.shape)
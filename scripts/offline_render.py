@@ -0,0 +1,427 @@
+import argparse
+import logging
+import os
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from scripts.detection_cache import file_hash
+from scripts.motion import interpolate_gaps, savgol_smooth
+from scripts.virtual_camera import warp_view
+from scripts.video_io import WRITER_BACKENDS, FrameReaderThread, FrameWriterThread, create_video_writer
+
+
+def trajectory_file_path(path: str) -> str:
+    """Путь, по которому np.savez фактически сохраняет траекторию (добавляет .npz, если его нет)."""
+    return path if path.endswith('.npz') else path + '.npz'
+
+
+class Trajectory:
+    """
+    Траектория цели по всем кадрам видео (результат первого прохода двухпроходного режима).
+
+    Attributes:
+        bboxes (np.ndarray): bbox цели x1, y1, x2, y2 формы (T, 4); NaN — цель на кадре не обнаружена.
+        track_ids (np.ndarray): ID трека цели формы (T,); -1 — нет цели.
+        conf (np.ndarray): Уверенность детекции цели формы (T,); 0 — нет цели.
+        fps (float): Частота кадров видео.
+        frame_size (Tuple[int, int]): Ширина и высота кадров исходного видео.
+        source_hash (str, optional): Хэш содержимого исходного видео (см. detection_cache.file_hash);
+            None — источник не файл или траектория сохранена старой версией.
+    """
+
+    def __init__(self, bboxes: np.ndarray, track_ids: np.ndarray, conf: np.ndarray, fps: float, frame_size: Tuple[int, int],
+                 source_hash: Optional[str] = None):
+        self.bboxes = bboxes
+        self.track_ids = track_ids
+        self.conf = conf
+        self.fps = fps
+        self.frame_size = frame_size
+        self.source_hash = source_hash
+
+    def __len__(self) -> int:
+        return len(self.bboxes)
+
+    @property
+    def found(self) -> np.ndarray:
+        """Маска кадров, на которых цель обнаружена, формы (T,)."""
+        return ~np.isnan(self.bboxes[:, 0])
+
+    @property
+    def centers(self) -> np.ndarray:
+        """Центры bbox формы (T, 2); NaN — цель не обнаружена."""
+        return np.column_stack(((self.bboxes[:, 0] + self.bboxes[:, 2]) / 2, (self.bboxes[:, 1] + self.bboxes[:, 3]) / 2))
+
+    @property
+    def sizes(self) -> np.ndarray:
+        """Ширина и высота bbox формы (T, 2); NaN — цель не обнаружена."""
+        return np.column_stack((self.bboxes[:, 2] - self.bboxes[:, 0], self.bboxes[:, 3] - self.bboxes[:, 1]))
+
+    def save(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        np.savez(path, bboxes=self.bboxes, track_ids=self.track_ids, conf=self.conf,
+                 fps=np.float64(self.fps), frame_size=np.asarray(self.frame_size, dtype=np.int64),
+                 source_hash=np.str_(self.source_hash or ''))
+
+    @classmethod
+    def load(cls, path: str) -> "Trajectory":
+        with np.load(path) as data:
+            source_hash = str(data['source_hash']) if 'source_hash' in data.files else ''
+            return cls(data['bboxes'], data['track_ids'], data['conf'], float(data['fps']), tuple(int(v) for v in data['frame_size']),
+                       source_hash or None)
+
+    def mismatch(self, video_path: str) -> Optional[str]:
+        """
+        Проверяет, что траектория построена по этому видео (как ключ кэша детекций — по содержимому файла).
+
+        Сравниваются размер кадра, затем хэш содержимого, а для траекторий без хэша — число кадров
+        из метаданных видео.
+
+        Returns:
+            Optional[str]: Причина несовпадения или None, если траектория соответствует видео.
+        """
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            return f"не удалось открыть видео {video_path}"
+        try:
+            frame_size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+            total_frames = max(0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+        finally:
+            cap.release()
+
+        if tuple(self.frame_size) != frame_size:
+            return f"размер кадра {self.frame_size[0]}x{self.frame_size[1]}, у видео {frame_size[0]}x{frame_size[1]}"
+        if self.source_hash and os.path.isfile(video_path):
+            if file_hash(video_path) != self.source_hash:
+                return "хэш содержимого видео не совпадает"
+        elif total_frames and total_frames != len(self):
+            return f"{len(self)} кадров, у видео {total_frames}"
+        return None
+
+
+def collect_trajectory(model_path: str, video_input_path: str, trajectory_path: Optional[str] = None, **tracking_kwargs) -> Trajectory:
+    """
+    Первый проход: отслеживает цель во всем видео и сохраняет ее bbox по кадрам (без обрезки и записи видео).
+
+    Args:
+        model_path (str): Путь к обученной модели YOLO.
+        video_input_path (str): Путь к исходному видеофайлу.
+        trajectory_path (str, optional): Путь для сохранения траектории (.npz; расширение добавляется, если его нет).
+        **tracking_kwargs: Параметры TrackedFrames (пороги, стратегия выбора цели, detect_interval,
+            detection_cache и т.д.). Сглаживание и кадрирование здесь не нужны — их выполняет второй проход.
+
+    Returns:
+        Trajectory: Траектория цели.
+    """
+    from scripts.tracker import TrackedFrames  # Модель нужна только первому проходу
+
+    tracked = TrackedFrames(model_path, video_input_path, render_crops=False, **tracking_kwargs)
+    bboxes, track_ids, conf = [], [], []
+    for result in tracked:
+        if result.found:
+            bboxes.append(result.bbox)
+            track_ids.append(result.track_id)
+            conf.append(result.confidence)
+        else:
+            bboxes.append((np.nan,) * 4)
+            track_ids.append(-1.0)
+            conf.append(0.0)
+
+    trajectory = Trajectory(
+        np.asarray(bboxes, dtype=np.float64).reshape(-1, 4),
+        np.asarray(track_ids, dtype=np.float64),
+        np.asarray(conf, dtype=np.float64),
+        tracked.fps,
+        (tracked.frame_width, tracked.frame_height),
+        file_hash(video_input_path) if os.path.isfile(video_input_path) else None,
+    )
+    print(f"Траектория: {len(trajectory)} кадров, цель найдена на {int(trajectory.found.sum())}.")
+    if trajectory_path:
+        trajectory_path = trajectory_file_path(trajectory_path)
+        trajectory.save(trajectory_path)
+        print(f"Траектория сохранена в: {trajectory_path}")
+    return trajectory
+
+
+def plan_camera_path(
+    trajectory: Trajectory,
+    output_size: int = 640,
+    smoothing_seconds: float = 1.0,
+    polyorder: int = 2,
+    zoom_to_fit: bool = False,
+    target_fill: float = 0.5,
+    min_zoom: float = 0.5,
+    max_zoom: float = 2.0,
+    zoom_smoothing_seconds: float = 2.0,
+    keep_inside: bool = False
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Второй проход (расчет): строит гладкую траекторию камеры по всей траектории цели сразу.
+
+    Пропуски детекций заполняются линейной интерполяцией (вместо «замирания» на последней позиции
+    и скачка при повторном обнаружении), затем центр и масштаб сглаживаются фильтром
+    Савицкого — Голея с окном в секундах видео.
+
+    Args:
+        trajectory (Trajectory): Траектория цели из первого прохода.
+        output_size (int): Сторона квадратного выходного кадра.
+        smoothing_seconds (float): Окно сглаживания центра в секундах.
+        polyorder (int): Степень полинома фильтра Савицкого — Голея.
+        zoom_to_fit (bool): Если True, масштаб подбирается так, чтобы цель занимала долю target_fill кадра.
+        target_fill (float): Доля выходного кадра, которую должна занимать наибольшая сторона цели.
+        min_zoom (float): Минимальный масштаб.
+        max_zoom (float): Максимальный масштаб.
+        zoom_smoothing_seconds (float): Окно сглаживания масштаба в секундах.
+        keep_inside (bool): Если True, окно камеры не выходит за границы кадра (когда кадр больше окна),
+            и черные поля по краям не появляются.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Центры камеры формы (T, 2) и масштаб формы (T,).
+            Если цель не найдена ни разу, центры — NaN (выводятся черные кадры).
+    """
+    fps = trajectory.fps or 30.0
+    centers = savgol_smooth(interpolate_gaps(trajectory.centers), int(round(smoothing_seconds * fps)) | 1, polyorder)
+
+    zooms = np.ones(len(trajectory))
+    if zoom_to_fit and trajectory.found.any():
+        longest_side = np.max(trajectory.sizes, axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            desired = np.clip(target_fill * output_size / longest_side, min_zoom, max_zoom)
+        desired[~trajectory.found] = np.nan
+        zooms = savgol_smooth(interpolate_gaps(desired), int(round(zoom_smoothing_seconds * fps)) | 1, polyorder)
+        zooms = np.clip(zooms, min_zoom, max_zoom)
+
+    if keep_inside:
+        frame_width, frame_height = trajectory.frame_size
+        half_view = output_size / (2 * zooms)
+        for axis, limit in ((0, frame_width), (1, frame_height)):
+            low, high = half_view, limit - half_view
+            # Если окно шире кадра, центрируем его по кадру
+            centers[:, axis] = np.where(high >= low, np.clip(centers[:, axis], low, high), limit / 2)
+
+    return centers, zooms
+
+
+def _draw_bbox(frame: np.ndarray, bbox: np.ndarray, track_id: float, matrix: np.ndarray, output_size: int) -> None:
+    x1, y1 = matrix[:, :2] @ bbox[:2] + matrix[:, 2]
+    x2, y2 = matrix[:, :2] @ bbox[2:] + matrix[:, 2]
+    x1, y1 = max(0, int(x1)), max(0, int(y1))
+    x2, y2 = min(output_size - 1, int(x2)), min(output_size - 1, int(y2))
+    if x2 > x1 and y2 > y1:
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        cv2.putText(frame, f"ID: {int(track_id)}", (x1, max(10, y1 - 10)), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
+
+
+def render_camera_path(
+    video_input_path: str,
+    video_output_path: str,
+    centers: np.ndarray,
+    zooms: np.ndarray,
+    output_size: int = 640,
+    trajectory: Optional[Trajectory] = None,
+    queue_size: int = 32,
+    writer_backend: str = 'auto',
+    video_codec: Optional[str] = None,
+    video_preset: Optional[str] = 'ultrafast',
+    video_crf: Optional[int] = 23,
+    start_frame: int = 0,
+    end_frame: Optional[int] = None
+) -> bool:
+    """
+    Второй проход (рендер): вырезает кадры по готовой траектории камеры и записывает видео. Модель не нужна.
+
+    Декодирование и запись выполняются фоновыми потоками, кадр строится одним cv2.warpAffine
+    с субпиксельной точностью. Если передана trajectory, на кадрах с обнаруженной целью рисуется ее bbox.
+    start_frame и end_frame (не включительно) ограничивают рендер частью видео; centers, zooms и trajectory
+    при этом по-прежнему индексируются номером кадра от начала видео.
+
+    Returns:
+        bool: True, если видео успешно записано; False при ошибке открытия файлов.
+    """
+    cap = cv2.VideoCapture(video_input_path)
+    if not cap.isOpened():
+        print(f"Ошибка: Не удалось открыть видеофайл {video_input_path}")
+        return False
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    if start_frame and not cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame):
+        print(f"Ошибка: Не удалось перейти к кадру {start_frame} в {video_input_path}")
+        cap.release()
+        return False
+
+    output_dir = os.path.dirname(video_output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    try:
+        out = create_video_writer(video_output_path, fps, (output_size, output_size), backend=writer_backend,
+                                  codec=video_codec, preset=video_preset, crf=video_crf)
+    except Exception as e:
+        print(f"Критическая ошибка: Не удалось создать запись видео для {video_output_path}. Ошибка: {e}")
+        cap.release()
+        return False
+
+    # Буферы кольца переиспользуются, пока кадры стоят в очереди записи (см. FrameBufferRing)
+    buffers = [np.zeros((output_size, output_size, 3), dtype=np.uint8) for _ in range(queue_size + 2)]
+    black_frame = np.zeros((output_size, output_size, 3), dtype=np.uint8)
+    half = output_size / 2
+    reader = FrameReaderThread(cap, queue_size=queue_size).start()
+    writer = FrameWriterThread(out, queue_size=queue_size).start()
+    frame_count = 0
+    try:
+        for index, frame in enumerate(reader, start_frame):
+            if end_frame is not None and index >= end_frame:
+                break
+            frame_count += 1
+            # Если кадров в видео больше, чем в траектории, камера остается в последнем положении
+            i = min(index, len(centers) - 1)
+            if i < 0 or np.isnan(centers[i, 0]):
+                writer.write(black_frame)
+                continue
+            zoom = float(zooms[i])
+            matrix = np.array([[zoom, 0, half - zoom * centers[i, 0]],
+                               [0, zoom, half - zoom * centers[i, 1]]], dtype=np.float64)
+            view = buffers[index % len(buffers)]
+            warp_view(frame, view, zoom, matrix[0, 2], matrix[1, 2])
+            if trajectory is not None and index < len(trajectory) and trajectory.found[index]:
+                _draw_bbox(view, trajectory.bboxes[index], trajectory.track_ids[index], matrix, output_size)
+            writer.write(view)
+    finally:
+        reader.stop()
+        try:
+            writer.close()
+        finally:
+            cap.release()
+            out.release()
+
+    print(f"Двухпроходный рендер завершен: {frame_count} кадров. Результат сохранен в {video_output_path}")
+    return True
+
+
+def render_offline(
+    model_path: Optional[str],
+    video_input_path: str,
+    video_output_path: str,
+    trajectory_path: Optional[str] = None,
+    target_imgsz: int = 640,
+    smoothing_seconds: float = 1.0,
+    zoom_to_fit: bool = False,
+    keep_inside: bool = False,
+    draw_boxes: bool = True,
+    writer_backend: str = 'auto',
+    video_codec: Optional[str] = None,
+    video_preset: Optional[str] = 'ultrafast',
+    video_crf: Optional[int] = 23,
+    **tracking_kwargs
+) -> bool:
+    """
+    Двухпроходная обработка: траектория цели по всему видео, гладкая траектория камеры, затем рендер.
+
+    Если trajectory_path указывает на существующий файл траектории этого же видео (совпадают размер
+    кадра и хэш содержимого, см. Trajectory.mismatch), первый проход пропускается и модель
+    не используется (рендер можно выполнять на машинах без GPU и весов). Траектория другого видео
+    пересчитывается и перезаписывается.
+
+    Args:
+        model_path (str, optional): Путь к модели YOLO (не нужен, если траектория уже сохранена).
+        video_input_path (str): Путь к исходному видеофайлу.
+        video_output_path (str): Путь к выходному видео.
+        trajectory_path (str, optional): Файл траектории (.npz; расширение добавляется, если его нет): читается, если существует, иначе создается.
+        target_imgsz (int): Сторона квадратного выходного кадра.
+        smoothing_seconds (float): Окно сглаживания центра камеры в секундах.
+        zoom_to_fit (bool): Подбирать масштаб под размер цели.
+        keep_inside (bool): Не выводить окно камеры за границы кадра.
+        draw_boxes (bool): Рисовать bbox цели на выходных кадрах.
+        writer_backend, video_codec, video_preset, video_crf: Параметры записи (см. create_video_writer).
+        **tracking_kwargs: Параметры первого прохода (см. collect_trajectory).
+
+    Returns:
+        bool: True, если видео успешно записано.
+    """
+    trajectory = None
+    if trajectory_path:
+        trajectory_path = trajectory_file_path(trajectory_path)  # Иначе проверка существования не найдет сохраненный файл
+    if trajectory_path and os.path.exists(trajectory_path):
+        trajectory = Trajectory.load(trajectory_path)
+        reason = trajectory.mismatch(video_input_path)
+        if reason is None:
+            print(f"Траектория загружена из: {trajectory_path} ({len(trajectory)} кадров), модель не используется")
+        else:
+            print(f"Траектория {trajectory_path} не соответствует видео {video_input_path} ({reason}), пересчитывается")
+            trajectory = None
+    if trajectory is None:
+        if model_path is None:
+            raise ValueError("Для первого прохода нужен model_path (или trajectory_path с траекторией этого видео)")
+        try:
+            trajectory = collect_trajectory(model_path, video_input_path, trajectory_path, **tracking_kwargs)
+        except RuntimeError as e:
+            print(e)
+            return False
+
+    centers, zooms = plan_camera_path(trajectory, target_imgsz, smoothing_seconds=smoothing_seconds,
+                                      zoom_to_fit=zoom_to_fit, keep_inside=keep_inside)
+    return render_camera_path(video_input_path, video_output_path, centers, zooms, target_imgsz,
+                              trajectory=trajectory if draw_boxes else None,
+                              writer_backend=writer_backend, video_codec=video_codec,
+                              video_preset=video_preset, video_crf=video_crf)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Точка входа командной строки.
+
+    Примеры (из корня проекта):
+        # Оба прохода; траектория сохраняется для повторных рендеров
+        python -m scripts.offline_render --model best.pt --input video.mp4 --output out.mp4 --trajectory runs/track/video_traj.npz
+        # Только рендер по сохраненной траектории (без модели)
+        python -m scripts.offline_render --input video.mp4 --output out_zoom.mp4 --trajectory runs/track/video_traj.npz --zoom-to-fit
+    """
+    parser = argparse.ArgumentParser(description="Двухпроходное центрирование: траектория цели, сглаживание камеры, рендер.")
+    parser.add_argument('--model', default=None, help="Модель YOLO (не нужна при существующем --trajectory)")
+    parser.add_argument('--input', required=True, help="Исходное видео")
+    parser.add_argument('--output', required=True, help="Выходное видео")
+    parser.add_argument('--trajectory', default=None, help="Файл траектории (.npz): читается, если существует, иначе создается")
+    parser.add_argument('--class-id', type=int, default=0, help="ID отслеживаемого класса")
+    parser.add_argument('--imgsz', type=int, default=640, help="Сторона квадратного выходного кадра")
+    parser.add_argument('--conf', type=float, default=0.25, help="Порог уверенности детекции")
+    parser.add_argument('--iou', type=float, default=0.7, help="Порог IoU для NMS")
+    parser.add_argument('--target-selector', default='largest_area', help="Стратегия выбора цели")
+    parser.add_argument('--batch-size', type=int, default=1, help="Размер микро-батча кадров для инференса")
+    parser.add_argument('--cache-dir', default=None, help="Директория кэша детекций")
+    parser.add_argument('--smoothing', type=float, default=1.0, help="Окно сглаживания камеры в секундах")
+    parser.add_argument('--zoom-to-fit', action='store_true', help="Подбирать масштаб под размер цели")
+    parser.add_argument('--keep-inside', action='store_true', help="Не выводить окно камеры за границы кадра")
+    parser.add_argument('--no-boxes', action='store_true', help="Не рисовать bbox цели")
+    parser.add_argument('--writer', default='auto', choices=WRITER_BACKENDS, help="Бэкенд записи видео")
+    parser.add_argument('--codec', default=None, help="Кодек выходного видео")
+    parser.add_argument('--preset', default='ultrafast', help="Пресет кодера ffmpeg")
+    parser.add_argument('--crf', type=int, default=23, help="CRF кодера ffmpeg")
+    parser.add_argument('--log-level', default='WARNING', help="Уровень логирования")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), format='%(levelname)s %(name)s: %(message)s')
+
+    ok = render_offline(
+        args.model, args.input, args.output,
+        trajectory_path=args.trajectory,
+        target_imgsz=args.imgsz,
+        smoothing_seconds=args.smoothing,
+        zoom_to_fit=args.zoom_to_fit,
+        keep_inside=args.keep_inside,
+        draw_boxes=not args.no_boxes,
+        writer_backend=args.writer,
+        video_codec=args.codec,
+        video_preset=args.preset,
+        video_crf=args.crf,
+        target_class_id=args.class_id,
+        confidence_threshold=args.conf,
+        iou_threshold=args.iou,
+        target_selector=args.target_selector,
+        batch_size=args.batch_size,
+        detection_cache=args.cache_dir,
+    )
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
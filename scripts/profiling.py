@@ -0,0 +1,170 @@
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+
+# Этапы обработки кадра в трекере в порядке конвейера
+TRACKING_STAGES = ('decode', 'inference', 'selection', 'crop', 'encode')
+
+
+def peak_memory_mb() -> float:
+    """Пиковое потребление памяти (RSS) текущим процессом в мегабайтах."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss: килобайты в Linux, байты в macOS
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    except ImportError:  # Windows: модуля resource нет
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss) / (1024 * 1024)
+
+
+class StageProfiler:
+    """
+    Сбор времени выполнения этапов обработки кадров.
+
+    Для каждого этапа хранится длительность по кадрам в порядке их обработки. Каждый этап
+    обрабатывает кадры строго по порядку (в том числе в фоновых потоках декодера и записи),
+    поэтому i-е значение этапа относится к i-му кадру и из них собирается покадровая трасса.
+    Время батча инференса делится поровну между кадрами батча.
+    """
+
+    def __init__(self, stages=TRACKING_STAGES, fps_window: int = 100, enabled: bool = True):
+        """
+        Args:
+            stages (tuple): Названия этапов (порядок столбцов в отчетах).
+            fps_window (int): Количество последних кадров для скользящего FPS.
+            enabled (bool): Если False, все методы записи ничего не делают.
+        """
+        self.stages = tuple(stages)
+        self.enabled = enabled
+        self._durations: Dict[str, List[float]] = {stage: [] for stage in self.stages}
+        self._lock = threading.Lock()
+        self._frame_times: deque = deque(maxlen=max(2, fps_window + 1))
+        self._frames = 0
+        self._start: Optional[float] = None
+        self._end: Optional[float] = None
+
+    def start(self) -> None:
+        self._start = time.perf_counter()
+        self._frame_times.append(self._start)
+
+    def record(self, stage: str, seconds: float, frames: int = 1) -> None:
+        """Добавляет длительность этапа; при frames > 1 время делится поровну между кадрами."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._durations[stage].extend([seconds / frames] * frames)
+
+    @contextmanager
+    def stage(self, stage: str, frames: int = 1) -> Iterator[None]:
+        """Контекстный менеджер для замера длительности этапа."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start, frames)
+
+    def frame_done(self) -> None:
+        """Отмечает завершение обработки очередного кадра (для подсчета FPS)."""
+        now = time.perf_counter()
+        self._frames += 1
+        self._frame_times.append(now)
+        self._end = now
+
+    @property
+    def rolling_fps(self) -> float:
+        """FPS по последним fps_window кадрам."""
+        if len(self._frame_times) < 2:
+            return 0.0
+        elapsed = self._frame_times[-1] - self._frame_times[0]
+        return (len(self._frame_times) - 1) / elapsed if elapsed > 0 else 0.0
+
+    def summary(self) -> dict:
+        """
+        Возвращает сводку: общее число кадров, время, средний и скользящий FPS, пиковую память
+        и для каждого этапа — суммарное время и перцентили p50/p95/p99 длительности на кадр (мс).
+        """
+        wall = (self._end - self._start) if self._start is not None and self._end is not None else 0.0
+        stages = {}
+        with self._lock:
+            for stage, values in self._durations.items():
+                if not values:
+                    continue
+                ms = np.asarray(values) * 1000
+                p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+                stages[stage] = {
+                    'frames': len(values),
+                    'total_s': round(float(ms.sum()) / 1000, 4),
+                    'mean_ms': round(float(ms.mean()), 3),
+                    'p50_ms': round(float(p50), 3),
+                    'p95_ms': round(float(p95), 3),
+                    'p99_ms': round(float(p99), 3),
+                }
+        return {
+            'frames': self._frames,
+            'wall_s': round(wall, 3),
+            'fps': round(self._frames / wall, 2) if wall > 0 else 0.0,
+            'rolling_fps': round(self.rolling_fps, 2),
+            'peak_rss_mb': round(peak_memory_mb(), 1),
+            'stages': stages,
+        }
+
+    def print_summary(self) -> None:
+        summary = self.summary()
+        print(f"Профиль: {summary['frames']} кадров за {summary['wall_s']:.1f} с, "
+              f"{summary['fps']:.1f} FPS, пиковая память {summary['peak_rss_mb']:.0f} МБ")
+        for stage, stats in summary['stages'].items():
+            print(f"  {stage:<10} среднее {stats['mean_ms']:8.2f} мс  p50 {stats['p50_ms']:8.2f}  "
+                  f"p95 {stats['p95_ms']:8.2f}  p99 {stats['p99_ms']:8.2f}  всего {stats['total_s']:.2f} с")
+
+    def save_summary(self, path: str) -> None:
+        """Сохраняет сводку в JSON (.json) или CSV (любое другое расширение, одна строка на этап)."""
+        _ensure_parent_dir(path)
+        summary = self.summary()
+        if path.lower().endswith('.json'):
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(summary, f, indent=2, ensure_ascii=False)
+            return
+
+        columns = ['stage', 'frames', 'total_s', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'fps', 'rolling_fps', 'peak_rss_mb']
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=columns)
+            writer.writeheader()
+            for stage, stats in summary['stages'].items():
+                writer.writerow({'stage': stage, **stats})
+            # Итоговая строка по всему видео
+            writer.writerow({
+                'stage': 'all', 'frames': summary['frames'], 'total_s': summary['wall_s'],
+                'fps': summary['fps'], 'rolling_fps': summary['rolling_fps'], 'peak_rss_mb': summary['peak_rss_mb'],
+            })
+
+    def save_trace(self, path: str) -> None:
+        """Сохраняет покадровую трассу в CSV: номер кадра и длительность каждого этапа в миллисекундах."""
+        _ensure_parent_dir(path)
+        with self._lock:
+            columns = {stage: values for stage, values in self._durations.items() if values}
+        length = max((len(v) for v in columns.values()), default=0)
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['frame'] + [f'{stage}_ms' for stage in columns])
+            for i in range(length):
+                writer.writerow([i + 1] + [f'{values[i] * 1000:.3f}' if i < len(values) else '' for values in columns.values()])
+
+
+def _ensure_parent_dir(path: str) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
@@ -1,28 +1,64 @@
-import os
+import argparse
+from typing import List, Optional
+
+from scripts.dataset_index import DatasetIndex
 
 # Пути к папкам
 ALL_IMAGES_DIR = 'resources/all_frames' # Это папка, где лежат все изображениz, извлеченные из видео.
 TRAIN_VAL_IMAGES_DIR = 'resources/train_val_raw' # Папка с 207 отобранными для обучения изображениями.
+OUTPUT_LIST_PATH = 'unselected_images_for_test.txt'
+
+
+def find_unselected_images(all_images_dir: str = ALL_IMAGES_DIR, train_val_images_dir: str = TRAIN_VAL_IMAGES_DIR,
+                           index: Optional[DatasetIndex] = None) -> List[str]:
+    """
+    Возвращает отсортированный список кадров из all_images_dir, которых нет в train_val_images_dir
+    (кандидаты для разметки тестовой выборки).
+
+    Args:
+        all_images_dir (str): Директория всех извлеченных кадров.
+        train_val_images_dir (str): Директория отобранных для обучения кадров.
+        index (DatasetIndex, optional): Готовый индекс; если не задан, обе директории сканируются один раз.
+    """
+    index = index or DatasetIndex.build([all_images_dir, train_val_images_dir])
+    all_image_names = set(index.images(all_images_dir))
+    train_val_image_names = set(index.images(train_val_images_dir))
+
+    print(f"Всего извлечено изображений (All): {len(all_image_names)}")
+    print(f"Уже размечено изображений (Selected): {len(train_val_image_names)}")
 
-# Получаем список имен файлов (только имена, без пути)
-all_image_names = set(f for f in os.listdir(ALL_IMAGES_DIR) if f.lower().endswith(('.jpg', '.jpeg', '.png')))
-train_val_image_names = set(f for f in os.listdir(TRAIN_VAL_IMAGES_DIR) if f.lower().endswith(('.jpg', '.jpeg', '.png')))
+    # Находим имена файлов, которые есть в all_images_names, но НЕТ в selected_image_names
+    return sorted(all_image_names - train_val_image_names)
 
-# Находим имена файлов, которые есть в all_images_names, но НЕТ в selected_image_names
-unselected_image_names = sorted(list(all_image_names - train_val_image_names))
 
-print(f"Всего извлечено изображений (All): {len(all_image_names)}")
-print(f"Уже размечено изображений (Selected): {len(train_val_image_names)}")
-print(f"Доступно для разметки на тестовый набор (Unselected): {len(unselected_image_names)}")
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Точка входа командной строки.
 
-# Выведем первые несколько имен файлов, которые можно разметить
-print("\nНеразмеченные изображения, доступные для тестового набора (первые 10):")
-for i, name in enumerate(unselected_image_names):
-    print(f"- {name}")
+    Пример (из корня проекта):
+        python -m scripts.select_test_frames
+    """
+    parser = argparse.ArgumentParser(description="Список неразмеченных кадров для отбора тестовой выборки.")
+    parser.add_argument('--all-images', default=ALL_IMAGES_DIR, help="Директория всех извлеченных кадров")
+    parser.add_argument('--train-val-images', default=TRAIN_VAL_IMAGES_DIR, help="Директория отобранных для обучения кадров")
+    parser.add_argument('--output', default=OUTPUT_LIST_PATH, help="Файл для списка неразмеченных кадров")
+    args = parser.parse_args(argv)
 
-# Можете сохранить весь список в файл, чтобы удобно было выбирать
-with open('unselected_images_for_test.txt', 'w') as f:
+    unselected_image_names = find_unselected_images(args.all_images, args.train_val_images)
+    print(f"Доступно для разметки на тестовый набор (Unselected): {len(unselected_image_names)}")
+
+    print("\nНеразмеченные изображения, доступные для тестового набора:")
     for name in unselected_image_names:
-        f.write(name + '\n')
+        print(f"- {name}")
+
+    # Можете сохранить весь список в файл, чтобы удобно было выбирать
+    with open(args.output, 'w') as f:
+        for name in unselected_image_names:
+            f.write(name + '\n')
+
+    print(f"\nПолный список неразмеченных изображений сохранен в '{args.output}'")
+    return 0
+
 
-print(f"\nПолный список неразмеченных изображений сохранен в 'unselected_images_for_test.txt'")
\ No newline at end of file
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,64 +1,90 @@
-import os
-import random
-import shutil
+import argparse
+from typing import List, Optional
+
+from scripts.label_store import LabelStore
+from scripts.label_validation import validate_annotations
+from scripts.dataset_builder import DEFAULT_SEED, LINK_MODES, build_split, list_images, split_items
 
 # Пути к исходным данным 
 IMAGES_DIR = 'resources/train_val_raw' # Отобранные для обучения кадры
 ANNOTATIONS_DIR = 'resources/annotations' # Все аннотации
 
-print(IMAGES_DIR)
-
-# Пути для сохранения разделенных данных (теперь относительно папки scripts)
+# Пути для сохранения разделенных данных
 BASE_DATASET_DIR = 'resources/dataset'
 
-TRAIN_IMAGES_DIR = os.path.join(BASE_DATASET_DIR, 'images', 'train')
-VAL_IMAGES_DIR = os.path.join(BASE_DATASET_DIR, 'images', 'val')
-
-TRAIN_LABELS_DIR = os.path.join(BASE_DATASET_DIR, 'labels', 'train')
-VAL_LABELS_DIR = os.path.join(BASE_DATASET_DIR, 'labels', 'val')
-
 # Процент данных для валидации
 VAL_SPLIT_RATIO = 0.2
 
-# Создаем необходимые папки
-os.makedirs(TRAIN_IMAGES_DIR, exist_ok=True)
-os.makedirs(VAL_IMAGES_DIR, exist_ok=True)
-
-os.makedirs(TRAIN_LABELS_DIR, exist_ok=True)
-os.makedirs(VAL_LABELS_DIR, exist_ok=True)
-
-# Получаем список всех изображений из train_val_raw
-all_train_val_images = [f for f in os.listdir(IMAGES_DIR) if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
-random.shuffle(all_train_val_images) # Перемешиваем для случайного разделения
-
-num_val = int(len(all_train_val_images) * VAL_SPLIT_RATIO)
-
-val_images = all_train_val_images[:num_val]
-train_images = all_train_val_images[num_val:]
-
-print(f"Total train/val raw images: {len(all_train_val_images)}")
-print(f"Train images: {len(train_images)} ({len(train_images)/len(all_train_val_images):.2%})")
-print(f"Validation images: {len(val_images)} ({len(val_images)/len(all_train_val_images):.2%})")
-
-# Копируем файлы
-def copy_files(image_list, image_dest_dir, label_dest_dir):
-    for img_name in image_list:
-        # Копируем изображение
-        shutil.copy(os.path.join(IMAGES_DIR, img_name), os.path.join(image_dest_dir, img_name))
-
-        # Копируем соответствующую аннотацию из общей папки annotations
-        base_name = os.path.splitext(img_name)[0]
-        label_name = base_name + '.txt'
-        src_label_path = os.path.join(ANNOTATIONS_DIR, label_name)
-        if os.path.exists(src_label_path):
-            shutil.copy(src_label_path, os.path.join(label_dest_dir, label_name))
-        else:
-            print(f"Warning: Annotation file {label_name} not found for image {img_name} in {ANNOTATIONS_DIR}. Skipping.")
-
-print("Copying training files...")
-copy_files(train_images, TRAIN_IMAGES_DIR, TRAIN_LABELS_DIR)
-
-print("Copying validation files...")
-copy_files(val_images, VAL_IMAGES_DIR, VAL_LABELS_DIR)
 
-print("Train/Validation split complete.")
\ No newline at end of file
+def split_train_val(
+    images_dir: str = IMAGES_DIR,
+    annotations_dir: str = ANNOTATIONS_DIR,
+    dataset_dir: str = BASE_DATASET_DIR,
+    val_ratio: float = VAL_SPLIT_RATIO,
+    seed: int = DEFAULT_SEED,
+    mode: str = 'auto',
+    workers: Optional[int] = None,
+    label_store: Optional[str] = None,
+    validate: bool = True
+) -> bool:
+    """
+    Делит отобранные кадры на train и val (воспроизводимо, с заданным seed) и раскладывает
+    изображения и аннотации по директориям датасета (см. dataset_builder.build_split).
+
+    Если задан label_store (путь к хранилищу аннотаций, см. scripts.label_store), аннотации
+    выгружаются из него, а не из annotations_dir. При validate=True аннотации изображений выборки
+    сначала проверяются (см. scripts.label_validation), и при ошибках датасет не собирается.
+
+    Returns:
+        bool: True, если у всех изображений нашлись корректные аннотации.
+    """
+    all_train_val_images = list_images(images_dir)
+    if not all_train_val_images:
+        print(f"Ошибка: В {images_dir} нет изображений.")
+        return False
+    store = LabelStore.open(label_store) if label_store else None
+    if validate:
+        validation = validate_annotations(annotations_dir, store, names=all_train_val_images, workers=workers)
+        if not validation.ok:
+            validation.print_report()
+            print("Ошибка: аннотации не прошли проверку, датасет не собран.")
+            return False
+    train_images, val_images = split_items(all_train_val_images, val_ratio, seed)
+
+    print(f"Total train/val raw images: {len(all_train_val_images)}")
+    print(f"Train images: {len(train_images)} ({len(train_images)/len(all_train_val_images):.2%})")
+    print(f"Validation images: {len(val_images)} ({len(val_images)/len(all_train_val_images):.2%})")
+
+    report = build_split({'train': train_images, 'val': val_images}, images_dir, annotations_dir, dataset_dir,
+                         mode=mode, workers=workers,
+                         label_store=store)
+    print("Train/Validation split complete.")
+    return all(counts['missing_labels'] == 0 for counts in report.values())
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Точка входа командной строки.
+
+    Пример (из корня проекта):
+        python -m scripts.split_train_val --seed 42 --val-ratio 0.2
+    """
+    parser = argparse.ArgumentParser(description="Разделение отобранных кадров на train и val.")
+    parser.add_argument('--images', default=IMAGES_DIR, help="Директория отобранных кадров")
+    parser.add_argument('--annotations', default=ANNOTATIONS_DIR, help="Директория всех аннотаций")
+    parser.add_argument('--dataset', default=BASE_DATASET_DIR, help="Корневая директория датасета")
+    parser.add_argument('--val-ratio', type=float, default=VAL_SPLIT_RATIO, help="Доля валидационной выборки")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help="Seed перемешивания (воспроизводимое разбиение)")
+    parser.add_argument('--mode', default='auto', choices=LINK_MODES, help="Ссылки или копирование изображений (аннотации всегда копируются)")
+    parser.add_argument('--workers', type=int, default=None, help="Потоков копирования")
+    parser.add_argument('--label-store', default=None, help="Хранилище аннотаций (вместо --annotations)")
+    parser.add_argument('--no-validate', action='store_true', help="Не проверять аннотации перед сборкой")
+    args = parser.parse_args(argv)
+
+    ok = split_train_val(args.images, args.annotations, args.dataset, args.val_ratio, args.seed, args.mode, args.workers, args.label_store,
+                         validate=not args.no_validate)
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,247 @@
+import numpy as np
+from typing import Dict, Optional, Tuple, Type, Union
+
+
+class Detections:
+    """
+    Результаты детекции/отслеживания одного кадра в виде массивов NumPy.
+
+    Все данные переносятся с устройства одним копированием (boxes.data),
+    после чего выбор цели выполняется векторно, без обращения к тензорам по отдельным индексам.
+
+    Attributes:
+        xyxy (np.ndarray): Координаты bbox формы (N, 4) в формате x1, y1, x2, y2.
+        conf (np.ndarray): Уверенность детекций формы (N,).
+        cls (np.ndarray): ID классов формы (N,).
+        ids (np.ndarray): ID треков формы (N,); -1, если трекер не присвоил ID.
+    """
+
+    def __init__(self, xyxy: np.ndarray, conf: np.ndarray, cls: np.ndarray, ids: np.ndarray):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+        self.ids = ids
+
+    @classmethod
+    def empty(cls) -> "Detections":
+        return cls(
+            np.zeros((0, 4), dtype=np.float32),
+            np.zeros(0, dtype=np.float32),
+            np.zeros(0, dtype=np.float32),
+            np.zeros(0, dtype=np.float32),
+        )
+
+    @classmethod
+    def from_result(cls, result) -> "Detections":
+        """
+        Создает Detections из результата Ultralytics (Results) одним переносом boxes.data на CPU.
+        Формат boxes.data: [x1, y1, x2, y2, (track_id), conf, cls] — столбец track_id есть только при трекинге.
+        """
+        if result is None or result.boxes is None or len(result.boxes) == 0:
+            return cls.empty()
+
+        data = result.boxes.data.cpu().numpy().astype(np.float32, copy=False)
+        if data.shape[1] == 7:
+            ids = data[:, 4]
+        else:
+            ids = np.full(len(data), -1, dtype=np.float32)
+        return cls(data[:, :4], data[:, -2], data[:, -1], ids)
+
+    def __len__(self) -> int:
+        return len(self.xyxy)
+
+    @property
+    def has_track_ids(self) -> bool:
+        """True, если трекер присвоил ID хотя бы одному объекту."""
+        return len(self.ids) > 0 and bool(np.any(self.ids >= 0))
+
+    @property
+    def areas(self) -> np.ndarray:
+        return (self.xyxy[:, 2] - self.xyxy[:, 0]) * (self.xyxy[:, 3] - self.xyxy[:, 1])
+
+    @property
+    def centers(self) -> np.ndarray:
+        """Центры bbox формы (N, 2)."""
+        return np.stack(((self.xyxy[:, 0] + self.xyxy[:, 2]) / 2, (self.xyxy[:, 1] + self.xyxy[:, 3]) / 2), axis=1)
+
+    def target_bbox(self, index: int) -> Tuple:
+        """
+        Возвращает выбранный объект в виде кортежа (x1, y1, x2, y2, track_id, conf, cls),
+        который используется в цикле трекера.
+        """
+        x1, y1, x2, y2 = self.xyxy[index].astype(int)
+        return (x1, y1, x2, y2, float(self.ids[index]), float(self.conf[index]), float(self.cls[index]))
+
+
+class TargetSelector:
+    """
+    Базовая стратегия выбора целевого объекта среди детекций кадра.
+    Стратегия может хранить состояние между кадрами; reset() вызывается перед новым видео.
+    """
+
+    name = "base"
+
+    def select(self, detections: Detections) -> Optional[int]:
+        """Возвращает индекс выбранного объекта или None, если подходящего объекта нет."""
+        raise NotImplementedError
+
+    def reset(self) -> None:
+        pass
+
+
+class LargestAreaSelector(TargetSelector):
+    """Выбирает объект с наибольшей площадью bbox."""
+
+    name = "largest_area"
+
+    def select(self, detections: Detections) -> Optional[int]:
+        if len(detections) == 0:
+            return None
+        areas = detections.areas
+        index = int(np.argmax(areas))
+        return index if areas[index] > 0 else None
+
+
+class HighestConfidenceSelector(TargetSelector):
+    """Выбирает объект с наибольшей уверенностью детекции."""
+
+    name = "highest_confidence"
+
+    def select(self, detections: Detections) -> Optional[int]:
+        if len(detections) == 0:
+            return None
+        return int(np.argmax(detections.conf))
+
+
+class StickyTrackIdSelector(TargetSelector):
+    """
+    Продолжает следить за ID трека, выбранным ранее.
+    Если этот ID пропал из кадра, цель выбирается заново резервной стратегией (по умолчанию — по площади).
+    """
+
+    name = "sticky_id"
+
+    def __init__(self, fallback: Optional[TargetSelector] = None):
+        self.fallback = fallback if fallback is not None else LargestAreaSelector()
+        self.locked_id: Optional[float] = None
+
+    def select(self, detections: Detections) -> Optional[int]:
+        if len(detections) == 0:
+            return None
+        if self.locked_id is not None:
+            matches = np.flatnonzero(detections.ids == self.locked_id)
+            if len(matches) > 0:
+                return int(matches[0])
+
+        index = self.fallback.select(detections)
+        if index is not None and detections.ids[index] >= 0:
+            self.locked_id = float(detections.ids[index])
+        return index
+
+    def reset(self) -> None:
+        self.locked_id = None
+        self.fallback.reset()
+
+
+class TargetLockSelector(StickyTrackIdSelector):
+    """
+    Режим захвата цели: следит за ID трека ByteTrack, выбранным при первом захвате.
+
+    Пока ID присутствует в кадре, выбор сводится к одному векторному сравнению ID без пересчета площадей.
+    Если ID потерян (например, трекер выдал цели новый ID после перекрытия), цель ищется среди
+    детекций как ближайший сосед к последнему известному центру в радиусе reacquire_radius;
+    найденный объект перезахватывается вместе с его новым ID. Если рядом никого нет, кадр остается
+    без цели (камера держит последнюю позицию) — так более крупный сноубордист, проезжающий мимо,
+    не перехватывает камеру. После max_lost_frames кадров без цели выполняется полный захват заново.
+    """
+
+    name = "target_lock"
+
+    def __init__(
+        self,
+        fallback: Optional[TargetSelector] = None,
+        reacquire_radius: Optional[float] = None,
+        reacquire_radius_scale: float = 1.5,
+        max_lost_frames: int = 90
+    ):
+        """
+        Args:
+            fallback (TargetSelector, optional): Стратегия первичного захвата цели (по умолчанию — по площади).
+            reacquire_radius (float, optional): Радиус поиска цели вокруг последнего центра в пикселях.
+                Если None, радиус равен reacquire_radius_scale * диагональ последнего bbox цели.
+            reacquire_radius_scale (float): Множитель диагонали bbox для радиуса поиска.
+            max_lost_frames (int): Сколько кадров подряд цель может отсутствовать до полного перезахвата.
+        """
+        super().__init__(fallback)
+        self.reacquire_radius = reacquire_radius
+        self.reacquire_radius_scale = reacquire_radius_scale
+        self.max_lost_frames = max_lost_frames
+        self.last_center: Optional[np.ndarray] = None
+        self.last_diagonal: float = 0.0
+        self.lost_frames = 0
+
+    def select(self, detections: Detections) -> Optional[int]:
+        index = None
+        if len(detections) > 0:
+            if self.locked_id is not None:
+                matches = np.flatnonzero(detections.ids == self.locked_id)
+                if len(matches) > 0:
+                    index = int(matches[0])
+                elif self.last_center is not None:
+                    index = self._nearest_to_last_center(detections)
+
+            if index is None and (self.locked_id is None or self.lost_frames >= self.max_lost_frames):
+                index = self.fallback.select(detections)
+
+        if index is None:
+            self.lost_frames += 1
+            return None
+
+        self._lock(detections, index)
+        return index
+
+    def _nearest_to_last_center(self, detections: Detections) -> Optional[int]:
+        """Ищет детекцию, ближайшую к последнему центру цели, в пределах радиуса перезахвата."""
+        distances = np.linalg.norm(detections.centers - self.last_center, axis=1)
+        index = int(np.argmin(distances))
+        radius = self.reacquire_radius
+        if radius is None:
+            radius = self.reacquire_radius_scale * self.last_diagonal
+        return index if distances[index] <= radius else None
+
+    def _lock(self, detections: Detections, index: int) -> None:
+        x1, y1, x2, y2 = detections.xyxy[index]
+        self.last_center = np.array(((x1 + x2) / 2, (y1 + y2) / 2), dtype=np.float32)
+        self.last_diagonal = float(np.hypot(x2 - x1, y2 - y1))
+        self.lost_frames = 0
+        if detections.ids[index] >= 0:
+            self.locked_id = float(detections.ids[index])
+
+    def reset(self) -> None:
+        super().reset()
+        self.last_center = None
+        self.last_diagonal = 0.0
+        self.lost_frames = 0
+
+
+# Реестр стратегий выбора цели по имени
+TARGET_SELECTORS: Dict[str, Type[TargetSelector]] = {
+    LargestAreaSelector.name: LargestAreaSelector,
+    HighestConfidenceSelector.name: HighestConfidenceSelector,
+    StickyTrackIdSelector.name: StickyTrackIdSelector,
+    TargetLockSelector.name: TargetLockSelector,
+}
+
+
+def get_target_selector(selector: Union[str, TargetSelector]) -> TargetSelector:
+    """
+    Возвращает стратегию выбора цели по имени из TARGET_SELECTORS или сам объект стратегии.
+
+    Raises:
+        ValueError: Если стратегия с таким именем не зарегистрирована.
+    """
+    if isinstance(selector, TargetSelector):
+        return selector
+    if selector not in TARGET_SELECTORS:
+        raise ValueError(f"Неизвестная стратегия выбора цели '{selector}'. Доступны: {', '.join(TARGET_SELECTORS)}")
+    return TARGET_SELECTORS[selector]()
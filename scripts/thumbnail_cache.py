@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import tempfile
+from typing import Callable, Dict, Optional
+
+from scripts.detection_cache import file_hash
+
+
+# Кэш по умолчанию — в runs/ корня проекта (генерируемые артефакты, не попадают в ноутбуки и репозиторий)
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'runs', '.thumbnails')
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class ThumbnailCache:
+    """
+    Дисковый кэш миниатюр изображений с адресацией по содержимому.
+
+    Ключ — хэш содержимого исходного изображения (и файла аннотаций, если рамки рисуются на миниатюре)
+    и параметры миниатюры (ширина, качество и т.п.), поэтому переименование файла не приводит к пересчету,
+    а изменение изображения или аннотации — приводит. Когда суммарный размер кэша превышает max_bytes,
+    удаляются давно не использованные миниатюры (LRU по времени изменения файла, которое обновляется
+    при каждом попадании в кэш).
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        # Хэши файлов в пределах процесса: (путь, размер, mtime) -> хэш (повторный запуск ячейки не читает файлы)
+        self._hashes: Dict[tuple, str] = {}
+
+    def _hash_of(self, path: str) -> str:
+        stat = os.stat(path)
+        signature = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        if signature not in self._hashes:
+            self._hashes[signature] = file_hash(path)
+        return self._hashes[signature]
+
+    def key(self, image_path: str, labels_path: Optional[str] = None, **params) -> str:
+        """Ключ миниатюры: хэши изображения и аннотаций плюс параметры миниатюры."""
+        fields = {
+            'image': self._hash_of(image_path),
+            'labels': self._hash_of(labels_path) if labels_path and os.path.exists(labels_path) else None,
+            'params': params,
+        }
+        payload = json.dumps(fields, sort_keys=True, default=str).encode('utf-8')
+        return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+    def path_for(self, key: str, ext: str = '.jpg') -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ext)
+
+    def load(self, key: str, ext: str = '.jpg') -> Optional[bytes]:
+        """Читает миниатюру из кэша (и отмечает ее как недавно использованную) или возвращает None."""
+        path = self.path_for(key, ext)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return data
+
+    def save(self, key: str, data: bytes, ext: str = '.jpg') -> str:
+        """Атомарно сохраняет миниатюру и возвращает путь к ней."""
+        path = self.path_for(key, ext)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=ext + '.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return path
+
+    def get_or_create(self, image_path: str, create: Callable[[], Optional[bytes]], labels_path: Optional[str] = None,
+                      ext: str = '.jpg', **params) -> Optional[bytes]:
+        """
+        Миниатюра из кэша или, при промахе, результат create(), который сохраняется в кэш.
+
+        Args:
+            image_path (str): Исходное изображение.
+            create (Callable): Функция построения миниатюры (возвращает байты файла или None при ошибке).
+            labels_path (str, optional): Файл аннотаций, рамки которого рисуются на миниатюре.
+            ext (str): Расширение файла миниатюры.
+            **params: Параметры миниатюры, входящие в ключ.
+        """
+        try:
+            key = self.key(image_path, labels_path, **params)
+        except OSError:
+            return None  # Исходного файла нет
+        data = self.load(key, ext)
+        if data is None:
+            data = create()
+            if data is not None:
+                self.save(key, data, ext)
+        return data
+
+    def file_for(self, image_path: str, create: Callable[[], Optional[bytes]], labels_path: Optional[str] = None,
+                 ext: str = '.jpg', **params) -> Optional[str]:
+        """Как get_or_create, но возвращает путь к файлу миниатюры в кэше (например, для wandb.Image)."""
+        if self.get_or_create(image_path, create, labels_path, ext, **params) is None:
+            return None
+        return self.path_for(self.key(image_path, labels_path, **params), ext)
+
+    def evict(self) -> int:
+        """
+        Удаляет давно не использованные миниатюры, пока размер кэша не станет не больше 90% max_bytes
+        (запас, чтобы не запускать вытеснение после каждой новой миниатюры).
+
+        Returns:
+            int: Количество удаленных файлов.
+        """
+        if not os.path.isdir(self.cache_dir):
+            return 0
+        files = []
+        total = 0
+        with os.scandir(self.cache_dir) as shards:
+            for shard in shards:
+                if not shard.is_dir():
+                    continue
+                with os.scandir(shard.path) as entries:
+                    for entry in entries:
+                        if entry.is_file():
+                            stat = entry.stat()
+                            files.append((stat.st_mtime_ns, stat.st_size, entry.path))
+                            total += stat.st_size
+        if total <= self.max_bytes:
+            return 0
+
+        removed = 0
+        target = int(self.max_bytes * 0.9)
+        for _, size, path in sorted(files):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
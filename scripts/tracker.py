@@ -1,201 +1,1112 @@
+import argparse
 import cv2
+import itertools
+import json
+import logging
 import os
+import time
 import numpy as np
-from ultralytics import YOLO
-from typing import Tuple, Optional # Добавлен Optional для более точных типов
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Sequence, Tuple, Optional, Union # Добавлен Optional для более точных типов
+
+from scripts.detection_cache import DetectionCache, DetectionRecorder
+from scripts.profiling import StageProfiler
+from scripts.motion import ConstantVelocityKalman, center_error_stats, simulate_detect_interval_centers
+from scripts.target_selection import Detections, TargetSelector, get_target_selector
+from scripts.virtual_camera import VirtualCamera
+from scripts.video_io import (
+    WRITER_BACKENDS, FrameBufferRing, FrameReaderThread, FrameWriterThread, LatestFrameReader, NullVideoWriter,
+    create_video_writer, iter_capture_frames, iter_frame_batches, open_video_source
+)
+
+if TYPE_CHECKING:
+    from ultralytics import YOLO
+
+# Покадровые сообщения выводятся на уровне DEBUG, чтобы не замедлять обработку длинных видео.
+# Включить: logging.getLogger('scripts.tracker').setLevel(logging.DEBUG) (и настроить обработчик логов).
+logger = logging.getLogger(__name__)
+
+# Конфигурация трекера Ultralytics (входит в ключ кэша детекций)
+TRACKER_CONFIG = 'bytetrack.yaml'
+
+
+def _reset_tracker_state(model) -> None:
+    """
+    Сбрасывает состояние трекеров Ultralytics у загруженной модели.
+    При persist=True трекеры создаются заново только если у предиктора их нет,
+    поэтому перед новым видео их достаточно удалить.
+    """
+    predictor = getattr(model, 'predictor', None)
+    if predictor is not None and hasattr(predictor, 'trackers'):
+        del predictor.trackers
+
+
+def _run_tracking(model, frames: list, confidence_threshold: float, iou_threshold: float, target_class_id: int) -> list:
+    """Запускает model.track для списка кадров одного видео (трекер сохраняет состояние между вызовами)."""
+    if not frames:
+        return []
+    return model.track(frames, persist=True, conf=confidence_threshold, iou=iou_threshold, classes=[target_class_id], verbose=False, tracker=TRACKER_CONFIG)
+
+
+def _select_target(detections: Detections, selector: TargetSelector, frame_count: int, target_class_id: int) -> Optional[Tuple]:
+    """
+    Выбирает целевой объект среди детекций кадра с помощью заданной стратегии.
+
+    Returns:
+        Optional[Tuple]: Кортеж (x1, y1, x2, y2, track_id, conf, cls) или None, если объектов с ID нет.
+    """
+    # Учитываем только объекты, которым трекер присвоил ID
+    if not detections.has_track_ids:
+        return None
+
+    # Отладочный вывод: сколько объектов найдено
+    logger.debug("Кадр %d: Найдено %d объектов класса %d.", frame_count, len(detections), target_class_id)
+
+    index = selector.select(detections)
+    if index is None:
+        return None
+    return detections.target_bbox(index)
+
+
+def _roi_window(
+    center: Tuple[float, float],
+    bbox_size: Tuple[int, int],
+    frame_shape: Tuple[int, ...],
+    roi_size: int,
+    roi_scale: float
+) -> Tuple[int, int, int, int]:
+    """
+    Вычисляет квадратную область интереса вокруг центра цели, сдвинутую так, чтобы она лежала внутри кадра.
+
+    Returns:
+        Tuple[int, int, int, int]: Координаты ROI (x1, y1, x2, y2) в исходном кадре.
+    """
+    frame_height, frame_width = frame_shape[:2]
+    side = max(roi_size, int(roi_scale * max(bbox_size)))
+    side_x = min(side, frame_width)
+    side_y = min(side, frame_height)
+
+    x1 = int(round(center[0] - side_x / 2))
+    y1 = int(round(center[1] - side_y / 2))
+    x1 = min(max(0, x1), frame_width - side_x)
+    y1 = min(max(0, y1), frame_height - side_y)
+    return x1, y1, x1 + side_x, y1 + side_y
+
+
+def _detect_target_in_roi(
+    model,
+    frame: np.ndarray,
+    center: Tuple[float, float],
+    bbox_size: Tuple[int, int],
+    track_id: Optional[float],
+    roi_size: int,
+    roi_scale: float,
+    roi_min_confidence: float,
+    confidence_threshold: float,
+    iou_threshold: float,
+    target_class_id: int
+) -> Optional[Tuple]:
+    """
+    Ищет цель на области интереса вокруг предсказанной позиции.
+
+    model должен быть отдельным от трекинга экземпляром YOLO, чтобы кадры ROI не попадали в ByteTrack.
+    Из детекций в ROI выбирается ближайшая к предсказанному центру; ей присваивается ID трека цели,
+    а координаты переводятся в систему исходного кадра.
+
+    Returns:
+        Optional[Tuple]: Кортеж (x1, y1, x2, y2, track_id, conf, cls) в координатах кадра
+                         или None, если цель не найдена или ее уверенность ниже roi_min_confidence.
+    """
+    rx1, ry1, rx2, ry2 = _roi_window(center, bbox_size, frame.shape, roi_size, roi_scale)
+    roi = frame[ry1:ry2, rx1:rx2]
+    results = model.predict(roi, conf=confidence_threshold, iou=iou_threshold, classes=[target_class_id], imgsz=roi_size, verbose=False)
+    detections = Detections.from_result(results[0] if results else None)
+    if len(detections) == 0:
+        return None
+
+    distances = np.linalg.norm(detections.centers - np.array((center[0] - rx1, center[1] - ry1)), axis=1)
+    index = int(np.argmin(distances))
+    if detections.conf[index] < roi_min_confidence:
+        return None
+
+    x1, y1, x2, y2 = (detections.xyxy[index] + np.array((rx1, ry1, rx1, ry1))).astype(int)
+    return (x1, y1, x2, y2, track_id if track_id is not None else -1.0, float(detections.conf[index]), float(detections.cls[index]))
+
+
+def _crop_around_center(
+    frame: np.ndarray,
+    center: Tuple[int, int],
+    target_imgsz: int,
+    frame_count: int,
+    out: np.ndarray
+) -> Tuple[np.ndarray, int, int, int, int]:
+    """
+    Вырезает из кадра квадрат target_imgsz x target_imgsz с центром в center в заранее выделенный буфер out.
+    Части квадрата за пределами исходного кадра заполняются черным (padding) с помощью
+    cv2.copyMakeBorder прямо в буфер — без создания промежуточных массивов и полной очистки буфера.
+
+    Returns:
+        Tuple: (обрезанный кадр, x1_crop, y1_crop, paste_x1, paste_y1) — координаты
+               окна обрезки в исходном кадре и смещение вставки, нужные для пересчета bbox.
+    """
+    frame_height, frame_width = frame.shape[:2]
+    cx, cy = center
+
+    # Вычисляем углы квадратного кадра
+    x1_crop = int(cx - target_imgsz / 2)
+    y1_crop = int(cy - target_imgsz / 2)
+    x2_crop = int(cx + target_imgsz / 2)
+    y2_crop = int(cy + target_imgsz / 2)
+
+    # Обработка границ кадра (padding)
+    paste_x1 = max(0, -x1_crop)
+    paste_y1 = max(0, -y1_crop)
+
+    src_x1 = max(0, x1_crop)
+    src_y1 = max(0, y1_crop)
+    src_x2 = min(frame_width, x2_crop)
+    src_y2 = min(frame_height, y2_crop)
+
+    actual_crop_width = src_x2 - src_x1
+    actual_crop_height = src_y2 - src_y1
+
+    if actual_crop_width > 0 and actual_crop_height > 0:
+        cropped_section = frame[src_y1:src_y2, src_x1:src_x2]
+
+        # Ширина черных полос вокруг вырезанной области до размера target_imgsz
+        pad_bottom = target_imgsz - paste_y1 - actual_crop_height
+        pad_right = target_imgsz - paste_x1 - actual_crop_width
+
+        if pad_bottom >= 0 and pad_right >= 0:
+            cv2.copyMakeBorder(cropped_section, paste_y1, pad_bottom, paste_x1, pad_right,
+                               cv2.BORDER_CONSTANT, dst=out, value=(0, 0, 0))
+        else:
+            logger.warning("Кадр %d ОШИБКА РАЗМЕРОВ: cropped_section %s vs expected %dx%d. Запись черного кадра.", frame_count, cropped_section.shape, actual_crop_height, actual_crop_width)
+            out.fill(0)
+    else:
+        logger.debug("Кадр %d: Нет области для обрезки или область нулевая. Запись черного кадра.", frame_count)
+        out.fill(0)
+
+    return out, x1_crop, y1_crop, paste_x1, paste_y1
+
+
+def _draw_target_bbox(
+    cropped_frame: np.ndarray,
+    target_bbox: Tuple,
+    transform: Tuple[float, float, float],
+    target_imgsz: int
+) -> None:
+    """
+    Рисует bbox и ID цели на обрезанном кадре.
+
+    Координаты пересчитываются из исходного кадра преобразованием transform = (scale, offset_x, offset_y):
+    x_out = scale * x + offset_x, y_out = scale * y + offset_y.
+    """
+    x1, y1, x2, y2, track_id, conf, cls = target_bbox
+    scale, offset_x, offset_y = transform
+    bbox_x1_rel = int(scale * x1 + offset_x)
+    bbox_y1_rel = int(scale * y1 + offset_y)
+    bbox_x2_rel = int(scale * x2 + offset_x)
+    bbox_y2_rel = int(scale * y2 + offset_y)
+
+    bbox_x1_rel = max(0, bbox_x1_rel)
+    bbox_y1_rel = max(0, bbox_y1_rel)
+    bbox_x2_rel = min(target_imgsz - 1, bbox_x2_rel)
+    bbox_y2_rel = min(target_imgsz - 1, bbox_y2_rel)
+
+    if bbox_x2_rel > bbox_x1_rel and bbox_y2_rel > bbox_y1_rel:
+        cv2.rectangle(cropped_frame, (bbox_x1_rel, bbox_y1_rel), (bbox_x2_rel, bbox_y2_rel), (0, 255, 0), 2)
+        text = f"ID: {int(track_id)}" if track_id is not None else "No ID"
+        text_pos_y = max(10, bbox_y1_rel - 10)
+        cv2.putText(cropped_frame, text, (bbox_x1_rel, text_pos_y), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
+
+
+class FrameResult:
+    """
+    Результат обработки одного кадра трекером (элемент TrackedFrames).
+
+    Attributes:
+        index (int): Номер кадра в видео, начиная с 1 (в потоковом режиме отброшенные кадры не нумеруются).
+        target (Tuple | None): Цель на кадре (x1, y1, x2, y2, track_id, conf, cls) в координатах исходного кадра;
+            None, если цель на кадре не обнаружена (в том числе на кадрах без детекции при detect_interval > 1).
+        center (Tuple[int, int] | None): Центр окна обрезки — последняя известная (или предсказанная) позиция цели;
+            None, если цель еще ни разу не была найдена.
+        transform (Tuple[float, float, float] | None): Преобразование исходного кадра в выходной (scale, offset_x, offset_y):
+            x_out = scale * x + offset_x, y_out = scale * y + offset_y; None, пока центр неизвестен.
+        crop (np.ndarray | None): Выходной кадр target_imgsz x target_imgsz без разметки (при render_crops=True).
+        detected (bool): Запускался ли детектор на этом кадре.
+        output_size (int): Сторона выходного кадра.
+    """
+
+    def __init__(
+        self,
+        index: int,
+        target: Optional[Tuple],
+        center: Optional[Tuple[int, int]],
+        transform: Optional[Tuple[float, float, float]],
+        crop: Optional[np.ndarray],
+        detected: bool,
+        output_size: int
+    ):
+        self.index = index
+        self.target = target
+        self.center = center
+        self.transform = transform
+        self.crop = crop
+        self.detected = detected
+        self.output_size = output_size
+
+    @property
+    def found(self) -> bool:
+        return self.target is not None
+
+    @property
+    def bbox(self) -> Optional[Tuple[float, float, float, float]]:
+        return tuple(float(v) for v in self.target[:4]) if self.target is not None else None
+
+    @property
+    def track_id(self) -> Optional[float]:
+        return float(self.target[4]) if self.target is not None else None
+
+    @property
+    def confidence(self) -> Optional[float]:
+        return float(self.target[5]) if self.target is not None else None
+
+    @property
+    def crop_window(self) -> Optional[Tuple[float, float, float, float]]:
+        """Область исходного кадра (x1, y1, x2, y2), попавшая в выходной кадр; None, пока центр неизвестен."""
+        if self.transform is None:
+            return None
+        scale, offset_x, offset_y = self.transform
+        x1, y1 = -offset_x / scale, -offset_y / scale
+        return x1, y1, x1 + self.output_size / scale, y1 + self.output_size / scale
+
+
+class TrackedFrames:
+    """
+    Итератор по результатам отслеживания целевого объекта в видео: для каждого кадра выдается FrameResult
+    (номер кадра, цель, центр и окно обрезки и, при render_crops=True, обрезанный кадр).
+
+    Модель загружается и источник открывается при создании объекта, кадры обрабатываются по мере итерации.
+    Результат одного прохода инференса может потреблять любой код (запись видео, аналитика, наложения)
+    без повторного запуска YOLO и повторного декодирования. Обойти объект можно только один раз;
+    по завершении итерации (или при close()) источник освобождается.
+
+    В конвейерном режиме (pipelined=True) декодирование кадров выполняется отдельным потоком
+    в ограниченную очередь, а инференс идет микро-батчами по batch_size кадров.
+
+    При detect_interval > 1 YOLO запускается только на каждом detect_interval-м кадре,
+    а центр обрезки на промежуточных кадрах переносится фильтром Калмана с моделью
+    постоянной скорости. Оценить добавляемую этим ошибку центра можно функцией
+    report_detect_interval_error.
+
+    В режиме ROI (roi_inference=True) после первого обнаружения цели YOLO получает не весь кадр,
+    а квадратную область вокруг предсказанной позиции цели (не меньше roi_size, чтобы при
+    небольшой цели область подавалась в модель без уменьшения). Координаты пересчитываются
+    в систему исходного кадра. Если цель в ROI не найдена или ее уверенность ниже
+    roi_min_confidence, кадр обрабатывается целиком через model.track. Кадры ROI не проходят
+    через ByteTrack, поэтому для сохранения ID трека полный кадр принудительно обрабатывается
+    каждые roi_full_frame_interval кадров с детекцией (меньше буфера потерянных треков ByteTrack).
+    В режиме ROI кадры с детекцией обрабатываются по одному, batch_size влияет только на чтение.
+
+    Если передана виртуальная камера (VirtualCamera), центр окна обрезки (и, опционально, масштаб)
+    сглаживается во времени, а выходной кадр строится одним cv2.warpAffine с субпиксельной точностью
+    вместо привязки к целочисленному центру bbox.
+
+    Для живых источников (камера, RTSP, сырые кадры из stdin) включается drop_stale_frames:
+    кадры читаются фоновым потоком, и если обработка не успевает за источником, устаревшие
+    кадры отбрасываются, так что задержка остается ограниченной.
+
+    Пример:
+        for result in TrackedFrames('best.pt', 'video.mp4', render_crops=False):
+            print(result.index, result.bbox, result.track_id)
+    """
+
+    def __init__(
+        self,
+        model_path: str,
+        video_input_path: Union[str, int],
+        target_class_id: int = 0, # 0 для класса 'snowboarder' в нашей модели
+        target_imgsz: int = 640, # Размер квадратного кадра, который будем вырезать
+        confidence_threshold: float = 0.25,
+        iou_threshold: float = 0.7,
+        pipelined: bool = False, # Декодирование в отдельном потоке
+        batch_size: int = 1, # Размер микро-батча кадров для одного вызова model.track
+        queue_size: int = 32, # Размер очереди декодера в конвейерном режиме
+        target_selector: Union[str, TargetSelector] = 'largest_area', # Стратегия выбора цели
+        detect_interval: int = 1, # Запускать YOLO на каждом N-м кадре
+        roi_inference: bool = False, # Инференс на области вокруг последней позиции цели
+        roi_size: int = 640, # Минимальная сторона ROI (нативный размер входа модели)
+        roi_scale: float = 3.0, # Сторона ROI относительно наибольшей стороны bbox цели
+        roi_min_confidence: float = 0.5, # Ниже этой уверенности — возврат к полному кадру
+        roi_full_frame_interval: int = 15, # Принудительный полный кадр каждые N детекций в режиме ROI
+        virtual_camera: Optional[VirtualCamera] = None, # Сглаживающая виртуальная камера
+        model: Optional["YOLO"] = None, # Предзагруженная модель (повторное использование между видео)
+        roi_model: Optional["YOLO"] = None, # Предзагруженная модель для детекции по ROI
+        model_loader: Optional[Callable[[bool], Tuple["YOLO", Optional["YOLO"]]]] = None, # Загрузка модели при промахе кэша
+        drop_stale_frames: bool = False, # Живой источник: обрабатывать только самый свежий кадр
+        realtime: bool = False, # Воспроизводить файл со скоростью исходного видео (имитация камеры)
+        input_frame_size: Optional[Tuple[int, int]] = None, # Размер кадра для сырых кадров из stdin
+        input_fps: Optional[float] = None, # Частота кадров источника, если он ее не сообщает
+        start_frame: int = 0, # Первый обрабатываемый кадр видеофайла (с 0)
+        end_frame: Optional[int] = None, # Кадр, на котором обработка останавливается (не включительно)
+        render_crops: bool = True, # Формировать обрезанные кадры
+        crop_buffers: int = 1, # Количество переиспользуемых буферов под обрезанные кадры
+        profiler: Optional[StageProfiler] = None, # Профилировщик этапов
+        detection_cache: Optional[Union[str, DetectionCache]] = None # Директория (или объект) кэша детекций
+    ):
+        """
+        Args:
+            model_path (str): Путь к обученной модели YOLO.
+            video_input_path (str | int): Путь к исходному видеофайлу, URL потока, индекс камеры
+                или '-' (сырые кадры BGR24 из стандартного ввода, см. input_frame_size).
+            target_class_id (int): ID класса отслеживаемого объекта (по умолчанию 0 для 'snowboarder').
+            target_imgsz (int): Желаемый размер (сторона квадрата) выходного видеокадра.
+            confidence_threshold (float): Порог уверенности для детекции.
+            iou_threshold (float): Порог IoU для не-максимального подавления (NMS).
+            pipelined (bool): Если True, декодирование выполняется в фоновом потоке.
+            batch_size (int): Количество кадров, передаваемых в model.track за один вызов.
+            queue_size (int): Максимальное количество кадров в очереди декодера.
+            target_selector (str | TargetSelector): Стратегия выбора цели среди обнаруженных объектов:
+                'largest_area' (наибольшая площадь bbox), 'highest_confidence' (наибольшая уверенность),
+                'sticky_id' (удержание выбранного ID трека), 'target_lock' (захват цели с перезахватом
+                ближайшего объекта при потере ID) или собственный объект TargetSelector.
+            detect_interval (int): Интервал запуска детектора в кадрах (1 — каждый кадр).
+            roi_inference (bool): Если True, детекция выполняется на области вокруг последней позиции цели.
+            roi_size (int): Минимальная сторона квадратной ROI в пикселях.
+            roi_scale (float): Сторона ROI как множитель наибольшей стороны последнего bbox цели.
+            roi_min_confidence (float): Минимальная уверенность детекции в ROI; ниже — полный кадр.
+            roi_full_frame_interval (int): Через сколько кадров с детекцией в ROI выполнять полный кадр.
+            virtual_camera (VirtualCamera, optional): Виртуальная камера со сглаживанием и zoom-to-fit.
+                Ее output_size должен совпадать с target_imgsz.
+            model (YOLO, optional): Уже загруженная модель. Если передана, model_path не загружается,
+                а состояние трекера модели сбрасывается перед обработкой видео.
+            roi_model (YOLO, optional): Уже загруженный отдельный экземпляр модели для режима ROI.
+            model_loader (Callable, optional): Если model не передана, вызывается model_loader(roi_inference)
+                только когда модель действительно нужна (нет попадания в кэш детекций) и возвращает
+                (модель, модель ROI или None) — например, модели процесса-обработчика, загружаемые один раз
+                при первом промахе кэша (см. scripts.worker_pool).
+            drop_stale_frames (bool): Если True, обрабатывается только самый свежий кадр источника,
+                а не успевшие обработаться кадры отбрасываются (для живых источников).
+            realtime (bool): Если True, файл читается со скоростью исходного видео, как живой источник
+                (включает drop_stale_frames).
+            input_frame_size (Tuple[int, int], optional): Ширина и высота кадров при чтении из стандартного ввода.
+            input_fps (float, optional): Частота кадров источника, если она неизвестна (stdin, некоторые потоки).
+            start_frame (int): Номер кадра видеофайла (с 0), с которого начинается обработка (переход по файлу).
+            end_frame (int, optional): Номер кадра, перед которым обработка останавливается; None — до конца видео.
+                FrameResult.index и интервал детекции отсчитываются от начала видео, а не от start_frame.
+            render_crops (bool): Если False, обрезанные кадры не формируются (FrameResult.crop = None),
+                а вычисляются только цель, центр и окно обрезки — для аналитики без вывода видео.
+            crop_buffers (int): Размер кольца буферов под обрезанные кадры. Буфер переиспользуется
+                через crop_buffers кадров, поэтому потребитель, который хранит кадры дольше, должен их копировать.
+            profiler (StageProfiler, optional): Профилировщик этапов decode/inference/selection/crop;
+                завершение кадра отмечается, когда потребитель запрашивает следующий результат.
+            detection_cache (str | DetectionCache, optional): Директория кэша детекций. Ключ записи — хэш
+                видео, хэш весов, пороги, класс и detect_interval. При попадании модель не загружается
+                и YOLO не запускается: детекции всех кадров берутся из кэша (режим ROI при этом не нужен
+                и отключается), а выбор цели, обрезка и сглаживание выполняются заново. При промахе
+                детекции полного прохода сохраняются в кэш. Кэш используется только для видеофайлов
+                и не заполняется в режиме ROI и при отбрасывании устаревших кадров (результаты неполные).
+
+        Raises:
+            RuntimeError: Не удалось загрузить модель или открыть источник.
+            ValueError: Размер кадра виртуальной камеры не совпадает с target_imgsz.
+        """
+        self._selector = get_target_selector(target_selector)
+        self._selector.reset()
+
+        if virtual_camera is not None:
+            if virtual_camera.output_size != target_imgsz:
+                raise ValueError(f"Размер кадра виртуальной камеры ({virtual_camera.output_size}) не совпадает с target_imgsz ({target_imgsz})")
+            virtual_camera.reset()
+
+        drop_stale_frames = drop_stale_frames or realtime
+        detect_interval = max(1, detect_interval)
+
+        # 1. Кэш детекций: при попадании модель не нужна
+        self._cache: Optional[DetectionCache] = None
+        self._cache_key: Optional[str] = None
+        self._cached = None
+        self._recorder: Optional[DetectionRecorder] = None
+        if detection_cache is not None:
+            if drop_stale_frames or not (isinstance(video_input_path, str) and os.path.isfile(video_input_path)):
+                print("Кэш детекций используется только для видеофайлов без отбрасывания кадров; кэш отключен.")
+            else:
+                self._cache = detection_cache if isinstance(detection_cache, DetectionCache) else DetectionCache(detection_cache)
+                self._cache_key = self._cache.key(
+                    video_input_path, getattr(model, 'ckpt_path', None) or model_path,
+                    conf=confidence_threshold, iou=iou_threshold, class_id=target_class_id,
+                    detect_interval=detect_interval, tracker=TRACKER_CONFIG
+                )
+                self._cached = self._cache.load(self._cache_key)
+
+        if self._cached is not None:
+            print(f"Детекции загружены из кэша: {self._cache.path_for(self._cache_key)} (YOLO не запускается)")
+            roi_inference = False
+        else:
+            # 2. Загрузка модели
+            try:
+                if model is None and model_loader is not None:
+                    model, loaded_roi_model = model_loader(roi_inference)
+                    roi_model = roi_model if roi_model is not None else loaded_roi_model
+                if model is None:
+                    # ultralytics (и torch) импортируются только при загрузке модели: импорт модуля и работа
+                    # из кэша детекций не тратят секунды на их загрузку
+                    from ultralytics import YOLO
+
+                    model = YOLO(model_path)
+                    print(f"Модель успешно загружена из: {model_path}")
+                else:
+                    # Модель переиспользуется: треки предыдущего видео не должны попасть в новое
+                    _reset_tracker_state(model)
+                # После model.track у модели зарегистрированы колбэки ByteTrack, и model.predict на ROI
+                # обновлял бы трекер координатами области. Поэтому ROI обрабатывает отдельный экземпляр модели.
+                if roi_inference and roi_model is None:
+                    from ultralytics import YOLO
+
+                    roi_model = YOLO(getattr(model, 'ckpt_path', None) or model_path)
+            except Exception as e:
+                raise RuntimeError(f"Ошибка загрузки модели: {e}") from e
+
+            if self._cache is not None:
+                if roi_inference:
+                    print("Режим ROI: детекции полного кадра есть не для всех кадров, кэш не будет сохранен.")
+                elif start_frame or end_frame is not None:
+                    print("Обрабатывается часть видео, кэш не будет сохранен.")
+                else:
+                    self._recorder = DetectionRecorder()
+
+        # 3. Чтение видео
+        self._cap = open_video_source(video_input_path, frame_size=input_frame_size, fps=input_fps)
+        if not self._cap.isOpened():
+            raise RuntimeError(f"Ошибка: Не удалось открыть видеофайл {video_input_path}")
+        if start_frame and not self._cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame):
+            self._cap.release()
+            raise RuntimeError(f"Ошибка: Источник {video_input_path} не поддерживает переход к кадру {start_frame}")
+
+        # Получаем свойства видео (у живых источников количество кадров неизвестно, а FPS может отсутствовать)
+        self.frame_width = int(self._cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.frame_height = int(self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        fps = self._cap.get(cv2.CAP_PROP_FPS)
+        self.fps = fps if fps and 0 < fps <= 1000 else (input_fps or 30.0)
+        self.total_frames = max(0, int(self._cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+
+        print(f"Исходное видео: {video_input_path}")
+        print(f"Разрешение: {self.frame_width}x{self.frame_height}, FPS: {self.fps}, Всего кадров: {self.total_frames}")
+        if virtual_camera is not None:
+            # Фильтр камеры настраивается на реальную частоту кадров источника
+            virtual_camera.set_fps(self.fps)
+
+        self._model = model
+        self._roi_model = roi_model
+        self.target_class_id = target_class_id
+        self.target_imgsz = target_imgsz
+        self.confidence_threshold = confidence_threshold
+        self.iou_threshold = iou_threshold
+        self.pipelined = pipelined
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.detect_interval = detect_interval
+        self.roi_inference = roi_inference
+        self.roi_size = roi_size
+        self.roi_scale = roi_scale
+        self.roi_min_confidence = roi_min_confidence
+        self.roi_full_frame_interval = roi_full_frame_interval
+        self.virtual_camera = virtual_camera
+        self.drop_stale_frames = drop_stale_frames
+        self.realtime = realtime
+        self.start_frame = start_frame
+        self.end_frame = end_frame
+        self.render_crops = render_crops
+        self.crop_buffers = crop_buffers
+        # Без внешнего профилировщика считается только FPS для журнала прогресса
+        self.profiler = profiler if profiler is not None else StageProfiler(enabled=False)
+
+        # Статистика обработки (обновляется по мере итерации)
+        self.frame_count = 0
+        self.detected_frames_count = 0
+        self.roi_frames_count = 0
+
+        self._reader = None
+        self._started = False
+
+    @property
+    def from_cache(self) -> bool:
+        """True, если детекции берутся из кэша (YOLO не запускается)."""
+        return self._cached is not None
+
+    def _detect_batch(self, first_frame_index: int, detect_flags: List[bool], detect_batch: List[np.ndarray]) -> List[Detections]:
+        """Детекции полного кадра для кадров батча с детекцией: из кэша или через model.track."""
+        if self._cached is not None:
+            return [self._cached.frame(first_frame_index + k) for k, flag in enumerate(detect_flags) if flag]
+        results = _run_tracking(self._model, detect_batch, self.confidence_threshold, self.iou_threshold, self.target_class_id)
+        return [Detections.from_result(result) for result in results]
+
+    @property
+    def dropped_frames(self) -> int:
+        """Количество отброшенных устаревших кадров источника (только при drop_stale_frames)."""
+        return self._reader.dropped_frames if isinstance(self._reader, LatestFrameReader) else 0
+
+    def __enter__(self) -> "TrackedFrames":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Останавливает поток чтения и освобождает источник (повторный вызов безопасен)."""
+        if self._reader is not None:
+            self._reader.stop()
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+    def __iter__(self) -> Iterator[FrameResult]:
+        if self._started:
+            raise RuntimeError("TrackedFrames можно обойти только один раз")
+        self._started = True
+        if self._cap is None:
+            return
+
+        profiler = self.profiler
+        target_imgsz = self.target_imgsz
+        detect_interval = self.detect_interval
+        virtual_camera = self.virtual_camera
+
+        # Источник кадров: в потоковом и конвейерном режимах — фоновый поток
+        if self.drop_stale_frames:
+            self._reader = LatestFrameReader(self._cap, realtime=self.realtime, fps=self.fps, profiler=profiler).start()
+            frames = iter(self._reader)
+            print(f"Потоковый режим: обрабатывается самый свежий кадр источника{' (воспроизведение в реальном времени)' if self.realtime else ''}")
+        elif self.pipelined:
+            self._reader = FrameReaderThread(self._cap, queue_size=self.queue_size, profiler=profiler).start()
+            frames = iter(self._reader)
+        else:
+            frames = iter_capture_frames(self._cap, profiler=profiler)
+        if self.end_frame is not None:
+            frames = itertools.islice(frames, max(0, self.end_frame - self.start_frame))
+
+        # Обрезанные кадры пишутся в заранее выделенные буферы (см. crop_buffers)
+        output_buffers = FrameBufferRing((target_imgsz, target_imgsz, 3), size=self.crop_buffers) if self.render_crops else None
+        # Единственный черный кадр переиспользуется для всех кадров без цели (он только читается)
+        black_frame = np.zeros((target_imgsz, target_imgsz, 3), dtype=np.uint8) if self.render_crops else None
+
+        # last_known_center теперь хранит последнюю известную позицию объекта
+        # Это позволит сглаживать движение, если объект временно пропал
+        last_known_center: Optional[Tuple[int, int]] = None
+        last_known_bbox_size: Optional[Tuple[int, int]] = None
+
+        # Предсказатель движения нужен только при пропуске кадров детектором
+        motion_model = ConstantVelocityKalman() if detect_interval > 1 else None
+        frames_since_measurement = 0
+
+        # Состояние режима ROI
+        last_track_id: Optional[float] = None
+        roi_frames_since_full_frame = 0
+
+        profiler.start()
+        try:
+            for batch in iter_frame_batches(frames, self.batch_size):
+                # 1. Выполнение детекции и отслеживания (сразу для всех кадров микро-батча, на которых нужна детекция)
+                first_index = self.start_frame + self.frame_count  # Номер (с 0) первого кадра батча в видео
+                detect_flags = [(first_index + k) % detect_interval == 0 for k in range(len(batch))]
+                detect_batch = [frame for frame, flag in zip(batch, detect_flags) if flag]
+                self.detected_frames_count += len(detect_batch)
+                # В режиме ROI выбор между ROI и полным кадром зависит от предыдущего кадра, поэтому инференс — покадровый
+                batch_detections = None
+                if not self.roi_inference:
+                    # Время батча делится поровну между всеми кадрами батча (включая кадры без детекции)
+                    with profiler.stage('inference', frames=len(batch)):
+                        batch_detections = iter(self._detect_batch(first_index, detect_flags, detect_batch))
+
+                for frame, is_detection_frame in zip(batch, detect_flags):
+                    self.frame_count += 1
+                    frame_count = self.frame_count
+                    frame_index = self.start_frame + frame_count  # Номер кадра в видео (с 1)
+                    if frame_count % 100 == 0:
+                        progress = f"{frame_count}/{self.total_frames}" if self.total_frames else str(frame_count)
+                        print(f"--- Обработано кадров: {progress} ({profiler.rolling_fps:.1f} FPS) ---")
+
+                    selection_start = time.perf_counter()
+                    inference_seconds = 0.0
+
+                    predicted_center = motion_model.predict() if motion_model is not None else None
+                    frames_since_measurement += 1
+
+                    # 2. Выбор целевого сноубордиста (только на кадрах с детекцией)
+                    current_target_bbox = None
+                    detections = None
+                    if is_detection_frame:
+                        roi_found = False
+                        if self.roi_inference and last_known_center is not None and last_known_bbox_size is not None \
+                                and roi_frames_since_full_frame < self.roi_full_frame_interval:
+                            roi_center = predicted_center if predicted_center is not None else last_known_center
+                            inference_start = time.perf_counter()
+                            current_target_bbox = _detect_target_in_roi(
+                                self._roi_model, frame, roi_center, last_known_bbox_size, last_track_id,
+                                self.roi_size, self.roi_scale, self.roi_min_confidence,
+                                self.confidence_threshold, self.iou_threshold, self.target_class_id
+                            )
+                            inference_seconds += time.perf_counter() - inference_start
+                            roi_found = current_target_bbox is not None
+
+                        if roi_found:
+                            self.roi_frames_count += 1
+                            roi_frames_since_full_frame += 1
+                        else:
+                            # Полный кадр: обычный режим либо возврат из ROI при потере цели
+                            if batch_detections is not None:
+                                detections = next(batch_detections)
+                            else:
+                                inference_start = time.perf_counter()
+                                detections = self._detect_batch(frame_index - 1, [True], [frame])[0]
+                                inference_seconds += time.perf_counter() - inference_start
+                            current_target_bbox = _select_target(detections, self._selector, frame_count, self.target_class_id)
+                            roi_frames_since_full_frame = 0
+                            if current_target_bbox is not None:
+                                last_track_id = current_target_bbox[4]
+
+                    if self._recorder is not None:
+                        self._recorder.add(detections)
+
+                    if current_target_bbox is not None:
+                        x1_bb, y1_bb, x2_bb, y2_bb = current_target_bbox[:4]
+                        last_known_center = (int((x1_bb + x2_bb) / 2), int((y1_bb + y2_bb) / 2))
+                        last_known_bbox_size = (int(x2_bb - x1_bb), int(y2_bb - y1_bb))
+                        frames_since_measurement = 0
+                        if motion_model is not None:
+                            motion_model.update(last_known_center)
+                    elif not is_detection_frame and predicted_center is not None and frames_since_measurement < detect_interval:
+                        # Между детекциями переносим центр по модели постоянной скорости.
+                        # Если на последнем кадре с детекцией цель не нашлась, держим последнюю позицию.
+                        last_known_center = (int(round(predicted_center[0])), int(round(predicted_center[1])))
+
+                    if self.roi_inference:
+                        profiler.record('inference', inference_seconds)
+                    profiler.record('selection', time.perf_counter() - selection_start - inference_seconds)
+
+                    # Если объект не был найден в текущем кадре, используем последнюю известную позицию
+                    if last_known_center is None:
+                        # Если объект никогда не был найден, выдаем черный кадр
+                        logger.debug("Кадр %d: Сноубордист не найден ни разу. Запись черного кадра.", frame_count)
+                        profiler.record('crop', 0.0)
+                        yield FrameResult(frame_index, None, None, None, black_frame, is_detection_frame, target_imgsz)
+                        profiler.frame_done()
+                        continue # Переходим к следующему кадру
+
+                    with profiler.stage('crop'):
+                        # 3. Вычисление области обрезки для центрирования и обработка границ кадра
+                        cropped_frame = None
+                        if virtual_camera is not None:
+                            virtual_camera.update(last_known_center, last_known_bbox_size)
+                            if self.render_crops:
+                                cropped_frame, transform = virtual_camera.render(frame, output_buffers.next())
+                            else:
+                                transform = virtual_camera.transform()
+                        elif self.render_crops:
+                            cropped_frame, x1_crop, y1_crop, paste_x1, paste_y1 = _crop_around_center(frame, last_known_center, target_imgsz, frame_count, output_buffers.next())
+                            transform = (1.0, -x1_crop, -y1_crop)
+                        else:
+                            transform = (1.0, -int(last_known_center[0] - target_imgsz / 2), -int(last_known_center[1] - target_imgsz / 2))
+
+                    yield FrameResult(frame_index, current_target_bbox, last_known_center, transform, cropped_frame, is_detection_frame, target_imgsz)
+                    profiler.frame_done()
+
+            # Видео пройдено целиком: сохраняем детекции для повторных запусков
+            if self._recorder is not None:
+                cache_path = self._cache.save(self._cache_key, self._recorder.to_cached())
+                print(f"Детекции сохранены в кэш: {cache_path}")
+        finally:
+            self.close()
+
+
+def iter_tracked_frames(model_path: str, video_input_path: Union[str, int], **kwargs) -> Iterator[FrameResult]:
+    """
+    Генератор результатов отслеживания по кадрам (FrameResult). Параметры — как у TrackedFrames;
+    модель загружается и источник открывается при первом запросе кадра.
+    """
+    with TrackedFrames(model_path, video_input_path, **kwargs) as tracked:
+        yield from tracked
+
 
 def track_video_and_center_object(
     model_path: str,
-    video_input_path: str,
-    video_output_path: str,
+    video_input_path: Union[str, int],
+    video_output_path: Optional[str],
     target_class_id: int = 0, # 0 для класса 'snowboarder' в нашей модели
     target_imgsz: int = 640, # Размер квадратного кадра, который будем вырезать
     confidence_threshold: float = 0.25,
-    iou_threshold: float = 0.7
-) -> None:
+    iou_threshold: float = 0.7,
+    pipelined: bool = False, # Декодирование, инференс и запись в отдельных потоках
+    batch_size: int = 1, # Размер микро-батча кадров для одного вызова model.track
+    queue_size: int = 32, # Размер очередей между потоками в конвейерном режиме
+    target_selector: Union[str, TargetSelector] = 'largest_area', # Стратегия выбора цели
+    detect_interval: int = 1, # Запускать YOLO на каждом N-м кадре
+    roi_inference: bool = False, # Инференс на области вокруг последней позиции цели
+    roi_size: int = 640, # Минимальная сторона ROI (нативный размер входа модели)
+    roi_scale: float = 3.0, # Сторона ROI относительно наибольшей стороны bbox цели
+    roi_min_confidence: float = 0.5, # Ниже этой уверенности — возврат к полному кадру
+    roi_full_frame_interval: int = 15, # Принудительный полный кадр каждые N детекций в режиме ROI
+    virtual_camera: Optional[VirtualCamera] = None, # Сглаживающая виртуальная камера
+    model: Optional["YOLO"] = None, # Предзагруженная модель (повторное использование между видео)
+    roi_model: Optional["YOLO"] = None, # Предзагруженная модель для детекции по ROI
+    model_loader: Optional[Callable[[bool], Tuple["YOLO", Optional["YOLO"]]]] = None, # Загрузка модели при промахе кэша
+    profile_path: Optional[str] = None, # Сводка профилирования этапов (.json или .csv)
+    profile_trace_path: Optional[str] = None, # Покадровая трасса профилирования (.csv)
+    writer_backend: str = 'auto', # Запись видео: 'ffmpeg', 'opencv' или 'auto'
+    video_codec: Optional[str] = None, # Кодек ffmpeg (libx264) или FourCC OpenCV (mp4v)
+    video_preset: Optional[str] = 'ultrafast', # Пресет кодека ffmpeg
+    video_crf: Optional[int] = 23, # Качество кодирования ffmpeg (меньше — лучше и больше файл)
+    drop_stale_frames: bool = False, # Живой источник: обрабатывать только самый свежий кадр
+    realtime: bool = False, # Воспроизводить файл со скоростью исходного видео (имитация камеры)
+    input_frame_size: Optional[Tuple[int, int]] = None, # Размер кадра для сырых кадров из stdin
+    input_fps: Optional[float] = None, # Частота кадров источника, если он ее не сообщает
+    on_frame: Optional[Callable[[int, np.ndarray, Optional[Tuple]], None]] = None, # Получатель выходных кадров
+    detection_cache: Optional[Union[str, DetectionCache]] = None, # Директория кэша детекций
+    parallel_chunks: int = 1 # Число частей длинного видео, обрабатываемых параллельными процессами
+) -> bool:
     """
     Отслеживает целевой объект в видео и создает новое видео,
     где объект центрирован в кадре путем обрезки.
 
+    Кадры обрабатываются итератором TrackedFrames (описание режимов и параметров обработки — там),
+    а эта функция рисует bbox цели на обрезанных кадрах и записывает их. В конвейерном режиме
+    (pipelined=True) и декодирование, и запись выполняются фоновыми потоками, что позволяет
+    перекрыть декодирование, инференс и кодирование по времени.
+
+    Выходное видео по умолчанию кодируется отдельным процессом ffmpeg (кадры передаются через канал),
+    что быстрее и дает файлы меньше, чем cv2.VideoWriter с mp4v. Если ffmpeg нет в PATH,
+    используется cv2.VideoWriter.
+
+    Выходные кадры можно получать через on_frame и/или отправлять в сетевой поток (URL в video_output_path).
+    Остановка по Ctrl+C корректно завершает запись.
+
     Args:
         model_path (str): Путь к обученной модели YOLO.
-        video_input_path (str): Путь к исходному видеофайлу.
-        video_output_path (str): Путь для сохранения выходного видеофайла.
-        target_class_id (int): ID класса отслеживаемого объекта (по умолчанию 0 для 'snowboarder').
-        target_imgsz (int): Желаемый размер (сторона квадрата) выходного видеокадра.
-        confidence_threshold (float): Порог уверенности для детекции.
-        iou_threshold (float): Порог IoU для не-максимального подавления (NMS).
+        video_input_path (str | int): Источник кадров (файл, URL потока, индекс камеры или '-', см. TrackedFrames).
+        video_output_path (str, optional): Путь для сохранения выходного видеофайла или URL потока
+            (udp://, rtsp://, ...; только ffmpeg). None — кадры не сохраняются (например, при on_frame).
+        target_class_id ... input_fps: Параметры обработки кадров, см. TrackedFrames
+            (queue_size в конвейерном режиме ограничивает также очередь записи).
+        profile_path (str, optional): Если задан, замеряется время этапов decode/inference/selection/crop/encode
+            и сводка (FPS, p50/p95/p99 по этапам, пиковая память) сохраняется в JSON или CSV.
+        profile_trace_path (str, optional): Если задан, сохраняется покадровая трасса длительностей этапов в CSV.
+        writer_backend (str): Бэкенд записи: 'ffmpeg', 'opencv' или 'auto' (ffmpeg при наличии, иначе OpenCV).
+        video_codec (str, optional): Кодек выходного видео: кодер ffmpeg (по умолчанию libx264)
+            или FourCC OpenCV (по умолчанию mp4v).
+        video_preset (str, optional): Пресет кодера ffmpeg (ultrafast, veryfast, medium, ...).
+        video_crf (int, optional): Constant Rate Factor кодера ffmpeg.
+        on_frame (Callable, optional): Функция on_frame(номер_кадра, выходной_кадр, цель_или_None),
+            вызываемая для каждого выходного кадра. Буфер кадра переиспользуется трекером,
+            поэтому для хранения кадр нужно скопировать.
+        detection_cache (str | DetectionCache, optional): Директория кэша детекций (см. TrackedFrames):
+            повторная обработка того же видео той же моделью с другими параметрами обрезки
+            не запускает YOLO.
+        parallel_chunks (int): Если больше 1, видеофайл делится на столько перекрывающихся частей,
+            которые обрабатываются отдельными процессами, а результат сшивается и склеивается без перекодирования
+            (см. scripts.chunked_tracker.track_video_in_chunks). Только для видеофайлов, без on_frame,
+            профилирования и режимов живого источника; model, roi_model и model_loader не используются.
+
+    Returns:
+        bool: True, если видео успешно обработано; False при ошибке загрузки модели или открытия файлов.
     """
+    if parallel_chunks > 1:
+        unsupported = {'on_frame': on_frame, 'profile_path': profile_path, 'profile_trace_path': profile_trace_path,
+                       'drop_stale_frames': drop_stale_frames, 'realtime': realtime, 'input_frame_size': input_frame_size}
+        used = [name for name, value in unsupported.items() if value]
+        if used:
+            raise ValueError(f"parallel_chunks несовместим с параметрами: {', '.join(used)}")
+        if video_output_path is None or '://' in video_output_path or not os.path.isfile(str(video_input_path)):
+            raise ValueError("parallel_chunks поддерживается только для видеофайла на входе и файла на выходе")
+        from scripts.chunked_tracker import track_video_in_chunks  # Модуль сам импортирует tracker
 
-    # 1. Загрузка модели
+        return track_video_in_chunks(
+            model_path, video_input_path, video_output_path,
+            chunks=parallel_chunks,
+            target_imgsz=target_imgsz,
+            queue_size=queue_size,
+            writer_backend=writer_backend,
+            video_codec=video_codec,
+            video_preset=video_preset,
+            video_crf=video_crf,
+            target_class_id=target_class_id,
+            confidence_threshold=confidence_threshold,
+            iou_threshold=iou_threshold,
+            pipelined=pipelined,
+            batch_size=batch_size,
+            target_selector=target_selector,
+            detect_interval=detect_interval,
+            roi_inference=roi_inference,
+            roi_size=roi_size,
+            roi_scale=roi_scale,
+            roi_min_confidence=roi_min_confidence,
+            roi_full_frame_interval=roi_full_frame_interval,
+            virtual_camera=virtual_camera,
+            input_fps=input_fps,
+            detection_cache=detection_cache,
+        )
+
+    profiler = StageProfiler(enabled=bool(profile_path or profile_trace_path))
+
+    # При асинхронной записи буфер не должен перезаписываться, пока стоит в очереди,
+    # поэтому кольцо буферов больше очереди записи
     try:
-        model = YOLO(model_path)
-        print(f"Модель успешно загружена из: {model_path}")
-    except Exception as e:
-        print(f"Ошибка загрузки модели: {e}")
-        return
+        tracked = TrackedFrames(
+            model_path, video_input_path,
+            target_class_id=target_class_id,
+            target_imgsz=target_imgsz,
+            confidence_threshold=confidence_threshold,
+            iou_threshold=iou_threshold,
+            pipelined=pipelined,
+            batch_size=batch_size,
+            queue_size=queue_size,
+            target_selector=target_selector,
+            detect_interval=detect_interval,
+            roi_inference=roi_inference,
+            roi_size=roi_size,
+            roi_scale=roi_scale,
+            roi_min_confidence=roi_min_confidence,
+            roi_full_frame_interval=roi_full_frame_interval,
+            virtual_camera=virtual_camera,
+            model=model,
+            roi_model=roi_model,
+            model_loader=model_loader,
+            drop_stale_frames=drop_stale_frames,
+            realtime=realtime,
+            input_frame_size=input_frame_size,
+            input_fps=input_fps,
+            render_crops=True,
+            crop_buffers=queue_size + 2 if pipelined else 1,
+            profiler=profiler,
+            detection_cache=detection_cache,
+        )
+    except RuntimeError as e:
+        print(e)
+        return False
 
-    # 2. Проверка и создание выходной директории
-    output_dir = os.path.dirname(video_output_path)
-    if not os.path.exists(output_dir):
+    # Проверка и создание выходной директории (для файла, а не сетевого потока)
+    is_output_file = video_output_path is not None and '://' not in video_output_path
+    output_dir = os.path.dirname(video_output_path) if is_output_file else ''
+    if output_dir and not os.path.exists(output_dir):
         os.makedirs(output_dir)
         print(f"Создана выходная директория: {output_dir}")
 
-    # 3. Чтение видео
-    cap = cv2.VideoCapture(video_input_path)
-    if not cap.isOpened():
-        print(f"Ошибка: Не удалось открыть видеофайл {video_input_path}")
-        return
+    # Подготовка для записи выходного видео
+    try:
+        if video_output_path is None:
+            out = NullVideoWriter()
+        else:
+            out = create_video_writer(video_output_path, tracked.fps, (target_imgsz, target_imgsz), backend=writer_backend,
+                                      codec=video_codec, preset=video_preset, crf=video_crf)
+    except Exception as e:
+        print(f"Критическая ошибка: Не удалось создать запись видео для {video_output_path}. Проверьте установку кодеков и права доступа. Ошибка: {e}")
+        tracked.close()
+        return False
 
-    # Получаем свойства видео
-    frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    if video_output_path is not None:
+        print(f"Выходное видео будет сохранено в: {video_output_path} с разрешением {target_imgsz}x{target_imgsz}")
 
-    print(f"Исходное видео: {video_input_path}")
-    print(f"Разрешение: {frame_width}x{frame_height}, FPS: {fps}, Всего кадров: {total_frames}")
+    # Приемник обрезанных кадров: в конвейерном режиме — фоновый поток
+    if pipelined:
+        writer = FrameWriterThread(out, queue_size=queue_size, profiler=profiler).start()
+        print(f"Конвейерный режим: батч {batch_size}, размер очередей {queue_size}")
+    else:
+        writer = FrameWriterThread.synchronous(out, profiler)
 
-    # 4. Подготовка для записи выходного видео
     try:
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(video_output_path, fourcc, fps, (target_imgsz, target_imgsz))
-    except Exception as e:
-        print(f"Критическая ошибка: Не удалось создать VideoWriter для {video_output_path} с кодеком mp4v. Проверьте установку кодеков и права доступа. Ошибка: {e}")
-        cap.release()
-        return
-
-    if not out.isOpened():
-        print("Критическая ошибка: Не удалось создать VideoWriter с кодеком mp4v. Попробуйте другой кодек или проверьте установку.")
-        cap.release()
-        return
-    
-    print(f"Выходное видео будет сохранено в: {video_output_path} с разрешением {target_imgsz}x{target_imgsz}")
-
-    # --- Основной цикл обработки кадров ---
-    frame_count = 0
-    
-    # last_known_center теперь хранит последнюю известную позицию объекта
-    # Это позволит сглаживать движение, если объект временно пропал
-    last_known_center: Optional[Tuple[int, int]] = None
-    last_known_bbox_size: Optional[Tuple[int, int]] = None
-
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            print(f"Конец видео или ошибка чтения на кадре {frame_count}.")
-            break # Конец видео
-
-        frame_count += 1
-        if frame_count % 100 == 0:
-            print(f"--- Обработано кадров: {frame_count}/{total_frames} ---")
-            
-        # 1. Выполнение детекции и отслеживания
-        results = model.track(frame, persist=True, conf=confidence_threshold, iou=iou_threshold, classes=[target_class_id], verbose=False, tracker='bytetrack.yaml') 
-
-        # 2. Выбор целевого сноубордиста
-        current_target_bbox: Optional[Tuple] = None
-        current_target_center: Optional[Tuple[int, int]] = None
-        
-        # Проверка, есть ли какие-либо результаты детекции/отслеживания и есть ли в них Boxes с ID
-        if results and len(results) > 0 and results[0].boxes is not None and results[0].boxes.id is not None and len(results[0].boxes.id) > 0:
-            boxes = results[0].boxes
-            
-            # Отладочный вывод: сколько объектов найдено
-            print(f"Кадр {frame_count}: Найдено {len(boxes)} объектов класса {target_class_id}.")
-
-            max_area = 0
-            
-            # Итерируемся по отдельным BoxDetection объектов
-            for i in range(len(boxes)):
-                x1, y1, x2, y2 = boxes.xyxy[i].cpu().numpy().astype(int)
-                conf = boxes.conf[i].cpu().item()
-                cls = boxes.cls[i].cpu().item()
-                track_id = boxes.id[i].cpu().item() if boxes.id is not None else -1
-
-                width = x2 - x1
-                height = y2 - y1
-                area = width * height
-
-                if area > max_area: # Выбираем объект с наибольшей площадью bbox
-                    max_area = area
-                    current_target_bbox = (x1, y1, x2, y2, track_id, conf, cls) # Формируем кортеж
-                    current_target_center = (int((x1 + x2) / 2), int((y1 + y2) / 2))
-            
-            if current_target_center and current_target_bbox:
-                 last_known_center = current_target_center
-                 x1_bb, y1_bb, x2_bb, y2_bb = current_target_bbox[:4]
-                 last_known_bbox_size = (int(x2_bb - x1_bb), int(y2_bb - y1_bb))
-
-        # Если объект не был найден в текущем кадре, используем последнюю известную позицию
-        if last_known_center is None:
-            # Если объект никогда не был найден, записываем черный кадр
-            print(f"Кадр {frame_count}: Сноубордист не найден ни разу. Запись черного кадра.")
-            out.write(np.zeros((target_imgsz, target_imgsz, 3), dtype=np.uint8))
-            continue # Переходим к следующему кадру
-
-        # 4. Вычисление области обрезки для центрирования
-        # Здесь last_known_center гарантированно не None
-        cx, cy = last_known_center 
-        
-        # Вычисляем углы квадратного кадра
-        x1_crop = int(cx - target_imgsz / 2)
-        y1_crop = int(cy - target_imgsz / 2)
-        x2_crop = int(cx + target_imgsz / 2)
-        y2_crop = int(cy + target_imgsz / 2)
-
-        # 5. Обработка границ кадра (padding)
-        cropped_frame = np.zeros((target_imgsz, target_imgsz, 3), dtype=np.uint8)
-        
-        paste_x1 = max(0, -x1_crop)
-        paste_y1 = max(0, -y1_crop)
-        
-        src_x1 = max(0, x1_crop)
-        src_y1 = max(0, y1_crop)
-        src_x2 = min(frame_width, x2_crop)
-        src_y2 = min(frame_height, y2_crop)
-
-        actual_crop_width = src_x2 - src_x1
-        actual_crop_height = src_y2 - src_y1
-
-        if actual_crop_width > 0 and actual_crop_height > 0:
-            cropped_section = frame[src_y1:src_y2, src_x1:src_x2]
-            
-            if cropped_section.shape[0] == actual_crop_height and cropped_section.shape[1] == actual_crop_width:
-                cropped_frame[paste_y1 : paste_y1 + actual_crop_height, 
-                              paste_x1 : paste_x1 + actual_crop_width] = cropped_section
-            else:
-                print(f"Кадр {frame_count} ОШИБКА РАЗМЕРОВ: cropped_section {cropped_section.shape} vs expected {actual_crop_height}x{actual_crop_width}. Запись черного кадра.")
-                cropped_frame = np.zeros((target_imgsz, target_imgsz, 3), dtype=np.uint8)
-        else:
-            print(f"Кадр {frame_count}: Нет области для обрезки или область нулевая. Запись черного кадра.")
-            cropped_frame = np.zeros((target_imgsz, target_imgsz, 3), dtype=np.uint8)
-        
-        # 6. Визуализация (нарисовать bbox на обрезанном кадре)
-        if current_target_bbox is not None: # Только если в текущем кадре был найден сноубордист
-            # Распаковка здесь безопасна, так как мы только что проверили current_target_bbox на None
-            x1, y1, x2, y2, track_id, conf, cls = current_target_bbox
-            bbox_x1_rel = int(x1 - x1_crop + paste_x1)
-            bbox_y1_rel = int(y1 - y1_crop + paste_y1)
-            bbox_x2_rel = int(x2 - x1_crop + paste_x1)
-            bbox_y2_rel = int(y2 - y1_crop + paste_y1)
-            
-            bbox_x1_rel = max(0, bbox_x1_rel)
-            bbox_y1_rel = max(0, bbox_y1_rel)
-            bbox_x2_rel = min(target_imgsz - 1, bbox_x2_rel)
-            bbox_y2_rel = min(target_imgsz - 1, bbox_y2_rel)
-
-            if bbox_x2_rel > bbox_x1_rel and bbox_y2_rel > bbox_y1_rel:
-                cv2.rectangle(cropped_frame, (bbox_x1_rel, bbox_y1_rel), (bbox_x2_rel, bbox_y2_rel), (0, 255, 0), 2)
-                text = f"ID: {int(track_id)}" if track_id is not None else "No ID"
-                text_pos_y = max(10, bbox_y1_rel - 10)
-                cv2.putText(cropped_frame, text, (bbox_x1_rel, text_pos_y), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
-            
-        out.write(cropped_frame)
-
-    # 7. Освобождение ресурсов
-    cap.release()
-    out.release()
-    cv2.destroyAllWindows()
-    print(f"Обработка видео завершена. Результат сохранен в {video_output_path}")
+        for result in tracked:
+            # 4. Визуализация (нарисовать bbox на обрезанном кадре)
+            if result.target is not None: # Только если в текущем кадре был найден сноубордист
+                _draw_target_bbox(result.crop, result.target, result.transform, target_imgsz)
+            writer.write(result.crop)
+            if on_frame is not None:
+                on_frame(result.index, result.crop, result.target)
+
+        print(f"Конец видео или ошибка чтения на кадре {tracked.frame_count}.")
+    except KeyboardInterrupt:
+        # Остановка живого источника: дописываем уже обработанные кадры и сохраняем отчеты
+        print(f"Обработка остановлена пользователем на кадре {tracked.frame_count}.")
+    finally:
+        # 5. Освобождение ресурсов
+        tracked.close()
+        try:
+            writer.close()
+        finally:
+            out.release()  # Для ffmpeg дожидается окончания кодирования
+
+    if detect_interval > 1 and not tracked.from_cache:
+        print(f"Детектор запущен на {tracked.detected_frames_count} из {tracked.frame_count} кадров (интервал {detect_interval}).")
+    if roi_inference and not tracked.from_cache:
+        print(f"Детекция по ROI: {tracked.roi_frames_count} из {tracked.detected_frames_count} кадров с детекцией, остальные — полный кадр.")
+    if tracked.drop_stale_frames:
+        print(f"Отброшено устаревших кадров источника: {tracked.dropped_frames}.")
+
+    if profiler.enabled:
+        profiler.print_summary()
+        if profile_path:
+            profiler.save_summary(profile_path)
+            print(f"Сводка профилирования сохранена в: {profile_path}")
+        if profile_trace_path:
+            profiler.save_trace(profile_trace_path)
+            print(f"Покадровая трасса сохранена в: {profile_trace_path}")
+    if video_output_path is not None:
+        print(f"Обработка видео завершена. Результат сохранен в {video_output_path}")
+    else:
+        print("Обработка видео завершена.")
+    return True
+
+
+def report_detect_interval_error(
+    model_path: str,
+    video_input_path: str,
+    detect_intervals: Sequence[int] = (2, 3, 5, 10),
+    report_path: Optional[str] = None,
+    target_class_id: int = 0,
+    confidence_threshold: float = 0.25,
+    iou_threshold: float = 0.7,
+    target_selector: Union[str, TargetSelector] = 'largest_area',
+    batch_size: int = 1
+) -> Optional[Dict[str, dict]]:
+    """
+    Оценивает, какую ошибку центра обрезки добавляет detect_interval по сравнению с детекцией каждого кадра.
+
+    Видео один раз обрабатывается детектором на полной частоте, после чего для каждого интервала
+    работа трекера воспроизводится по сохраненным центрам цели (без повторного запуска YOLO).
+
+    Args:
+        model_path (str): Путь к обученной модели YOLO.
+        video_input_path (str): Путь к исходному видеофайлу.
+        detect_intervals (Sequence[int]): Проверяемые интервалы запуска детектора.
+        report_path (str, optional): Путь для сохранения отчета в формате JSON.
+        target_class_id (int): ID класса отслеживаемого объекта.
+        confidence_threshold (float): Порог уверенности для детекции.
+        iou_threshold (float): Порог IoU для NMS.
+        target_selector (str | TargetSelector): Стратегия выбора цели (см. track_video_and_center_object).
+        batch_size (int): Размер микро-батча для прохода детектора.
+
+    Returns:
+        Optional[Dict[str, dict]]: Отчет {интервал: статистика ошибки в пикселях} или None при ошибке.
+    """
+    try:
+        tracked = TrackedFrames(
+            model_path, video_input_path,
+            target_class_id=target_class_id,
+            confidence_threshold=confidence_threshold,
+            iou_threshold=iou_threshold,
+            target_selector=target_selector,
+            batch_size=batch_size,
+            render_crops=False,
+        )
+    except RuntimeError as e:
+        print(e)
+        return None
+
+    # Проход детектора на полной частоте: центр цели на каждом кадре (NaN — цель не найдена)
+    centers = [result.center if result.found else (np.nan, np.nan) for result in tracked]
+
+    centers = np.array(centers, dtype=np.float64).reshape(-1, 2)
+    reference = simulate_detect_interval_centers(centers, 1)
+
+    report = {}
+    for interval in detect_intervals:
+        stats = center_error_stats(reference, simulate_detect_interval_centers(centers, interval))
+        report[str(interval)] = stats
+        print(f"detect_interval={interval}: средняя ошибка центра {stats['mean_px']:.1f} px, p95 {stats['p95_px']:.1f} px, максимум {stats['max_px']:.1f} px")
+
+    if report_path:
+        report_dir = os.path.dirname(report_path)
+        if report_dir:
+            os.makedirs(report_dir, exist_ok=True)
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump({"video": video_input_path, "frames": len(centers), "intervals": report}, f, indent=2, ensure_ascii=False)
+        print(f"Отчет об ошибке центра сохранен в: {report_path}")
+
+    return report
+
+
+def add_tracking_arguments(parser: argparse.ArgumentParser) -> None:
+    """Добавляет в парсер аргументы командной строки, соответствующие параметрам track_video_and_center_object."""
+    parser.add_argument('--model', required=True, help="Путь к обученной модели YOLO (.pt)")
+    parser.add_argument('--class-id', type=int, default=0, help="ID отслеживаемого класса")
+    parser.add_argument('--imgsz', type=int, default=640, help="Сторона квадратного выходного кадра")
+    parser.add_argument('--conf', type=float, default=0.25, help="Порог уверенности детекции")
+    parser.add_argument('--iou', type=float, default=0.7, help="Порог IoU для NMS")
+    parser.add_argument('--pipelined', action='store_true', help="Декодирование и запись в фоновых потоках")
+    parser.add_argument('--batch-size', type=int, default=1, help="Размер микро-батча кадров для инференса")
+    parser.add_argument('--queue-size', type=int, default=32, help="Размер очередей в конвейерном режиме")
+    parser.add_argument('--target-selector', default='largest_area', help="Стратегия выбора цели (largest_area, highest_confidence, sticky_id, target_lock)")
+    parser.add_argument('--detect-interval', type=int, default=1, help="Запускать детектор на каждом N-м кадре")
+    parser.add_argument('--roi', action='store_true', help="Детекция по области вокруг последней позиции цели")
+    parser.add_argument('--smooth-camera', action='store_true', help="Сглаживающая виртуальная камера")
+    parser.add_argument('--zoom-to-fit', action='store_true', help="Подбирать масштаб виртуальной камеры под размер цели")
+    parser.add_argument('--writer', default='auto', choices=WRITER_BACKENDS, help="Бэкенд записи видео")
+    parser.add_argument('--codec', default=None, help="Кодек выходного видео (кодер ffmpeg или FourCC OpenCV)")
+    parser.add_argument('--preset', default='ultrafast', help="Пресет кодера ffmpeg")
+    parser.add_argument('--crf', type=int, default=23, help="CRF кодера ffmpeg")
+    parser.add_argument('--cache-dir', default=None, help="Директория кэша детекций (повторные запуски без инференса)")
+    parser.add_argument('--profile', default=None, help="Сохранить сводку профилирования этапов (.json или .csv)")
+    parser.add_argument('--profile-trace', default=None, help="Сохранить покадровую трассу профилирования (.csv)")
+    parser.add_argument('--log-level', default='WARNING', help="Уровень логирования (DEBUG включает покадровые сообщения)")
+
+
+def tracking_kwargs_from_args(args: argparse.Namespace) -> dict:
+    """Преобразует разобранные аргументы командной строки в параметры track_video_and_center_object (кроме путей)."""
+    virtual_camera = None
+    if args.smooth_camera or args.zoom_to_fit:
+        virtual_camera = VirtualCamera(output_size=args.imgsz, zoom_to_fit=args.zoom_to_fit)
+    return {
+        'target_class_id': args.class_id,
+        'target_imgsz': args.imgsz,
+        'confidence_threshold': args.conf,
+        'iou_threshold': args.iou,
+        'pipelined': args.pipelined,
+        'batch_size': args.batch_size,
+        'queue_size': args.queue_size,
+        'target_selector': args.target_selector,
+        'detect_interval': args.detect_interval,
+        'roi_inference': args.roi,
+        'virtual_camera': virtual_camera,
+        'profile_path': args.profile,
+        'profile_trace_path': args.profile_trace,
+        'writer_backend': args.writer,
+        'video_codec': args.codec,
+        'video_preset': args.preset,
+        'video_crf': args.crf,
+        'detection_cache': args.cache_dir,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Точка входа командной строки для обработки одного видео.
+
+    Пример (из корня проекта):
+        python -m scripts.tracker --model best.pt --input resources/snowboard_day.mp4 --output runs/track/out.mp4
+        python -m scripts.tracker --model best.pt --input rtsp://camera/stream --drop-stale --output udp://127.0.0.1:5000
+    """
+    parser = argparse.ArgumentParser(description="Отслеживание и центрирование сноубордиста в видео.")
+    parser.add_argument('--input', required=True, help="Исходное видео, URL потока (rtsp://...), индекс камеры или '-' (сырые кадры BGR24 из stdin)")
+    parser.add_argument('--output', default=None, help="Выходное видео или URL потока (udp://, rtsp://; только ffmpeg); не задан — без записи")
+    parser.add_argument('--input-size', default=None, help="Размер кадров из stdin, например 1280x720")
+    parser.add_argument('--input-fps', type=float, default=None, help="FPS источника, если он его не сообщает")
+    parser.add_argument('--drop-stale', action='store_true', help="Живой источник: отбрасывать кадры, которые не успевают обработаться")
+    parser.add_argument('--realtime', action='store_true', help="Воспроизводить файл со скоростью видео (имитация живого источника)")
+    parser.add_argument('--parallel-chunks', type=int, default=1, help="Обработать видеофайл параллельно, разделив на N перекрывающихся частей")
+    add_tracking_arguments(parser)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), format='%(levelname)s %(name)s: %(message)s')
+
+    input_frame_size = tuple(int(v) for v in args.input_size.lower().split('x')) if args.input_size else None
+    ok = track_video_and_center_object(
+        args.model, args.input, args.output,
+        drop_stale_frames=args.drop_stale,
+        realtime=args.realtime,
+        input_frame_size=input_frame_size,
+        input_fps=args.input_fps,
+        parallel_chunks=args.parallel_chunks,
+        **tracking_kwargs_from_args(args)
+    )
+    return 0 if ok else 1
+
 
+if __name__ == '__main__':
+    raise SystemExit(main())
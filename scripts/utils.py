@@ -1,9 +1,22 @@
 import os
 import re
 import yaml
+from typing import List, Optional
 
+from scripts.dataset_index import DatasetIndex
+from scripts.label_store import LabelStore
+from scripts.label_validation import validate_annotations
 
-def count_and_report_images(directory: str, description: str = "файлов", extensions=('.jpg', '.jpeg', '.png')):
+
+def _list_files(directory: str, extensions) -> Optional[List[str]]:
+    """Имена файлов одной директории (без обхода поддиректорий) с фильтром по расширениям; None, если директории нет."""
+    if not os.path.isdir(directory):
+        return None
+    extensions = tuple(ext.lower() for ext in extensions)
+    return sorted(name for name in os.listdir(directory) if name.lower().endswith(extensions))
+
+
+def count_and_report_images(directory: str, description: str = "файлов", extensions=('.jpg', '.jpeg', '.png'), index: Optional[DatasetIndex] = None):
     """
     Подсчитывает количество изображений в указанной директории и выводит отчет.
 
@@ -11,17 +24,21 @@ def count_and_report_images(directory: str, description: str = "файлов", e
         directory (str): Путь к директории.
         description (str): Описание подсчитываемых файлов (например, "извлеченных кадров").
         extensions (tuple): Кортеж расширений файлов, которые нужно учитывать.
+        index (DatasetIndex, optional): Готовый индекс датасета; если не задан, читается только сама директория.
 
     Returns:
         tuple: Кортеж, содержащий (список_файлов, количество_файлов).
                Возвращает ([], 0) если директория не существует или пуста.
     """
-    if not os.path.exists(directory):
+    # Filter files based on extensions, case-insensitively
+    if index is not None and index.exists(directory):
+        files = index.files(directory, extensions)
+    else:
+        files = _list_files(directory, extensions)
+    if files is None:
         print(f"Ошибка: Директория не найдена: '{directory}'.")
         return [], 0
     
-    # Filter files based on extensions, case-insensitively
-    files = [f for f in os.listdir(directory) if f.lower().endswith(extensions)]
     count = len(files)
 
     print(f"Общее количество {description} в '{directory}': {count}")
@@ -33,7 +50,9 @@ def verify_dataset_split(
     labels_dir: str,
     data_split_name: str, # Например, "Train", "Validation", "Test"
     image_extensions=('.jpg', '.jpeg', '.png'),
-    label_extension='.txt'
+    label_extension='.txt',
+    index: Optional[DatasetIndex] = None,
+    label_store: Optional[LabelStore] = None
 ) -> bool:
     """
     Проверяет согласованность количества изображений и файлов аннотаций
@@ -45,22 +64,45 @@ def verify_dataset_split(
         data_split_name (str): Название подвыборки (например, "Обучающая", "Валидационная", "Тестовая").
         image_extensions (tuple): Кортеж расширений изображений для подсчета.
         label_extension (str): Расширение файла аннотации.
+        index (DatasetIndex, optional): Готовый индекс датасета; если не задан, читаются только сами директории.
+        label_store (LabelStore, optional): Хранилище аннотаций; если задано, аннотациями выборки считаются
+            кадры хранилища, соответствующие изображениям, а labels_dir не сканируется.
 
     Returns:
         bool: True, если количество изображений и аннотаций совпадает, False в противном случае.
     """
-    
     # Подсчитываем изображения
-    image_files = [f for f in os.listdir(images_dir) if f.lower().endswith(image_extensions)] if os.path.exists(images_dir) else []
+    if index is not None:
+        image_files = index.files(images_dir, image_extensions)
+    else:
+        image_files = _list_files(images_dir, image_extensions) or []
     images_count = len(image_files)
 
     # Подсчитываем файлы аннотаций
-    label_files = [f for f in os.listdir(labels_dir) if f.lower().endswith((label_extension,))] if os.path.exists(labels_dir) else []
-    labels_count = len(label_files)
+    if label_store is not None:
+        images_without_labels = [name for name in image_files if name not in label_store]
+        labels_without_images = []
+        labels_count = images_count - len(images_without_labels)
+    elif index is not None:
+        labels_count = len(index.files(labels_dir, (label_extension,)))
+        images_without_labels, labels_without_images = index.orphans(images_dir, labels_dir)
+    else:
+        label_files = _list_files(labels_dir, (label_extension,)) or []
+        labels_count = len(label_files)
+        image_stems = {os.path.splitext(name)[0]: name for name in image_files}
+        # classes.txt в директории аннотаций — список классов, а не аннотация кадра
+        label_stems = {os.path.splitext(name)[0] for name in label_files} - {'classes'}
+        images_without_labels = sorted(image_stems[stem] for stem in image_stems.keys() - label_stems)
+        labels_without_images = sorted(stem + label_extension for stem in label_stems - image_stems.keys())
     
     print(f"{data_split_name} выборка (images): {images_count} изображений")
     print(f"{data_split_name} выборка (labels): {labels_count} аннотаций")
 
+    if images_without_labels:
+        print(f"Изображения без аннотаций ({len(images_without_labels)}): {', '.join(images_without_labels[:10])}")
+    if labels_without_images:
+        print(f"Аннотации без изображений ({len(labels_without_images)}): {', '.join(labels_without_images[:10])}")
+
     if images_count == labels_count:
         print(f"\nКоличество изображений и аннотаций в выборке '{data_split_name}' совпадает. Разделение выполнено корректно.")
         return True
@@ -123,16 +165,18 @@ def get_next_run_name(base_name: str, runs_relative_path: str = 'runs/detect') -
     return f"{base_name}_v{next_version}"
 
 
-def check_yolo_dataset_paths(yaml_path: str) -> bool:
+def check_yolo_dataset_paths(yaml_path: str, validate_labels: bool = False) -> bool:
     """
     Читает файл dataset.yaml, проверяет доступность всех указанных в нем путей
     для изображений и аннотаций, и выводит отчет.
 
     Args:
         yaml_path (str): Путь к файлу dataset.yaml.
+        validate_labels (bool): Дополнительно проверить содержимое аннотаций выборок
+            (координаты, площадь, ID классов из names, дубликаты; см. scripts.label_validation).
 
     Returns:
-        bool: True, если все пути доступны; False в противном случае.
+        bool: True, если все пути доступны (и аннотации корректны); False в противном случае.
     """
     all_paths_ok = True
     print(f"Содержимое файла конфигурации '{yaml_path}':")
@@ -157,9 +201,10 @@ def check_yolo_dataset_paths(yaml_path: str) -> bool:
             relative_path = yaml_content.get(key, '')
             full_path = os.path.join(abs_base_path, relative_path)
             
-            status = 'Доступен' if os.path.exists(full_path) else 'ОШИБКА: Недоступен!'
+            exists = os.path.exists(full_path)  # В dataset.yaml это может быть и файл со списком изображений
+            status = 'Доступен' if exists else 'ОШИБКА: Недоступен!'
             print(f"{name.capitalize()} images: {full_path} - {status}")
-            if not os.path.exists(full_path):
+            if not exists:
                 all_paths_ok = False
         
         # Проверка путей аннотаций (исправленная логика)
@@ -171,10 +216,18 @@ def check_yolo_dataset_paths(yaml_path: str) -> bool:
         for key, name in label_splits.items():
             full_path = os.path.join(labels_base_path, name) # Пути к labels всегда 'train', 'val', 'test'
             
-            status = 'Доступен' if os.path.exists(full_path) else 'ОШИБКА: Недоступен!'
+            exists = os.path.isdir(full_path)
+            status = 'Доступен' if exists else 'ОШИБКА: Недоступен!'
             print(f"{name.capitalize()} labels: {full_path} - {status}")
-            if not os.path.exists(full_path):
+            if not exists:
                 all_paths_ok = False
+            elif validate_labels:
+                names = yaml_content.get('names')
+                class_names = [names[i] for i in sorted(names)] if isinstance(names, dict) else names
+                report = validate_annotations(full_path, class_names=class_names)
+                report.print_report()
+                if not report.ok:
+                    all_paths_ok = False
         
     except FileNotFoundError:
         print(f"Ошибка: Файл '{yaml_path}' не найден. Убедитесь, что он существует по указанному пути.")
@@ -0,0 +1,513 @@
+import queue
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import BinaryIO, Iterator, List, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+
+# Маркер конца потока в очередях между потоками
+_END_OF_STREAM = object()
+
+# Бэкенды записи выходного видео (см. create_video_writer)
+WRITER_BACKENDS = ('auto', 'ffmpeg', 'opencv')
+
+# Источник «стандартный ввод» (сырые кадры BGR24, см. RawVideoPipeCapture)
+STDIN_SOURCES = ('-', 'pipe:0')
+
+# Формат контейнера ffmpeg для сетевых выходных потоков по схеме URL
+_STREAM_FORMATS = {'rtsp': 'rtsp', 'rtmp': 'flv', 'udp': 'mpegts', 'tcp': 'mpegts', 'srt': 'mpegts'}
+
+
+class FrameReaderThread:
+    """
+    Фоновый поток декодирования: читает кадры из cv2.VideoCapture
+    и складывает их в ограниченную очередь.
+
+    Ограничение размера очереди не дает декодеру уйти далеко вперед
+    от инференса и удерживает потребление памяти.
+    Объект является итератором по кадрам в исходном порядке.
+    """
+
+    def __init__(self, cap: cv2.VideoCapture, queue_size: int = 32, profiler=None):
+        self._cap = cap
+        self._profiler = profiler
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, queue_size))
+        self._stop_event = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, name="frame-reader", daemon=True)
+
+    def start(self) -> "FrameReaderThread":
+        self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        try:
+            while not self._stop_event.is_set():
+                start = time.perf_counter()
+                ret, frame = self._cap.read()
+                if not ret:
+                    break
+                if self._profiler is not None:
+                    self._profiler.record('decode', time.perf_counter() - start)
+                self._put(frame)
+        except BaseException as e:  # Ошибку пробрасываем в основной поток
+            self._error = e
+        finally:
+            self._put(_END_OF_STREAM)
+
+    def _put(self, item) -> None:
+        # Пытаемся положить элемент, периодически проверяя флаг остановки,
+        # чтобы поток не завис навсегда на заполненной очереди
+        while True:
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                if self._stop_event.is_set():
+                    return
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        while True:
+            item = self._queue.get()
+            if item is _END_OF_STREAM:
+                break
+            yield item
+        if self._error is not None:
+            raise self._error
+
+    def stop(self) -> None:
+        """Останавливает поток чтения (например, при досрочном выходе из цикла)."""
+        self._stop_event.set()
+        # Освобождаем место в очереди, чтобы поток мог увидеть флаг остановки
+        try:
+            while True:
+                self._queue.get_nowait()
+        except queue.Empty:
+            pass
+        self._thread.join()
+
+
+class LatestFrameReader:
+    """
+    Фоновый поток чтения живого источника, который хранит только самый свежий кадр.
+
+    Если обработка не успевает за источником, непрочитанный кадр заменяется новым
+    (устаревшие кадры отбрасываются), поэтому задержка между съемкой и обработкой кадра
+    не растет со временем. Количество отброшенных кадров доступно в dropped_frames.
+    При realtime=True чтение замедляется до частоты fps — так файл воспроизводится
+    как живая камера (для проверки потокового режима без камеры).
+    """
+
+    def __init__(self, cap: cv2.VideoCapture, realtime: bool = False, fps: float = 30.0, profiler=None):
+        self._cap = cap
+        self._realtime = realtime
+        self._fps = fps if fps and fps > 0 else 30.0
+        self._profiler = profiler
+        self._condition = threading.Condition()
+        self._latest: Optional[Tuple[np.ndarray, float]] = None  # (кадр, время декодирования)
+        self._finished = False
+        self._stop_event = threading.Event()
+        self._error: Optional[BaseException] = None
+        self.dropped_frames = 0
+        self._thread = threading.Thread(target=self._run, name="latest-frame-reader", daemon=True)
+
+    def start(self) -> "LatestFrameReader":
+        self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        start_time = time.perf_counter()
+        index = 0
+        try:
+            while not self._stop_event.is_set():
+                if self._realtime:
+                    delay = start_time + index / self._fps - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                read_start = time.perf_counter()
+                ret, frame = self._cap.read()
+                if not ret:
+                    break
+                index += 1
+                with self._condition:
+                    if self._latest is not None:
+                        self.dropped_frames += 1
+                    self._latest = (frame, time.perf_counter() - read_start)
+                    self._condition.notify()
+        except BaseException as e:  # Ошибку пробрасываем в основной поток
+            self._error = e
+        finally:
+            with self._condition:
+                self._finished = True
+                self._condition.notify()
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        while True:
+            with self._condition:
+                while self._latest is None and not self._finished:
+                    self._condition.wait()
+                if self._latest is None:
+                    break
+                frame, decode_seconds = self._latest
+                self._latest = None
+            # Время декодирования учитывается только для обработанных кадров, чтобы трасса профилирования оставалась выровненной
+            if self._profiler is not None:
+                self._profiler.record('decode', decode_seconds)
+            yield frame
+        if self._error is not None:
+            raise self._error
+
+    def stop(self) -> None:
+        """Останавливает поток чтения (дожидается завершения текущего чтения из источника)."""
+        self._stop_event.set()
+        self._thread.join()
+
+
+class FrameWriterThread:
+    """
+    Фоновый поток кодирования: забирает готовые кадры из ограниченной очереди
+    и записывает их в cv2.VideoWriter строго в порядке поступления.
+    """
+
+    def __init__(self, writer: cv2.VideoWriter, queue_size: int = 32, profiler=None):
+        self._writer = writer
+        self._profiler = profiler
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, queue_size))
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, name="frame-writer", daemon=True)
+
+    def start(self) -> "FrameWriterThread":
+        self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _END_OF_STREAM:
+                break
+            if self._error is not None:
+                continue  # После ошибки только вычитываем очередь до конца
+            try:
+                self._write_timed(item)
+            except BaseException as e:
+                self._error = e
+
+    def _write_timed(self, frame: np.ndarray) -> None:
+        start = time.perf_counter()
+        self._writer.write(frame)
+        if self._profiler is not None:
+            self._profiler.record('encode', time.perf_counter() - start)
+
+    @classmethod
+    def synchronous(cls, writer: cv2.VideoWriter, profiler=None) -> "_SynchronousFrameWriter":
+        """Возвращает приемник кадров с тем же интерфейсом, но пишущий в текущем потоке (без очереди)."""
+        return _SynchronousFrameWriter(writer, profiler)
+
+    def write(self, frame: np.ndarray) -> None:
+        """Ставит кадр в очередь на запись. Блокируется, если очередь заполнена."""
+        if self._error is not None:
+            raise self._error
+        self._queue.put(frame)
+
+    def close(self) -> None:
+        """Дожидается записи всех кадров из очереди и пробрасывает ошибку записи, если она была."""
+        self._queue.put(_END_OF_STREAM)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+
+class _SynchronousFrameWriter(FrameWriterThread):
+    """Приемник кадров с интерфейсом FrameWriterThread, записывающий кадры сразу в вызывающем потоке."""
+
+    def __init__(self, writer: cv2.VideoWriter, profiler=None):
+        self._writer = writer
+        self._profiler = profiler
+
+    def start(self) -> "_SynchronousFrameWriter":
+        return self
+
+    def write(self, frame: np.ndarray) -> None:
+        self._write_timed(frame)
+
+    def close(self) -> None:
+        pass
+
+
+class FrameBufferRing:
+    """
+    Кольцо заранее выделенных буферов под выходные кадры фиксированного размера.
+
+    Вместо выделения нового массива на каждый кадр трекер по очереди переиспользует буферы кольца.
+    При асинхронной записи буфер нельзя перезаписывать, пока он стоит в очереди записи, поэтому
+    размер кольца должен превышать максимальное число кадров «в полете»
+    (размер очереди записи + кадр, который пишется, + кадр, который заполняется).
+    """
+
+    def __init__(self, shape: Tuple[int, ...], size: int = 1, dtype=np.uint8):
+        self._buffers = [np.zeros(shape, dtype=dtype) for _ in range(max(1, size))]
+        self._index = 0
+
+    def __len__(self) -> int:
+        return len(self._buffers)
+
+    def next(self) -> np.ndarray:
+        """Возвращает следующий буфер кольца (его содержимое не очищается)."""
+        buffer = self._buffers[self._index]
+        self._index = (self._index + 1) % len(self._buffers)
+        return buffer
+
+
+def iter_frame_batches(frames, batch_size: int) -> Iterator[List[np.ndarray]]:
+    """
+    Группирует поток кадров в микро-батчи заданного размера.
+    Последний батч может быть короче.
+
+    Args:
+        frames: Итерируемый источник кадров.
+        batch_size (int): Размер микро-батча (не меньше 1).
+    """
+    batch_size = max(1, batch_size)
+    batch: List[np.ndarray] = []
+    for frame in frames:
+        batch.append(frame)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_capture_frames(cap: cv2.VideoCapture, profiler=None) -> Iterator[np.ndarray]:
+    """Последовательно читает кадры из cv2.VideoCapture в текущем потоке до конца видео."""
+    while True:
+        start = time.perf_counter()
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if profiler is not None:
+            profiler.record('decode', time.perf_counter() - start)
+        yield frame
+
+
+class FFmpegVideoWriter:
+    """
+    Запись видео через отдельный процесс ffmpeg: кадры BGR передаются в stdin процесса как rawvideo,
+    а кодирование (например, libx264 с пресетом ultrafast) выполняется вне процесса Python.
+
+    Интерфейс совпадает с используемой частью cv2.VideoWriter (isOpened, write, release),
+    поэтому объект можно передавать в FrameWriterThread вместо cv2.VideoWriter.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        fps: float,
+        frame_size: Tuple[int, int],
+        codec: str = 'libx264',
+        preset: Optional[str] = 'ultrafast',
+        crf: Optional[int] = 23,
+        pix_fmt: str = 'yuv420p',
+        output_format: Optional[str] = None,
+        ffmpeg_path: Optional[str] = None
+    ):
+        """
+        Args:
+            path (str): Путь к выходному видео (контейнер определяется по расширению).
+            fps (float): Частота кадров.
+            frame_size (Tuple[int, int]): Ширина и высота кадров.
+            codec (str): Кодек ffmpeg (libx264, libx265, h264_nvenc, ...).
+            preset (str, optional): Пресет кодека; None — не передавать.
+            crf (int, optional): Качество (Constant Rate Factor); None — не передавать.
+            pix_fmt (str): Формат пикселей выходного видео (yuv420p требует четных ширины и высоты).
+            output_format (str, optional): Формат контейнера ffmpeg (-f), нужен для сетевых потоков
+                (mpegts, rtsp, flv); по умолчанию определяется ffmpeg по расширению пути.
+            ffmpeg_path (str, optional): Путь к исполняемому файлу ffmpeg (по умолчанию ищется в PATH).
+        """
+        ffmpeg_path = ffmpeg_path or shutil.which('ffmpeg')
+        if ffmpeg_path is None:
+            raise RuntimeError("ffmpeg не найден в PATH")
+
+        width, height = frame_size
+        self._frame_bytes = width * height * 3
+        command = [
+            ffmpeg_path, '-hide_banner', '-loglevel', 'error', '-y',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}', '-r', f'{fps:g}', '-i', 'pipe:0',
+            '-an', '-c:v', codec,
+        ]
+        if preset:
+            command += ['-preset', preset]
+        if crf is not None:
+            command += ['-crf', str(crf)]
+        command += ['-pix_fmt', pix_fmt]
+        if output_format:
+            command += ['-f', output_format]
+        command.append(path)
+
+        # stderr пишется во временный файл, а не в канал: переполненный канал заблокировал бы ffmpeg
+        self._stderr = tempfile.TemporaryFile()
+        self._failed = False
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=self._stderr)
+
+    def isOpened(self) -> bool:
+        return self._process.poll() is None
+
+    def write(self, frame: np.ndarray) -> None:
+        if frame.nbytes != self._frame_bytes:
+            raise ValueError(f"Размер кадра ({frame.shape}) не совпадает с размером выходного видео")
+        try:
+            self._process.stdin.write(memoryview(np.ascontiguousarray(frame)))
+        except BrokenPipeError:
+            self._failed = True
+            raise RuntimeError(f"Процесс ffmpeg завершился с ошибкой: {self._error_message()}") from None
+
+    def release(self) -> None:
+        """Закрывает stdin, дожидается завершения кодирования и проверяет код возврата ffmpeg."""
+        if self._process.stdin.closed:
+            return
+        try:
+            self._process.stdin.close()
+        except BrokenPipeError:
+            pass
+        returncode = self._process.wait()
+        message = self._error_message()
+        self._stderr.close()
+        if returncode != 0 and not self._failed:  # Ошибку, уже выброшенную из write, не дублируем
+            raise RuntimeError(f"ffmpeg завершился с кодом {returncode}: {message}")
+
+    def _error_message(self) -> str:
+        self._stderr.seek(0)
+        return self._stderr.read().decode('utf-8', errors='replace').strip()[-2000:]
+
+
+def create_video_writer(
+    path: str,
+    fps: float,
+    frame_size: Tuple[int, int],
+    backend: str = 'auto',
+    codec: Optional[str] = None,
+    preset: Optional[str] = 'ultrafast',
+    crf: Optional[int] = 23
+):
+    """
+    Создает объект записи видео с интерфейсом cv2.VideoWriter.
+
+    Путь может быть URL сетевого потока (udp://, tcp://, srt://, rtsp://, rtmp://) — такой выход
+    поддерживается только бэкендом ffmpeg, формат контейнера выбирается по схеме URL.
+
+    Args:
+        path (str): Путь к выходному видео или URL потока.
+        fps (float): Частота кадров.
+        frame_size (Tuple[int, int]): Ширина и высота кадров.
+        backend (str): 'ffmpeg' — отдельный процесс ffmpeg (FFmpegVideoWriter), 'opencv' — cv2.VideoWriter,
+            'auto' — ffmpeg, если он есть в PATH, иначе OpenCV.
+        codec (str, optional): Кодек: имя кодера ffmpeg (по умолчанию libx264) или FourCC OpenCV (по умолчанию mp4v).
+        preset (str, optional): Пресет кодека (только ffmpeg).
+        crf (int, optional): Constant Rate Factor (только ffmpeg).
+
+    Returns:
+        FFmpegVideoWriter | cv2.VideoWriter: Открытый объект записи.
+
+    Raises:
+        ValueError: Неизвестный бэкенд.
+        RuntimeError: Не удалось открыть запись выбранным бэкендом.
+    """
+    if backend not in WRITER_BACKENDS:
+        raise ValueError(f"Неизвестный бэкенд записи '{backend}'. Доступны: {', '.join(WRITER_BACKENDS)}")
+    scheme = path.split('://', 1)[0].lower() if '://' in path else None
+    if backend == 'auto':
+        backend = 'ffmpeg' if scheme or shutil.which('ffmpeg') else 'opencv'
+    if scheme and backend != 'ffmpeg':
+        raise ValueError(f"Вывод в поток {path} поддерживается только бэкендом ffmpeg")
+
+    if backend == 'ffmpeg':
+        writer = FFmpegVideoWriter(path, fps, frame_size, codec=codec or 'libx264', preset=preset, crf=crf,
+                                   output_format=_STREAM_FORMATS.get(scheme))
+    else:
+        codec = codec or 'mp4v'
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*codec), fps, frame_size)
+
+    if not writer.isOpened():
+        raise RuntimeError(f"Не удалось открыть запись видео {path} (бэкенд {backend}, кодек {codec or 'libx264'})")
+    return writer
+
+
+class NullVideoWriter:
+    """Объект записи с интерфейсом cv2.VideoWriter, который отбрасывает кадры (когда выходной файл не нужен)."""
+
+    def isOpened(self) -> bool:
+        return True
+
+    def write(self, frame: np.ndarray) -> None:
+        pass
+
+    def release(self) -> None:
+        pass
+
+
+class RawVideoPipeCapture:
+    """
+    Источник кадров из потока сырых кадров BGR24 (по умолчанию стандартный ввод)
+    с интерфейсом cv2.VideoCapture (isOpened, read, get, release).
+
+    Размер кадра в таком потоке не передается, поэтому его нужно указать явно. Пример подачи видео:
+        ffmpeg -i rtsp://camera/stream -f rawvideo -pix_fmt bgr24 - | python -m scripts.tracker --input - --input-size 1280x720 ...
+    """
+
+    def __init__(self, frame_size: Tuple[int, int], fps: float = 30.0, stream: Optional[BinaryIO] = None):
+        self._width, self._height = frame_size
+        self._fps = fps
+        self._stream = stream if stream is not None else sys.stdin.buffer
+        self._frame_bytes = self._width * self._height * 3
+        self._closed = False
+
+    def isOpened(self) -> bool:
+        return not self._closed
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        frame = np.empty((self._height, self._width, 3), dtype=np.uint8)
+        view = memoryview(frame).cast('B')
+        filled = 0
+        while filled < self._frame_bytes:
+            count = self._stream.readinto(view[filled:])
+            if not count:  # Конец потока (неполный последний кадр отбрасывается)
+                return False, None
+            filled += count
+        return True, frame
+
+    def get(self, prop_id: int) -> float:
+        return {
+            cv2.CAP_PROP_FRAME_WIDTH: self._width,
+            cv2.CAP_PROP_FRAME_HEIGHT: self._height,
+            cv2.CAP_PROP_FPS: self._fps,
+        }.get(prop_id, 0.0)
+
+    def release(self) -> None:
+        self._closed = True
+
+
+def open_video_source(source: Union[str, int], frame_size: Optional[Tuple[int, int]] = None, fps: Optional[float] = None):
+    """
+    Открывает источник кадров: файл, URL потока (rtsp://, http://, ...), индекс камеры
+    или стандартный ввод ('-' или 'pipe:0', сырые кадры BGR24 размера frame_size).
+
+    Returns:
+        cv2.VideoCapture | RawVideoPipeCapture: Источник с интерфейсом cv2.VideoCapture
+            (проверять isOpened() должен вызывающий код).
+
+    Raises:
+        RuntimeError: Если для стандартного ввода не задан frame_size (как и другие ошибки открытия источника).
+    """
+    if isinstance(source, str) and source in STDIN_SOURCES:
+        if frame_size is None:
+            raise RuntimeError("Для чтения кадров из стандартного ввода нужно указать размер кадра (frame_size)")
+        return RawVideoPipeCapture(frame_size, fps or 30.0)
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)  # Индекс локальной камеры
+    return cv2.VideoCapture(source)
@@ -0,0 +1,282 @@
+import math
+import cv2
+import numpy as np
+from typing import Optional, Tuple
+
+
+class ExponentialFilter:
+    """Экспоненциальное сглаживание (EMA) вектора: y = alpha * x + (1 - alpha) * y_prev."""
+
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self.value: Optional[np.ndarray] = None
+
+    def reset(self) -> None:
+        self.value = None
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        x = np.asarray(x, dtype=np.float64)
+        if self.value is None:
+            self.value = x.copy()
+        else:
+            self.value = self.alpha * x + (1 - self.alpha) * self.value
+        return self.value
+
+
+class OneEuroFilter:
+    """
+    Фильтр One Euro для вектора (Casiez et al., 2012).
+
+    Частота среза адаптируется к скорости сигнала: при медленном движении сильнее подавляется дрожание,
+    при быстром уменьшается запаздывание камеры.
+    """
+
+    def __init__(self, freq: float = 30.0, min_cutoff: float = 1.0, beta: float = 0.01, d_cutoff: float = 1.0):
+        """
+        Args:
+            freq (float): Частота поступления измерений (FPS видео).
+            min_cutoff (float): Минимальная частота среза (Гц); меньше — сильнее сглаживание в покое.
+            beta (float): Коэффициент роста частоты среза со скоростью; больше — меньше запаздывание.
+            d_cutoff (float): Частота среза для оценки скорости.
+        """
+        self.freq = freq
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.value: Optional[np.ndarray] = None
+        self.derivative: Optional[np.ndarray] = None
+
+    def reset(self) -> None:
+        self.value = None
+        self.derivative = None
+
+    def _alpha(self, cutoff) -> np.ndarray:
+        tau = 1.0 / (2 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau * self.freq)
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        x = np.asarray(x, dtype=np.float64)
+        if self.value is None:
+            self.value = x.copy()
+            self.derivative = np.zeros_like(x)
+            return self.value
+
+        dx = (x - self.value) * self.freq
+        a_d = self._alpha(self.d_cutoff)
+        self.derivative = a_d * dx + (1 - a_d) * self.derivative
+        cutoff = self.min_cutoff + self.beta * np.abs(self.derivative)
+        a = self._alpha(cutoff)
+        self.value = a * x + (1 - a) * self.value
+        return self.value
+
+
+class VirtualCamera:
+    """
+    Виртуальная камера: сглаживает положение (и, опционально, масштаб) окна обрезки вокруг цели
+    и формирует выходной кадр cv2.warpAffine с субпиксельной точностью (при отдалении — после
+    уменьшения видимой части кадра с INTER_AREA, см. warp_view).
+
+    Камера не двигается, пока цель остается внутри мертвой зоны (dead_zone пикселей от центра кадра),
+    что убирает дрожание от шума детектора. При zoom_to_fit масштаб подбирается так, чтобы
+    наибольшая сторона bbox цели занимала долю target_fill выходного кадра.
+    Если камера неподвижна, матрица преобразования не пересчитывается; если к тому же масштаб равен 1,
+    а смещение окна целое (с точностью INTEGER_OFFSET_TOLERANCE), кадр вырезается простым целочисленным
+    срезом вместо интерполяции warpAffine — без скачка изображения при остановке камеры.
+    """
+
+    # Максимальное отклонение смещения от целого числа пикселей, при котором допустим целочисленный срез
+    INTEGER_OFFSET_TOLERANCE = 1e-3
+
+    def __init__(
+        self,
+        output_size: int = 640,
+        smoothing: str = 'one_euro',
+        fps: float = 30.0,
+        ema_alpha: float = 0.2,
+        min_cutoff: float = 0.5,
+        beta: float = 0.01,
+        dead_zone: float = 8.0,
+        zoom_to_fit: bool = False,
+        target_fill: float = 0.5,
+        min_zoom: float = 0.5,
+        max_zoom: float = 2.0,
+        zoom_alpha: float = 0.05,
+        static_epsilon: float = 0.05
+    ):
+        """
+        Args:
+            output_size (int): Сторона квадратного выходного кадра в пикселях.
+            smoothing (str): Фильтр положения: 'one_euro', 'ema' или 'none'.
+            fps (float): Частота кадров видео для фильтра One Euro (трекер задает ее по источнику, см. set_fps).
+            ema_alpha (float): Коэффициент EMA для smoothing='ema'.
+            min_cutoff (float): Минимальная частота среза фильтра One Euro.
+            beta (float): Коэффициент скорости фильтра One Euro.
+            dead_zone (float): Радиус мертвой зоны в пикселях исходного кадра.
+            zoom_to_fit (bool): Если True, масштаб подбирается под размер цели.
+            target_fill (float): Доля выходного кадра, которую должна занимать цель при zoom_to_fit.
+            min_zoom (float): Минимальный масштаб (меньше 1 — отдаление).
+            max_zoom (float): Максимальный масштаб (больше 1 — приближение).
+            zoom_alpha (float): Коэффициент EMA для сглаживания масштаба.
+            static_epsilon (float): Смещение камеры (пикс), ниже которого камера считается неподвижной.
+        """
+        if smoothing == 'one_euro':
+            self._center_filter = OneEuroFilter(freq=fps, min_cutoff=min_cutoff, beta=beta)
+        elif smoothing == 'ema':
+            self._center_filter = ExponentialFilter(alpha=ema_alpha)
+        elif smoothing == 'none':
+            self._center_filter = None
+        else:
+            raise ValueError(f"Неизвестный тип сглаживания '{smoothing}'. Доступны: 'one_euro', 'ema', 'none'")
+
+        self.output_size = output_size
+        self.dead_zone = dead_zone
+        self.zoom_to_fit = zoom_to_fit
+        self.target_fill = target_fill
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self.static_epsilon = static_epsilon
+        self._zoom_filter = ExponentialFilter(alpha=zoom_alpha)
+
+        self.center: Optional[np.ndarray] = None
+        self.zoom = 1.0
+        self.is_static = False
+        self._matrix: Optional[np.ndarray] = None
+
+    def set_fps(self, fps: float) -> None:
+        """Задает частоту кадров источника для фильтра One Euro (вызывается трекером после открытия видео)."""
+        if isinstance(self._center_filter, OneEuroFilter):
+            self._center_filter.freq = fps
+
+    @property
+    def initialized(self) -> bool:
+        return self.center is not None
+
+    def reset(self) -> None:
+        if self._center_filter is not None:
+            self._center_filter.reset()
+        self._zoom_filter.reset()
+        self.center = None
+        self.zoom = 1.0
+        self.is_static = False
+        self._matrix = None
+
+    def update(self, target_center: Tuple[float, float], target_size: Optional[Tuple[int, int]] = None) -> None:
+        """
+        Обновляет состояние камеры по центру (и размеру) цели в текущем кадре.
+
+        Args:
+            target_center (Tuple[float, float]): Центр цели в координатах исходного кадра.
+            target_size (Tuple[int, int], optional): Ширина и высота bbox цели (для zoom_to_fit).
+        """
+        target = np.asarray(target_center, dtype=np.float64)
+
+        # Мертвая зона: камера догоняет цель только до границы зоны
+        if self.center is not None and self.dead_zone > 0:
+            offset = target - self.center
+            distance = float(np.hypot(offset[0], offset[1]))
+            if distance <= self.dead_zone:
+                target = self.center
+            else:
+                target = self.center + offset * (1 - self.dead_zone / distance)
+
+        new_center = self._center_filter(target) if self._center_filter is not None else target
+        new_zoom = self.zoom
+        if self.zoom_to_fit and target_size is not None and max(target_size) > 0:
+            desired = self.target_fill * self.output_size / max(target_size)
+            desired = float(np.clip(desired, self.min_zoom, self.max_zoom))
+            new_zoom = float(self._zoom_filter(np.array([desired]))[0])
+
+        self.is_static = (
+            self.center is not None
+            and float(np.max(np.abs(new_center - self.center))) < self.static_epsilon
+            and abs(new_zoom - self.zoom) < 1e-4
+        )
+        if not self.is_static:
+            self.center = np.array(new_center, dtype=np.float64)
+            self.zoom = new_zoom
+            self._matrix = None
+
+    def transform(self) -> Tuple[float, float, float]:
+        """
+        Возвращает преобразование исходного кадра в выходной: (scale, offset_x, offset_y),
+        где x_out = scale * x + offset_x, y_out = scale * y + offset_y.
+        """
+        half = self.output_size / 2
+        return self.zoom, half - self.zoom * self.center[0], half - self.zoom * self.center[1]
+
+    def render(self, frame: np.ndarray, out: np.ndarray) -> Tuple[np.ndarray, Tuple[float, float, float]]:
+        """
+        Формирует выходной кадр в буфер out по текущему состоянию камеры.
+
+        Returns:
+            Tuple: (выходной кадр, преобразование (scale, offset_x, offset_y) для пересчета координат).
+        """
+        scale, offset_x, offset_y = self.transform()
+
+        if self.is_static and scale == 1.0:
+            int_x, int_y = round(offset_x), round(offset_y)
+            if (abs(offset_x - int_x) <= self.INTEGER_OFFSET_TOLERANCE
+                    and abs(offset_y - int_y) <= self.INTEGER_OFFSET_TOLERANCE):
+                # Камера стоит на целом пикселе: интерполяция не нужна, достаточно целочисленного среза.
+                # При дробном смещении срез сдвинул бы картинку до 0.5 пикс, поэтому остается warpAffine.
+                _copy_translated(frame, out, int_x, int_y)
+                return out, (scale, float(int_x), float(int_y))
+
+        if scale < 1.0:
+            warp_view(frame, out, scale, offset_x, offset_y)
+            return out, (scale, offset_x, offset_y)
+        if self._matrix is None:
+            self._matrix = np.array([[scale, 0, offset_x],
+                                     [0, scale, offset_y]], dtype=np.float64)
+        cv2.warpAffine(frame, self._matrix, (self.output_size, self.output_size), dst=out,
+                       flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT, borderValue=(0, 0, 0))
+        return out, (scale, offset_x, offset_y)
+
+
+def warp_view(frame: np.ndarray, out: np.ndarray, scale: float, offset_x: float, offset_y: float) -> np.ndarray:
+    """
+    Формирует в out вид кадра с преобразованием x_out = scale * x + offset_x, y_out = scale * y + offset_y.
+
+    cv2.warpAffine не поддерживает INTER_AREA (молча использует билинейную интерполяцию), и при отдалении
+    (scale < 1) получается алиасинг. Поэтому при отдалении видимая часть кадра сначала уменьшается
+    cv2.resize с INTER_AREA, а затем сдвигается warpAffine с субпиксельной точностью.
+    """
+    out_h, out_w = out.shape[:2]
+    if scale >= 1.0:
+        matrix = np.array([[scale, 0, offset_x], [0, scale, offset_y]], dtype=np.float64)
+        return cv2.warpAffine(frame, matrix, (out_w, out_h), dst=out, flags=cv2.INTER_LINEAR,
+                              borderMode=cv2.BORDER_CONSTANT, borderValue=(0, 0, 0))
+
+    # Видимая область исходного кадра с запасом в 2 пикселя для интерполяции на краях
+    frame_h, frame_w = frame.shape[:2]
+    x1 = max(0, int(math.floor(-offset_x / scale)) - 2)
+    y1 = max(0, int(math.floor(-offset_y / scale)) - 2)
+    x2 = min(frame_w, int(math.ceil((out_w - offset_x) / scale)) + 2)
+    y2 = min(frame_h, int(math.ceil((out_h - offset_y) / scale)) + 2)
+    if x2 <= x1 or y2 <= y1:
+        out.fill(0)
+        return out
+    # При dsize=(0, 0) resize масштабирует ровно в scale раз: центр пикселя x переходит в scale * x + (scale - 1) / 2
+    small = cv2.resize(frame[y1:y2, x1:x2], (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    shift = (scale - 1) / 2
+    matrix = np.array([[1, 0, scale * x1 + offset_x - shift],
+                       [0, 1, scale * y1 + offset_y - shift]], dtype=np.float64)
+    return cv2.warpAffine(small, matrix, (out_w, out_h), dst=out, flags=cv2.INTER_LINEAR,
+                          borderMode=cv2.BORDER_CONSTANT, borderValue=(0, 0, 0))
+
+
+def _copy_translated(frame: np.ndarray, out: np.ndarray, offset_x: int, offset_y: int) -> None:
+    """Копирует кадр в out со сдвигом (x_out = x + offset_x), заполняя пустые области черным."""
+    out_h, out_w = out.shape[:2]
+    frame_h, frame_w = frame.shape[:2]
+
+    src_x1, src_y1 = max(0, -offset_x), max(0, -offset_y)
+    src_x2, src_y2 = min(frame_w, out_w - offset_x), min(frame_h, out_h - offset_y)
+    if src_x2 <= src_x1 or src_y2 <= src_y1:
+        out.fill(0)
+        return
+
+    left, top = src_x1 + offset_x, src_y1 + offset_y
+    right, bottom = out_w - (src_x2 + offset_x), out_h - (src_y2 + offset_y)
+    cv2.copyMakeBorder(frame[src_y1:src_y2, src_x1:src_x2], top, bottom, left, right,
+                       cv2.BORDER_CONSTANT, dst=out, value=(0, 0, 0))
@@ -2,13 +2,44 @@ import cv2
 import os
 import random
 import base64 
-from IPython.display import display, Image, HTML, Markdown
+import hashlib
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence, Tuple
 
+from scripts.dataset_index import DatasetIndex
+from scripts.label_store import LabelStore, parse_yolo_label_file
+from scripts.thumbnail_cache import ThumbnailCache
 
-try:
-    import wandb
-except ImportError:
-    wandb = None # W&B не установлен или недоступен
+
+# Ширина превью графиков и изображений, встраиваемых в ноутбук и логируемых в W&B
+PREVIEW_WIDTH = 1024
+
+_thumbnail_cache = None
+_wandb = False  # Модуль wandb после первой попытки импорта (None, если W&B не установлен)
+
+
+def get_thumbnail_cache() -> ThumbnailCache:
+    """Общий дисковый кэш миниатюр (создается при первом обращении, см. ThumbnailCache)."""
+    global _thumbnail_cache
+    if _thumbnail_cache is None:
+        _thumbnail_cache = ThumbnailCache()
+    return _thumbnail_cache
+
+
+def get_wandb():
+    """
+    Модуль wandb, импортируемый при первом обращении (импорт занимает секунды и нужен только
+    при логировании в W&B); None, если W&B не установлен или недоступен.
+    """
+    global _wandb
+    if _wandb is False:
+        try:
+            import wandb
+        except ImportError:
+            wandb = None
+        _wandb = wandb
+    return _wandb
 
 
 # Функция для отображения обычных изображений (без bbox)
@@ -20,6 +51,8 @@ def display_image_inline(image_path: str, width: int = 600):
         image_path (str): Путь к файлу изображения.
         width (int): Ширина отображаемого изображения в пикселях.
     """
+    from IPython.display import display, Image  # IPython импортируется при первом выводе в ноутбук, а не при импорте модуля
+
     try:
         display(Image(filename=image_path, width=width))
     except FileNotFoundError:
@@ -28,8 +61,53 @@ def display_image_inline(image_path: str, width: int = 600):
         print(f"Ошибка при отображении изображения {image_path}: {e}")
 
 
+def load_yolo_labels(labels_path: str) -> np.ndarray:
+    """
+    Читает файл аннотаций YOLO одним разбором всего файла.
+
+    Args:
+        labels_path (str): Путь к файлу аннотаций (.txt).
+
+    Returns:
+        np.ndarray: Массив (N, 5) со столбцами class_id, x_center, y_center, width, height
+                    (нормированные координаты); пустой массив (0, 5), если аннотаций нет.
+    """
+    return parse_yolo_label_file(labels_path)
+
+
+def yolo_to_xyxy(labels: np.ndarray, width: int, height: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Переводит все рамки из нормированного формата YOLO (xywh) в пиксельные x1, y1, x2, y2 одной векторной операцией.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: ID классов формы (N,) и рамки формы (N, 4) в целых пикселях.
+    """
+    centers, sizes = labels[:, 1:3], labels[:, 3:5]
+    scale = np.array([width, height, width, height], dtype=np.float32)
+    boxes = np.hstack((centers - sizes / 2, centers + sizes / 2)) * scale
+    return labels[:, 0].astype(int), boxes.astype(int)
+
+
+def draw_yolo_boxes(img: np.ndarray, labels: np.ndarray, class_names: dict, thickness: int = 2, font_scale: float = 0.9) -> np.ndarray:
+    """Рисует рамки аннотаций YOLO (массив из load_yolo_labels) и подписи классов на изображении (на месте)."""
+    h, w = img.shape[:2]
+    color = (0, 255, 0) # Зеленый цвет
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    class_ids, boxes = yolo_to_xyxy(labels, w, h)
+    for class_id, (x1, y1, x2, y2) in zip(class_ids.tolist(), boxes.tolist()):
+        cv2.rectangle(img, (x1, y1), (x2, y2), color, thickness)
+
+        # Добавление метки класса
+        text = f"{class_names.get(class_id, f'Class {class_id}')}"
+        text_size = cv2.getTextSize(text, font, font_scale, thickness)[0]
+        text_y = y1 - 10 if y1 - 10 > text_size[1] else y1 + text_size[1] + 10 # Позиция текста выше или ниже BBox
+        cv2.putText(img, text, (x1, text_y), font, font_scale, color, thickness)
+    return img
+
+
 # Функция для отображения изображения с аннотацией
-def plot_bboxes_on_image(image_path: str, labels_path: str, class_names: dict, output_dir: str = None, display_inline: bool = True):
+def plot_bboxes_on_image(image_path: str, labels_path: str, class_names: dict, output_dir: str = None, display_inline: bool = True,
+                         label_store: Optional[LabelStore] = None):
     """
     Рисует ограничивающие рамки на изображении на основе YOLO-аннотаций.
 
@@ -39,47 +117,25 @@ def plot_bboxes_on_image(image_path: str, labels_path: str, class_names: dict, o
         class_names (dict): Словарь с соответствием ID класса и имени (например, {0: 'snowboarder'}).
         output_dir (str, optional): Директория для сохранения изображения с BBoxes. Если None, не сохраняется.
         display_inline (bool): Если True, отображает изображение в Jupyter Notebook.
+        label_store (LabelStore, optional): Хранилище аннотаций; если задано, рамки берутся из него, а не из labels_path.
     """
+    from IPython.display import display, HTML
+
     try:
         img = cv2.imread(image_path)
         if img is None:
             print(f"Ошибка: Не удалось загрузить изображение по пути {image_path}")
             return
 
-        h, w, _ = img.shape
-
-        if not os.path.exists(labels_path):
+        if label_store is not None and os.path.basename(image_path) in label_store:
+            labels = label_store.frame_labels(os.path.basename(image_path))
+        elif label_store is not None or not os.path.exists(labels_path):
             print(f"Внимание: Файл аннотаций не найден для {image_path} по пути {labels_path}. Отображаем изображение без BBoxes.")
-            labels = []
+            labels = np.zeros((0, 5), dtype=np.float32)
         else:
-            with open(labels_path, 'r') as f:
-                labels = f.readlines()
-
-        for label in labels:
-            parts = list(map(float, label.strip().split()))
-            class_id = int(parts[0])
-            x_center, y_center, bbox_width, bbox_height = parts[1:]
-
-            # Преобразование относительных координат в абсолютные
-            x1 = int((x_center - bbox_width / 2) * w)
-            y1 = int((y_center - bbox_height / 2) * h)
-            x2 = int((x_center + bbox_width / 2) * w)
-            y2 = int((y_center + bbox_height / 2) * h)
-
-            # Отрисовка BBox
-            color = (0, 255, 0) # Зеленый цвет
-            cv2.rectangle(img, (x1, y1), (x2, y2), color, 2)
-
-            # Добавление метки класса
-            class_name = class_names.get(class_id, f"Class {class_id}")
-            text = f"{class_name}"
-            font = cv2.FONT_HERSHEY_SIMPLEX
-            font_scale = 0.9
-            thickness = 2
-            text_size = cv2.getTextSize(text, font, font_scale, thickness)[0]
-            text_x = x1
-            text_y = y1 - 10 if y1 - 10 > text_size[1] else y1 + text_size[1] + 10 # Позиция текста выше или ниже BBox
-            cv2.putText(img, text, (text_x, text_y), font, font_scale, color, thickness)
+            labels = load_yolo_labels(labels_path)
+
+        draw_yolo_boxes(img, labels, class_names)
         
         # Сохранение изображения, если указан output_dir
         if output_dir:
@@ -98,7 +154,144 @@ def plot_bboxes_on_image(image_path: str, labels_path: str, class_names: dict, o
         print(f"Ошибка при отрисовке BBoxes для {image_path}: {e}")
 
 
-def display_random_images_from_dir(directory: str, count: int = 5, title: str = "Примеры изображений:", img_width: int = 275):
+def make_thumbnail(image_path: str, width: int, labels_path: Optional[str] = None, class_names: Optional[dict] = None, quality: int = 85, ext: str = '.jpg',
+                   labels: Optional[np.ndarray] = None) -> Optional[bytes]:
+    """
+    Декодирует изображение, уменьшает его до ширины width (INTER_AREA), при заданном labels_path
+    (или готовом массиве рамок labels, например из LabelStore) рисует рамки аннотаций YOLO
+    (в координатах миниатюры) и кодирует результат в JPEG (или в формат ext).
+
+    Returns:
+        Optional[bytes]: Файл миниатюры или None, если изображение не читается.
+    """
+    img = cv2.imread(image_path)
+    if img is None:
+        return None
+    h, w = img.shape[:2]
+    if w > width:
+        img = cv2.resize(img, (width, max(1, round(h * width / w))), interpolation=cv2.INTER_AREA)
+    if labels is None and labels_path is not None and os.path.exists(labels_path):
+        labels = load_yolo_labels(labels_path)
+    if labels is not None:
+        # Подписи и толщина линий — в пропорции к размеру миниатюры
+        font_scale = max(0.3, 0.9 * img.shape[1] / 640)
+        draw_yolo_boxes(img, labels, class_names or {}, thickness=1 if img.shape[1] < 640 else 2, font_scale=font_scale)
+    params = [cv2.IMWRITE_JPEG_QUALITY, quality] if ext == '.jpg' else []
+    ok, buffer = cv2.imencode(ext, img, params)
+    return buffer.tobytes() if ok else None
+
+
+def cached_thumbnail(image_path: str, width: int, labels_path: Optional[str] = None, class_names: Optional[dict] = None,
+                     quality: int = 85, ext: str = '.jpg', labels: Optional[np.ndarray] = None) -> Optional[bytes]:
+    """
+    Миниатюра из общего кэша (см. get_thumbnail_cache); при промахе строится make_thumbnail и сохраняется.
+    Готовый массив рамок labels входит в ключ кэша своим хэшем.
+    """
+    labels_digest = hashlib.blake2b(np.ascontiguousarray(labels).tobytes(), digest_size=16).hexdigest() if labels is not None else None
+    return get_thumbnail_cache().get_or_create(
+        image_path, lambda: make_thumbnail(image_path, width, labels_path, class_names, quality, ext, labels), labels_path, ext,
+        width=width, quality=quality, class_names=class_names, labels=labels_digest,
+    )
+
+
+def make_thumbnails(
+    image_paths: Sequence[str],
+    width: int = 275,
+    labels_paths: Optional[Sequence[Optional[str]]] = None,
+    class_names: Optional[dict] = None,
+    workers: Optional[int] = None,
+    use_cache: bool = True,
+    labels: Optional[Sequence[Optional[np.ndarray]]] = None
+) -> List[Optional[bytes]]:
+    """
+    Создает JPEG-миниатюры для списка изображений пулом потоков (декодирование, уменьшение
+    и кодирование OpenCV выполняются без GIL). Порядок результатов совпадает с image_paths.
+    При use_cache=True миниатюры берутся из общего дискового кэша, поэтому повторный запуск
+    ячейки ноутбука не декодирует исходные изображения. Рамки задаются файлами labels_paths
+    или готовыми массивами labels (например, из LabelStore).
+    """
+    labels_paths = labels_paths if labels_paths is not None else [None] * len(image_paths)
+    labels = labels if labels is not None else [None] * len(image_paths)
+    build = cached_thumbnail if use_cache else make_thumbnail
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        thumbnails = list(executor.map(lambda args: build(args[0], width, args[1], class_names, labels=args[2]),
+                                       zip(image_paths, labels_paths, labels)))
+    if use_cache:
+        get_thumbnail_cache().evict()
+    return thumbnails
+
+
+def _gallery_html(thumbnails: Sequence[Optional[bytes]], titles: Sequence[str], img_width: int) -> str:
+    html_content = ""
+    for data, title in zip(thumbnails, titles):
+        if data is None:
+            print(f"Ошибка при кодировании изображения {title}")
+            continue
+        img_data = base64.b64encode(data).decode('utf-8')
+        html_content += f'<img src="data:image/jpeg;base64,{img_data}" style="width:{img_width}px; margin-right: 10px; display:inline-block;" title="{title}">'
+    return html_content
+
+
+def display_annotated_gallery(
+    image_dir: str,
+    annotations_dir: str,
+    class_names: dict,
+    count: Optional[int] = 50,
+    title: str = "Размеченные изображения:",
+    img_width: int = 275,
+    workers: Optional[int] = None,
+    seed: Optional[int] = None,
+    index: Optional[DatasetIndex] = None,
+    label_store: Optional[LabelStore] = None
+) -> int:
+    """
+    Отображает галерею миниатюр изображений с рамками аннотаций YOLO.
+
+    Миниатюры строятся пулом потоков (см. make_thumbnails), а в HTML ноутбука встраиваются только
+    уменьшенные JPEG, поэтому просмотр сотен размеченных кадров остается интерактивным.
+
+    Args:
+        image_dir (str): Директория изображений.
+        annotations_dir (str): Директория аннотаций YOLO (.txt).
+        class_names (dict): Словарь с соответствием ID класса и имени.
+        count (int, optional): Количество случайных изображений; None — все изображения по порядку.
+        title (str): Заголовок галереи.
+        img_width (int): Ширина миниатюры в пикселях.
+        workers (int, optional): Количество потоков.
+        seed (int, optional): Seed случайной выборки изображений.
+        index (DatasetIndex, optional): Готовый индекс датасета; если не задан, директории сканируются один раз.
+        label_store (LabelStore, optional): Хранилище аннотаций; если задано, рамки берутся из него, а не из annotations_dir.
+
+    Returns:
+        int: Количество отображенных изображений.
+    """
+    from IPython.display import display, HTML
+
+    index = index or DatasetIndex.build([image_dir] if label_store is not None else [image_dir, annotations_dir])
+    image_files = index.images(image_dir)
+    if not image_files:
+        print(f"Папка '{os.path.basename(image_dir)}' пуста, невозможно показать галерею.")
+        return 0
+    if count is not None and count < len(image_files):
+        image_files = sorted(random.Random(seed).sample(image_files, count))
+
+    image_paths = [os.path.join(image_dir, name) for name in image_files]
+    if label_store is not None:
+        labels = [label_store.frame_labels(name) if name in label_store else None for name in image_files]
+        thumbnails = make_thumbnails(image_paths, img_width, class_names=class_names, workers=workers, labels=labels)
+    else:
+        labels_paths = [os.path.join(annotations_dir, os.path.splitext(name)[0] + '.txt') if index.has_label(annotations_dir, name) else None
+                        for name in image_files]
+        thumbnails = make_thumbnails(image_paths, img_width, labels_paths, class_names, workers)
+    html_content = _gallery_html(thumbnails, image_files, img_width)
+
+    print(f"\n{title}")
+    if html_content:
+        display(HTML(html_content))
+    return sum(data is not None for data in thumbnails)
+
+
+def display_random_images_from_dir(directory: str, count: int = 5, title: str = "Примеры изображений:", img_width: int = 275, index: Optional[DatasetIndex] = None):
     """
     Отображает случайные изображения из указанной директории в виде HTML-строки в Jupyter Notebook.
 
@@ -107,12 +300,16 @@ def display_random_images_from_dir(directory: str, count: int = 5, title: str =
         count (int): Количество случайных изображений для отображения.
         title (str): Заголовок, который будет выведен перед изображениями.
         img_width (int): Ширина каждого изображения в пикселях для HTML-отображения.
+        index (DatasetIndex, optional): Готовый индекс датасета; если не задан, директория сканируется один раз.
     """
-    if not os.path.exists(directory):
+    from IPython.display import display, HTML
+
+    index = index or DatasetIndex.build([directory])
+    if not index.exists(directory):
         print(f"Ошибка: Директория не найдена: {directory}")
         return
 
-    image_files = [f for f in os.listdir(directory) if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp'))]
+    image_files = index.files(directory, ('.png', '.jpg', '.jpeg', '.gif', '.bmp'))
     
     if len(image_files) == 0:
         print(f"Невозможно отобразить примеры, так как папка '{os.path.basename(directory)}' пуста.")
@@ -122,18 +319,10 @@ def display_random_images_from_dir(directory: str, count: int = 5, title: str =
     
     # Выбор до 'count' случайных изображений
     example_images = random.sample(image_files, min(count, len(image_files)))
-    
-    html_content = ""
-    for img_name in example_images:
-        img_path = os.path.join(directory, img_name)
-        # Используем base64 для надежного отображения в HTML, чтобы не зависеть от файловой системы Jupyter
-        try:
-            with open(img_path, "rb") as f:
-                img_data = base64.b64encode(f.read()).decode('utf-8')
-            html_content += f'<img src="data:image/jpeg;base64,{img_data}" style="width:{img_width}px; margin-right: 10px; display:inline-block;" title="{img_name}">'
-        except Exception as e:
-            print(f"Ошибка при кодировании изображения {img_name}: {e}")
-            continue
+
+    # Миниатюры строятся пулом потоков; в HTML встраиваются уменьшенные JPEG, а не исходные файлы
+    thumbnails = make_thumbnails([os.path.join(directory, name) for name in example_images], img_width)
+    html_content = _gallery_html(thumbnails, example_images, img_width)
 
     if html_content:
         display(HTML(html_content))
@@ -146,7 +335,8 @@ def display_single_annotated_image_example(
     annotations_dir: str,
     class_names: dict,
     title: str = "Пример размеченного изображения:",
-    display_annotation_content: bool = False
+    display_annotation_content: bool = False,
+    index: Optional[DatasetIndex] = None
 ):
     """
     Выбирает случайное аннотированное изображение из указанной директории
@@ -159,10 +349,14 @@ def display_single_annotated_image_example(
         class_names (dict): Словарь с соответствием ID класса и имени (например, {0: 'snowboarder'}).
         title (str): Заголовок для вывода перед изображением.
         display_annotation_content (bool): Если True, отображает содержимое .txt файла аннотации.
+        index (DatasetIndex, optional): Готовый индекс датасета; если не задан, директории сканируются один раз.
     """
+    from IPython.display import display, Markdown
+
     print(f"\n--- {title} ---")
     
-    image_files = [f for f in os.listdir(image_dir) if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
+    index = index or DatasetIndex.build([image_dir, annotations_dir])
+    image_files = index.images(image_dir)
 
     if not image_files:
         print(f"Папка '{os.path.basename(image_dir)}' пуста, невозможно показать пример изображения с аннотацией.")
@@ -186,12 +380,13 @@ def display_single_annotated_image_example(
     )
 
     # Отображаем содержимое .txt файла, если флаг установлен и файл существует
-    if display_annotation_content and os.path.exists(sample_annotation_path):
+    annotation_exists = index.exists(sample_annotation_path)
+    if display_annotation_content and annotation_exists:
         print(f"\nСодержимое файла аннотации ({base_name}.txt) - пример формата YOLO:")
         with open(sample_annotation_path, 'r') as f:
             annotation_content = f.read()
         display(Markdown(f"```txt\n{annotation_content}\n```"))
-    elif display_annotation_content and not os.path.exists(sample_annotation_path):
+    elif display_annotation_content and not annotation_exists:
         print(f"Файл аннотации {sample_annotation_path} не найден для демонстрации содержимого.")
 
 
@@ -201,11 +396,15 @@ def display_and_log_image_artifact(
     wandb_artifacts_dict: dict = None, # Словарь для сбора артефактов W&B
     wandb_key: str = None,             # Ключ для W&B артефакта
     caption: str = None,               # Подпись для W&B артефакта
-    width: int = None                  # Ширина для отображения в ноутбуке
+    width: int = None,                 # Ширина для отображения в ноутбуке
+    preview_width: int = PREVIEW_WIDTH # Ширина превью, встраиваемого в ноутбук и логируемого в W&B
 ):
     """
     Отображает изображение из файла в Jupyter Notebook и опционально логирует его как артефакт W&B.
 
+    В ноутбук встраивается и в W&B передается уменьшенное превью из кэша миниатюр, а не исходный файл,
+    поэтому .ipynb не раздувается полноразмерными изображениями.
+
     Args:
         image_path (str): Путь к файлу изображения.
         title (str): Заголовок для вывода в консоль перед отображением.
@@ -214,13 +413,24 @@ def display_and_log_image_artifact(
         wandb_key (str, optional): Ключ для W&B артефакта (например, "test/PR_curve").
         caption (str, optional): Подпись для изображения в W&B.
         width (int, optional): Ширина отображаемого изображения в пикселях.
+        preview_width (int): Максимальная ширина превью в пикселях.
     """
+    from IPython.display import display, Image
+
     print(f"\n{title}:")
     try:
         if os.path.exists(image_path):
-            display(Image(filename=image_path, width=width))
-            if wandb_artifacts_dict is not None and wandb_key is not None and wandb is not None:
-                wandb_artifacts_dict[wandb_key] = wandb.Image(image_path, caption=caption if caption else title)
+            # Графики (PNG) остаются PNG, чтобы не размывать текст
+            ext = '.png' if image_path.lower().endswith('.png') else '.jpg'
+            cache = get_thumbnail_cache()
+            preview_path = cache.file_for(image_path, lambda: make_thumbnail(image_path, preview_width, ext=ext), ext=ext,
+                                          width=preview_width, quality=85, class_names=None)
+            cache.evict()
+            if preview_path is None:
+                raise ValueError("не удалось декодировать изображение")
+            display(Image(filename=preview_path, width=width))
+            if wandb_artifacts_dict is not None and wandb_key is not None and get_wandb() is not None:
+                wandb_artifacts_dict[wandb_key] = get_wandb().Image(preview_path, caption=caption if caption else title)
         else:
             print(f"Файл '{os.path.basename(image_path)}' не найден по пути: {image_path}.")
     except Exception as e:
@@ -0,0 +1,55 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+
+# Модели, загруженные один раз в каждом процессе-обработчике (см. load_worker_models)
+_worker_model = None
+_worker_roi_model = None
+_worker_model_path: Optional[str] = None
+_worker_threads: Optional[int] = None
+
+
+def init_worker(model_path: str, threads_per_worker: Optional[int]) -> None:
+    """
+    Инициализатор процесса-обработчика: ограничивает число потоков OpenCV и запоминает путь к модели.
+    Сама модель (и ultralytics с torch) загружается только при первой задаче, которой она нужна.
+    """
+    global _worker_model_path, _worker_threads
+    import cv2
+
+    _worker_model_path = model_path
+    _worker_threads = threads_per_worker
+    if threads_per_worker:
+        cv2.setNumThreads(threads_per_worker)
+
+
+def load_worker_models(roi_inference: bool = False) -> Tuple[object, Optional[object]]:
+    """
+    Модели текущего процесса-обработчика: (модель трекинга, модель ROI или None).
+    Загружаются при первом вызове и переиспользуются всеми следующими задачами процесса;
+    передается в трекер как model_loader, поэтому задачи с попаданием в кэш детекций модель не загружают.
+    """
+    global _worker_model, _worker_roi_model
+    if _worker_model is None or (roi_inference and _worker_roi_model is None):
+        from ultralytics import YOLO
+
+        if _worker_model is None:
+            if _worker_threads:
+                import torch
+                torch.set_num_threads(_worker_threads)
+            _worker_model = YOLO(_worker_model_path)
+        if roi_inference and _worker_roi_model is None:
+            _worker_roi_model = YOLO(_worker_model_path)
+    return _worker_model, _worker_roi_model if roi_inference else None
+
+
+def model_process_pool(workers: int, model_path: str, threads_per_worker: Optional[int] = None) -> ProcessPoolExecutor:
+    """
+    Пул процессов, каждый из которых загружает модель не больше одного раза и переиспользует ее
+    для всех своих задач (задачи получают модели через load_worker_models).
+    """
+    # spawn: процессы не наследуют состояние потоков torch/OpenCV родительского процесса
+    context = multiprocessing.get_context('spawn')
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker,
+                               initargs=(model_path, threads_per_worker))
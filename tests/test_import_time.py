@@ -0,0 +1,17 @@
+import os
+
+import pytest
+
+from scripts.check_import_time import DEFAULT_BUDGET_SECONDS, LIGHT_MODULES, measure_import
+
+# На медленных машинах бюджет можно увеличить переменной окружения
+BUDGET_SECONDS = float(os.environ.get('IMPORT_TIME_BUDGET', DEFAULT_BUDGET_SECONDS))
+
+
+@pytest.mark.parametrize('module', LIGHT_MODULES)
+def test_light_module_imports_within_budget(module):
+    measurement = measure_import(module)
+    assert measurement['heavy'] == [], f"{module} при импорте загружает {', '.join(measurement['heavy'])}"
+    assert measurement['seconds'] <= BUDGET_SECONDS, (
+        f"{module} импортируется {measurement['seconds']:.3f} с (бюджет {BUDGET_SECONDS:.2f} с)"
+    )